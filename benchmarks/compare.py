@@ -0,0 +1,59 @@
+import argparse
+import json
+
+# Metric name: True if higher is better
+METRICS = {
+    "ticks_per_second": True,
+    "frames_per_second": True,
+    "peak_bytes": False,
+    "bytes_per_station": False,
+    "bytes_per_user": False,
+}
+
+
+def flatten(data: dict) -> dict:
+    # {benchmark/metric: value}; a plain memory.py result counts as one benchmark
+    results = data.get("results", [dict(data, name="memory")])
+    values = {}
+    for result in results:
+        for metric in METRICS:
+            if metric in result:
+                values[f"{result['name']}/{metric}"] = result[metric]
+    return values
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[tuple[str, float, float, float, bool]]:
+    before = flatten(baseline)
+    after = flatten(current)
+    rows = []
+    for key in before.keys() & after.keys():
+        old, new = before[key], after[key]
+        change = (new - old) / old if old else 0.0
+        higher_is_better = METRICS[key.rsplit("/", 1)[1]]
+        regressed = -change > threshold if higher_is_better else change > threshold
+        rows.append((key, old, new, change, regressed))
+    return sorted(rows)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare",
+                                     description="Compare two benchmark JSON files and flag regressions")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    for key, old, new, change, regressed in rows:
+        print(f"{'REGRESSION ' if regressed else '           '}{key}: {old:.6g} -> {new:.6g} ({change:+.1%})")
+    if any(row[4] for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+
+from simulation import scenarios
+from simulation.computers import Resolution
+from simulation.engines import ENGINES
+from simulation.sim import Simulation
+
+# From the toy topology in main.py up to campus scale
+TOPOLOGIES = {
+    "toy": {"servers": 3, "rooms": 3, "stations": 7, "arrival": 1 / 20},
+    "department": {"servers": 10, "rooms": 10, "stations": 20, "arrival": 1 / 5},
+    "campus": {"servers": 40, "rooms": 100, "stations": 30, "arrival": 1.0},
+}
+
+
+def build(servers: int, rooms: int, stations: int, arrival: float, engine: str = "tick", seed: int = 0) -> Simulation:
+    sim = Simulation(engine=engine, seed=seed)
+    sim.user_spawn_prob = arrival
+    scenarios.campus(sim, servers, rooms, stations)
+    return sim
+
+
+def ticks_per_second(sim: Simulation, ticks: int) -> float:
+    start = time.perf_counter()
+    sim.run(ticks)
+    return ticks / (time.perf_counter() - start)
+
+
+def phase_costs(sim: Simulation, ticks: int) -> dict:
+    # ns per tick
+    with sim.profile() as profile:
+        sim.run(ticks)
+    return {name: stats.total_ns / ticks for name, stats in profile.stats.items() if name != "tick"}
+
+
+def room_costs(sim: Simulation, number: int = 10_000) -> dict:
+    # ns per call, averaged over all rooms
+    rooms = list(sim.computer_rooms)
+    statements = {
+        "have_gis": "for r in rooms: r.have_gis",
+        "have_working_dbms": "for r in rooms: r.have_working_dbms",
+        "users_count": "for r in rooms: r.users_count",
+        "broken_stations_count": "for r in rooms: r.broken_stations_count",
+        "count_free_stations": "for r in rooms: r.count_free_stations(HD)",
+        "random_free_station": "for r in rooms: r.random_free_station(HD)",
+    }
+    number = max(1, number // len(rooms))
+    namespace = {"rooms": rooms, "HD": Resolution.HD}
+    return {name: min(timeit.repeat(statement, globals=namespace, number=number, repeat=3))
+            / number / len(rooms) * 1e9
+            for name, statement in statements.items()}
+
+
+def peak_memory(topology: dict, engine: str, ticks: int, seed: int) -> int:
+    tracemalloc.start()
+    try:
+        build(**topology, engine=engine, seed=seed).run(ticks)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(name: str, topology: dict, engine: str, ticks: int, warmup: int, seed: int) -> dict:
+    sim = build(**topology, engine=engine, seed=seed)
+    sim.run(warmup)
+    return {
+        "name": f"core/{name}/{engine}",
+        "topology": topology,
+        "engine": engine,
+        "ticks": ticks,
+        "ticks_per_second": ticks_per_second(sim, ticks),
+        "phase_ns_per_tick": phase_costs(sim, ticks),
+        "room_ns_per_call": room_costs(sim),
+        "peak_bytes": peak_memory(topology, engine, min(ticks, warmup + 1000), seed),
+        "users": len(sim.users),
+        "stations": len(sim.stations),
+    }
+
+
+def report(result: dict) -> None:
+    print(f"{result['name']}: {result['ticks_per_second']:.0f} ticks/s, "
+          f"{result['stations']} stations, {result['users']} users, peak {result['peak_bytes'] / 2 ** 20:.1f} MiB")
+    for name, ns in result["phase_ns_per_tick"].items():
+        print(f"  {name:<20} {ns / 1000:10.2f} us/tick")
+    for name, ns in result["room_ns_per_call"].items():
+        print(f"  room.{name:<25} {ns:8.0f} ns")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.core",
+                                     description="Benchmark Simulation.tick over a range of topologies")
+    parser.add_argument("--topology", action="append", choices=sorted(TOPOLOGIES),
+                        help="topology to run, may be repeated (default: all)")
+    parser.add_argument("--custom", default=None, metavar="SERVERS,ROOMS,STATIONS,ARRIVAL",
+                        help="run a custom topology instead")
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="engine, may be repeated")
+    parser.add_argument("--ticks", type=int, default=5_000)
+    parser.add_argument("--warmup", type=int, default=1_000, help="ticks to reach a steady state first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.custom:
+        servers, rooms, stations, arrival = args.custom.split(",")
+        topologies = {"custom": {"servers": int(servers), "rooms": int(rooms), "stations": int(stations),
+                                 "arrival": float(arrival)}}
+    else:
+        topologies = {name: TOPOLOGIES[name] for name in args.topology or TOPOLOGIES}
+
+    results = []
+    for name, topology in topologies.items():
+        for engine in args.engine or ["tick"]:
+            result = benchmark(name, topology, engine, args.ticks, args.warmup, args.seed)
+            results.append(result)
+            if not args.json:
+                report(result)
+
+    data = {"python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.json:
+        print(json.dumps(data, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import contextlib
+import json
+import sys
+import time
+import tkinter
+
+from benchmarks import tkstub
+from benchmarks.core import TOPOLOGIES, build
+from visulisation import visual
+
+
+class OffscreenTk(tkinter.Tk):
+    # A real window that returns from mainloop so frames can be driven by hand
+
+    def mainloop(self, n: int = 0) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def real_tk():
+    saved = visual.Tk
+    visual.Tk = OffscreenTk
+    try:
+        yield None
+    finally:
+        visual.Tk = saved
+
+
+def benchmark(name: str, topology: dict, frames: int, seed: int, use_tk: bool) -> dict:
+    sim = build(**topology, seed=seed)
+    with real_tk() if use_tk else tkstub.patched() as calls:
+        start = time.perf_counter()
+        vis = visual.Visualization(sim, 1280, 800)
+        setup = time.perf_counter() - start
+
+        if calls is not None:
+            calls.clear()
+        # The window's simulation worker has stopped once mainloop returned; tick here instead
+        start = time.perf_counter()
+        for _ in range(frames):
+            sim.tick()
+            vis.update()
+            if use_tk:
+                vis.canvas.update_idletasks()
+        seconds = time.perf_counter() - start
+
+    result = {
+        "name": f"gui/{name}/{'tk' if use_tk else 'stub'}",
+        "topology": topology,
+        "frames": frames,
+        "setup_seconds": setup,
+        "frames_per_second": frames / seconds,
+        "ms_per_frame": seconds / frames * 1000,
+    }
+    if calls is not None:
+        result["canvas_calls_per_frame"] = {
+            name: calls[name] / frames for name in ("itemconfig", "coords", "set") if calls[name]}
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.gui",
+                                     description="Benchmark Visualization.update with a stubbed or real canvas")
+    parser.add_argument("--topology", action="append", choices=sorted(TOPOLOGIES),
+                        help="topology to run, may be repeated (default: toy and department)")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tk", action="store_true", help="render with real Tk (needs a display, e.g. Xvfb)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.topology or ["toy", "department"]:
+        result = benchmark(name, TOPOLOGIES[name], args.frames, args.seed, args.tk)
+        results.append(result)
+        if not args.json:
+            calls = ", ".join(f"{k} {v:.0f}" for k, v in result.get("canvas_calls_per_frame", {}).items())
+            print(f"{result['name']}: {result['ms_per_frame']:.2f} ms/frame "
+                  f"({result['frames_per_second']:.0f} frames/s), setup {result['setup_seconds']:.2f} s"
+                  + (f", per frame: {calls}" if calls else ""))
+
+    data = {"python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.json:
+        print(json.dumps(data, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from simulation.computers import Server, Station, Resolution
+from simulation.sim import Simulation
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def station_bytes(n: int, rooms: int) -> float:
+    sim = Simulation()
+    sim.add_server(Server(0.0001, True, True, False))
+    room_list = [sim.create_room(list(sim.servers)) for _ in range(rooms)]
+
+    def build():
+        for i in range(n):
+            sim.add_station(Station(0.001, Resolution.FullHD, room_list[i % rooms]))
+        return sim
+
+    return measure(build) / n
+
+
+def user_bytes(n: int) -> float:
+    sim = Simulation()
+
+    def build():
+        for i in range(n):
+            sim.create_user(Resolution.HD, False, False, 100)
+        return sim
+
+    return measure(build) / n
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory",
+                                     description="Report memory used per station and per user")
+    parser.add_argument("--stations", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    result = {
+        "bytes_per_station": station_bytes(args.stations, args.rooms),
+        "bytes_per_user": user_bytes(args.users),
+        "python": sys.version.split()[0],
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Station: {result['bytes_per_station']:.0f} bytes (including simulation and room indexes)")
+        print(f"User: {result['bytes_per_user']:.0f} bytes (including simulation indexes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.core import TOPOLOGIES, build
+from simulation.sharding import ShardedSimulation
+
+# Large enough that ticking rooms dominates the per-tick barrier cost
+SHARDING_TOPOLOGIES = TOPOLOGIES | {
+    "metro": {"servers": 200, "rooms": 1000, "stations": 100, "arrival": 1.0},
+}
+
+
+def benchmark(name: str, topology: dict, shards: int, epoch: int, ticks: int, warmup: int, seed: int) -> dict:
+    sim = build(**topology, seed=seed)
+    start = time.perf_counter()
+    with ShardedSimulation(sim, shards, epoch) as sharded:
+        setup = time.perf_counter() - start
+        sharded.run(warmup)
+        start = time.perf_counter()
+        sharded.run(ticks)
+        seconds = time.perf_counter() - start
+        stats = sharded.shard_stats()
+    return {
+        "name": f"sharding/{name}/{shards}x{epoch}",
+        "topology": topology,
+        "shards": shards,
+        "epoch": epoch,
+        "ticks": ticks,
+        "setup_seconds": setup,
+        "ticks_per_second": ticks / seconds,
+        "stations_per_shard": [shard["stations"] for shard in stats],
+        "users_per_shard": [shard["users"] for shard in stats],
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.sharding",
+                                     description="Benchmark sharded runs against the number of worker processes")
+    parser.add_argument("--topology", action="append", choices=sorted(SHARDING_TOPOLOGIES),
+                        help="topology to run, may be repeated (default: campus)")
+    parser.add_argument("--shards", type=int, action="append",
+                        help="number of shards, may be repeated (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--epoch", type=int, action="append", help="ticks between barriers, may be repeated")
+    parser.add_argument("--ticks", type=int, default=2_000)
+    parser.add_argument("--warmup", type=int, default=500, help="ticks to reach a steady state first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    shard_counts = args.shards
+    if not shard_counts:
+        cpus = os.cpu_count() or 1
+        shard_counts = [1 << i for i in range(cpus.bit_length()) if 1 << i < cpus] + [cpus]
+
+    results = []
+    for name in args.topology or ["campus"]:
+        baseline = None
+        for epoch in args.epoch or [1]:
+            for shards in shard_counts:
+                result = benchmark(name, SHARDING_TOPOLOGIES[name], shards, epoch, args.ticks, args.warmup, args.seed)
+                if baseline is None:
+                    baseline = result["ticks_per_second"]
+                result["speedup"] = result["ticks_per_second"] / baseline
+                results.append(result)
+                if not args.json:
+                    print(f"{result['name']}: {result['ticks_per_second']:.0f} ticks/s, "
+                          f"speedup {result['speedup']:.2f}, setup {result['setup_seconds']:.2f} s")
+
+    data = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.json:
+        print(json.dumps(data, indent=2))
+
+
+if __name__ == "__main__":
+    main()
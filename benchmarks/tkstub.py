@@ -0,0 +1,106 @@
+import contextlib
+from collections import Counter
+
+from visulisation import visual, visualization_objects
+
+# Offscreen stand-ins for the tkinter names the visualisation modules import.
+# The canvas keeps item coordinates and counts every call, which is what the
+# render loop costs on the Python side.
+
+calls = Counter()
+
+
+class Widget:
+
+    def __init__(self, *args, **kwargs):
+        calls[type(self).__name__] += 1
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            calls[name] += 1
+        return method
+
+
+class Variable(Widget):
+
+    def __init__(self, value=None, **kwargs):
+        super().__init__()
+        self.__value = value
+
+    def get(self):
+        return self.__value
+
+    def set(self, value) -> None:
+        calls["set"] += 1
+        self.__value = value
+
+
+class Tk(Widget):
+
+    def winfo_screenwidth(self) -> int:
+        return 1920
+
+    def winfo_screenheight(self) -> int:
+        return 1080
+
+    def winfo_width(self) -> int:
+        return 1280
+
+    def winfo_height(self) -> int:
+        return 800
+
+    def register(self, function) -> str:
+        return "stub"
+
+    def mainloop(self) -> None:
+        pass
+
+
+class Canvas(Widget):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.__coords = {}
+
+    def __create(self, coords) -> int:
+        item = len(self.__coords) + 1
+        self.__coords[item] = list(coords)
+        return item
+
+    def create_rectangle(self, *coords, **kwargs) -> int:
+        calls["create_rectangle"] += 1
+        return self.__create(coords)
+
+    def create_line(self, *coords, **kwargs) -> int:
+        calls["create_line"] += 1
+        return self.__create(coords)
+
+    def coords(self, item, *coords):
+        calls["coords"] += 1
+        if coords:
+            self.__coords[item] = list(coords)
+        return self.__coords.get(item, [0, 0, 0, 0])
+
+    def itemconfig(self, item, **kwargs) -> None:
+        calls["itemconfig"] += 1
+
+
+class ttk:
+    Entry = Scale = Button = Combobox = Widget
+
+
+NAMES = {"Tk": Tk, "Canvas": Canvas, "Frame": Widget, "Label": Widget,
+         "StringVar": Variable, "IntVar": Variable, "ttk": ttk}
+
+
+@contextlib.contextmanager
+def patched():
+    modules = (visual, visualization_objects)
+    saved = [(module, name, getattr(module, name)) for module in modules for name in NAMES if hasattr(module, name)]
+    for module, name, _ in saved:
+        setattr(module, name, NAMES[name])
+    try:
+        yield calls
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
@@ -0,0 +1,283 @@
+import argparse
+import json
+import sys
+import time
+
+from simulation import scenarios, runner, ensemble, sweep
+from simulation.engines import ENGINES
+from simulation.sim import Simulation
+
+
+def parse_value(value: str):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def parse_setting(item: str) -> tuple:
+    key, sep, value = item.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {item!r}")
+    value = parse_value(value)
+    try:
+        scenarios.check_setting(key, value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return key, value
+
+
+def parse_axis(item: str) -> tuple:
+    key, sep, values = item.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=V1,V2,..., got {item!r}")
+    return key, [parse_setting(f"{key}={value}")[1] for value in values.split(",")]
+
+
+def create_simulation(args) -> Simulation:
+    try:
+        return scenarios.create(args.scenario, args.engine, dict(args.set), args.seed)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def command_run(args) -> None:
+    sim = create_simulation(args)
+    if args.shards:
+        if args.profile or args.profile_every or args.metrics:
+            raise SystemExit("--profile and --metrics need an unsharded run")
+        from simulation.sharding import ShardedSimulation
+        try:
+            sim = ShardedSimulation(sim, args.shards, args.epoch)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    profile = None
+    if args.profile or args.profile_every:
+        profile = sim.profile(args.profile_every, lambda text: print(text, file=sys.stderr))
+    recorder = None
+    if args.metrics:
+        from simulation.metrics import MetricsRecorder
+        recorder = MetricsRecorder(sim, args.metrics, args.metrics_stride, profile=profile)
+    result = runner.run(sim, args.ticks, args.report_every,
+                        lambda line: print(line, file=sys.stderr))
+    if recorder is not None:
+        recorder.close()
+    if args.shards:
+        sim.close()
+    if profile is not None:
+        profile.stop()
+        print(profile.summary(), file=sys.stderr)
+
+    data = result.as_dict()
+    if not args.shards:
+        data["repairs"] = sim.repairs.stats()
+    if profile is not None:
+        data["profile"] = profile.as_dict()
+    data["scenario"] = args.scenario
+    data["seed"] = args.seed
+    data["engine"] = args.engine
+    if args.shards:
+        data["shards"] = args.shards
+        data["epoch"] = args.epoch
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    print(f"{result.ticks} ticks in {result.seconds:.2f} s ({result.ticks_per_second:.0f} ticks/s)")
+    print(f"All/Success users: {result.users_count}/{result.success_users_count}")
+    if not args.shards:
+        repairs = data["repairs"]
+        print(f"Repairs ({repairs['policy']}, crews {repairs['crews']}): {repairs['repaired']}, "
+              f"mean time to repair {repairs['mean_time_to_repair']:.1f} ticks, "
+              f"crew utilization {repairs['crew_utilization']:.4f}")
+
+
+def command_ensemble(args) -> None:
+    result = ensemble.run(args.scenario, args.replications, args.workers, args.ticks, args.seed,
+                          args.engine, dict(args.set), confidence=args.confidence)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result.as_dict(), f, indent=2)
+
+    level = int(result.confidence * 100)
+    for name, value in (("Success rate", result.success_rate),
+                        ("Station utilization", result.station_utilization),
+                        ("Mean time to repair", result.mean_time_to_repair),
+                        ("Crew utilization", result.crew_utilization)):
+        print(f"{name}: {value.mean:.4f} ({level}% CI {value.low:.4f}..{value.high:.4f}, n={value.n})")
+    print(f"{len(result.replications)} replications in {result.seconds:.2f} s")
+
+
+def command_analytic(args) -> None:
+    from simulation import analytic
+    model = analytic.Model.from_simulation(create_simulation(args))
+    try:
+        result = analytic.solve(model)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    data = {"scenario": args.scenario, "seed": args.seed, "analytic": result.as_dict()}
+    for name in analytic.METRICS:
+        print(f"{name.replace('_', ' ').capitalize()}: {getattr(result, name):.4f}")
+    print(f"Solved in {result.seconds * 1000:.1f} ms")
+
+    if args.target is not None:
+        factor = analytic.stations_needed(model, args.target)
+        data["target"] = {"success_rate": args.target, "factor": factor}
+        if factor is None:
+            print(f"Success rate {args.target} is out of reach by adding stations")
+        else:
+            stations = len(model.scaled(factor).station_crash_probabilities)
+            data["target"]["stations"] = stations
+            print(f"Success rate {args.target} needs rooms scaled by {factor:.2f} ({stations} stations)")
+
+    if args.validate:
+        validation = analytic.validate(args.scenario, args.validate, args.ticks, args.warmup, args.seed or 0,
+                                       args.engine, dict(args.set), args.workers, args.confidence)
+        data["validation"] = validation.as_dict()
+        level = int(validation.confidence * 100)
+        predicted, simulated, errors = (validation.predicted_estimates, validation.simulated_estimates,
+                                        validation.errors)
+        print(f"{args.validate} replications in {validation.seconds:.2f} s, "
+              f"{validation.analytic_seconds * 1000:.1f} ms per estimate")
+        for name in analytic.METRICS:
+            print(f"{name.replace('_', ' ').capitalize()}: predicted {predicted[name].mean:.4f}, simulated {simulated[name].mean:.4f}, "
+                  f"error {errors[name].mean:+.4f} ({level}% CI {errors[name].low:+.4f}..{errors[name].high:+.4f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+
+
+def command_serve(args) -> None:
+    from simulation.telemetry import TelemetryServer
+    sim = create_simulation(args)
+    server = TelemetryServer(sim, args.host, args.port, args.keyframe_every)
+    try:
+        server.start()
+    except OSError as e:
+        raise SystemExit(str(e))
+    print(f"Serving telemetry on {server.url}, stream at ws://{args.host}:{server.port}/stream", file=sys.stderr)
+
+    clock = time.perf_counter
+    start, start_tick = clock(), sim.ticks
+    try:
+        while args.ticks <= 0 or sim.ticks < args.ticks:
+            if args.tick_rate > 0:
+                time.sleep(max(0.0, start + (sim.ticks - start_tick + 1) / args.tick_rate - clock()))
+                sim.tick()
+            else:
+                sim.run(min(100, args.ticks - sim.ticks) if args.ticks > 0 else 100)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    print(f"{sim.ticks} ticks served")
+
+
+def command_sweep(args) -> None:
+    base = dict(args.set)
+    points = [base | point for point in sweep.grid(**dict(args.grid))]
+    if args.points:
+        with open(args.points) as f:
+            points += [base | point for point in json.load(f)]
+    for point in points:
+        for key, value in point.items():
+            try:
+                scenarios.check_setting(key, value)
+            except ValueError as e:
+                raise SystemExit(f"{args.points}: {e}")
+
+    store = sweep.ResultStore(args.cache) if args.cache else None
+    result = sweep.run(points, args.scenario, args.replications, args.ticks, args.seed or 0, args.engine,
+                       store, args.workers, confidence=args.confidence,
+                       report=lambda line: print(line, file=sys.stderr))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([p.as_dict() for p in result], f, indent=2)
+
+    for point in result:
+        settings = ", ".join(f"{k}={v}" for k, v in point.settings.items())
+        print(f"{settings}: success {point.success_rate.mean:.4f} "
+              f"[{point.success_rate.low:.4f}..{point.success_rate.high:.4f}], "
+              f"utilization {point.station_utilization.mean:.4f}, "
+              f"repair {point.mean_time_to_repair.mean:.1f} ticks, crews {point.crew_utilization.mean:.4f}")
+
+
+def add_simulation_arguments(parser) -> None:
+    parser.add_argument("--ticks", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tick")
+    parser.add_argument("--scenario", default="small",
+                        help=f"built-in scenario ({', '.join(sorted(scenarios.SCENARIOS))}) or a .toml/.json file")
+    parser.add_argument("--set", action="append", type=parse_setting, default=[], metavar="KEY=VALUE",
+                        help="override a simulation setting, e.g. user_spawn_prob=0.1")
+    parser.add_argument("--output", default=None, help="write the result as JSON")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m simulation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a simulation without visualization")
+    add_simulation_arguments(run_parser)
+    run_parser.add_argument("--report-every", type=int, default=0, metavar="TICKS")
+    run_parser.add_argument("--metrics", default=None, metavar="DIR", help="record per-tick metrics to DIR")
+    run_parser.add_argument("--metrics-stride", type=int, default=1, metavar="TICKS")
+    run_parser.add_argument("--profile", action="store_true", help="time each tick phase")
+    run_parser.add_argument("--profile-every", type=int, default=0, metavar="TICKS",
+                            help="print the phase profile every TICKS ticks")
+    run_parser.add_argument("--shards", type=int, default=0,
+                            help="split the rooms between this many worker processes")
+    run_parser.add_argument("--epoch", type=int, default=1, metavar="TICKS",
+                            help="ticks between shard barriers")
+    run_parser.set_defaults(handler=command_run)
+
+    ensemble_parser = commands.add_parser("ensemble", help="run independent replications in parallel")
+    add_simulation_arguments(ensemble_parser)
+    ensemble_parser.set_defaults(ticks=10_000)
+    ensemble_parser.add_argument("--replications", type=int, default=100)
+    ensemble_parser.add_argument("--workers", type=int, default=None)
+    ensemble_parser.add_argument("--confidence", type=float, default=0.95)
+    ensemble_parser.set_defaults(handler=command_ensemble)
+
+    sweep_parser = commands.add_parser("sweep", help="run a parameter sweep with cached results")
+    add_simulation_arguments(sweep_parser)
+    sweep_parser.set_defaults(ticks=10_000)
+    sweep_parser.add_argument("--grid", action="append", type=parse_axis, default=[], metavar="KEY=V1,V2,...")
+    sweep_parser.add_argument("--points", default=None, help="JSON file with a list of parameter sets")
+    sweep_parser.add_argument("--replications", type=int, default=20)
+    sweep_parser.add_argument("--workers", type=int, default=None)
+    sweep_parser.add_argument("--confidence", type=float, default=0.95)
+    sweep_parser.add_argument("--cache", default=".sweep_cache", help="result cache directory, empty to disable")
+    sweep_parser.set_defaults(handler=command_sweep)
+
+    analytic_parser = commands.add_parser("analytic", help="estimate steady-state availability and success rate")
+    add_simulation_arguments(analytic_parser)
+    analytic_parser.set_defaults(ticks=30_000)
+    analytic_parser.add_argument("--target", type=float, default=None, metavar="SUCCESS_RATE",
+                                 help="find how far to scale the rooms for this success rate")
+    analytic_parser.add_argument("--validate", type=int, default=0, metavar="REPLICATIONS",
+                                 help="compare with this many simulated runs of --ticks ticks")
+    analytic_parser.add_argument("--warmup", type=int, default=5_000, metavar="TICKS")
+    analytic_parser.add_argument("--workers", type=int, default=None)
+    analytic_parser.add_argument("--confidence", type=float, default=0.95)
+    analytic_parser.set_defaults(handler=command_analytic)
+
+    serve_parser = commands.add_parser("serve", help="run a simulation and stream its state over HTTP/WebSocket")
+    add_simulation_arguments(serve_parser)
+    serve_parser.set_defaults(ticks=0)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--tick-rate", type=float, default=0, help="ticks per second, 0 for as fast as possible")
+    serve_parser.add_argument("--keyframe-every", type=int, default=500, metavar="TICKS")
+    serve_parser.set_defaults(handler=command_serve)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from simulation import ensemble, scenarios
+from simulation.computer_room import SUITABLE_RESOLUTIONS
+from simulation.computers import Resolution
+from simulation.ensemble import Estimate
+from simulation.repair import RANDOM
+
+# A user gives up after this many rooms, searching each for this many ticks
+ROOM_ATTEMPTS = 3
+STATION_ATTEMPTS = 4
+RESOLUTIONS = list(Resolution)
+METRICS = ("station_availability", "server_availability", "station_utilization", "success_rate")
+
+
+@dataclass
+class RoomModel:
+    stations: dict[Resolution, int]
+    crash_probabilities: list[float]
+    # Indexes of the attached servers providing each capability
+    gis_servers: list[int]
+    dbms_servers: list[int]
+
+
+@dataclass
+class Model:
+    rooms: list[RoomModel]
+    server_crash_probabilities: list[float]
+    # Servers whose crush protection is still unused
+    server_protected: list[bool]
+    settings: dict
+
+    @classmethod
+    def from_simulation(cls, simulation) -> "Model":
+        servers = {server: i for i, server in enumerate(simulation.servers)}
+        rooms = []
+        for room in simulation.computer_rooms:
+            stations = dict.fromkeys(Resolution, 0)
+            for station in room.stations:
+                stations[station.display_resolution] += 1
+            rooms.append(RoomModel(stations, [station.chash_probability for station in room.stations],
+                                   [servers[server] for server in room.servers if server.have_gis],
+                                   [servers[server] for server in room.servers if server.have_dbms]))
+        return cls(rooms, [server.chash_probability for server in servers],
+                   [server.have_crush_protect and not server.crush_protect_used for server in servers],
+                   simulation.settings)
+
+    @property
+    def station_crash_probabilities(self) -> list[float]:
+        return [p for room in self.rooms for p in room.crash_probabilities]
+
+    def scaled(self, factor: float) -> "Model":
+        # Every room with its station count multiplied by factor, keeping its mix of resolutions
+        rooms = []
+        for room in self.rooms:
+            stations = {resolution: round(count * factor) for resolution, count in room.stations.items()}
+            mean = sum(room.crash_probabilities) / len(room.crash_probabilities) if room.crash_probabilities else 0
+            rooms.append(RoomModel(stations, [mean] * sum(stations.values()), room.gis_servers, room.dbms_servers))
+        return Model(rooms, self.server_crash_probabilities, self.server_protected, self.settings)
+
+
+@dataclass
+class AnalyticResult:
+    station_availability: float
+    server_availability: float
+    station_utilization: float
+    success_rate: float
+    broken_stations: float
+    broken_servers: float
+    mean_repair_time: float
+    seconds: float
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def uniform_power_mean(r: float, low: int, high: int) -> float:
+    # E[r ** T] for T uniform on low..high
+    n = high - low + 1
+    if r == 1:
+        return 1.0
+    return r ** low * (1 - r ** n) / (1 - r) / n
+
+
+def repair_time(broken: int, low: int, high: int) -> float:
+    # Expected ticks a computer stays broken while `broken` computers are down. Every tick
+    # one broken computer is picked at random and its repair timer set to T, restarting it
+    # if it was already running, so a repair only finishes after T - 1 ticks without a pick.
+    if broken <= 1:
+        return math.inf
+    q = 1 / broken
+    r = 1 - q
+    finished = uniform_power_mean(r, low - 1, high - 1)
+    attempt = (1 - uniform_power_mean(r, low, high)) / q
+    return broken - 1 + attempt / finished
+
+
+def broken_distribution(crash_probabilities: list[float], low: int, high: int) -> list[float]:
+    # Birth-death chain over the number of broken computers, with each broken computer
+    # repaired at rate 1 / repair_time(state)
+    n = len(crash_probabilities)
+    if n == 0:
+        return [1.0]
+    mean = sum(crash_probabilities) / n
+    log_weights = [0.0]
+    for broken in range(1, n + 1):
+        repairs = broken / repair_time(broken, low, high)
+        if repairs == 0:
+            # A lone broken computer is never repaired, so the all-working state is transient
+            log_weights = [-math.inf]
+            log_weights.append(0.0)
+            continue
+        log_weights.append(log_weights[-1] + math.log((n - broken + 1) * mean) - math.log(repairs))
+    top = max(log_weights)
+    weights = [math.exp(w - top) for w in log_weights]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def downtime(crash_probabilities: list[float], broken: float) -> float:
+    # Mean repair time d for which the computers' unavailabilities p*d / (1 + p*d) add up to broken
+    if broken <= 0 or not crash_probabilities:
+        return 0.0
+    if broken >= len(crash_probabilities):
+        return math.inf
+    # Newton's method on a concave increasing function, from below the root as p*d/(1+p*d) <= p*d
+    d = broken / sum(crash_probabilities)
+    for _ in range(100):
+        value = sum(p * d / (1 + p * d) for p in crash_probabilities) - broken
+        slope = sum(p / (1 + p * d) ** 2 for p in crash_probabilities)
+        step = -value / slope
+        d += step
+        if abs(step) <= 1e-12 * d:
+            break
+    return d
+
+
+def unavailability(p: float, downtime: float) -> float:
+    if math.isinf(downtime):
+        return 1.0 if p > 0 else 0.0
+    return p * downtime / (1 + p * downtime)
+
+
+def protection_spent(p: float, window: tuple[int, int]) -> float:
+    # Share of the ticks in window in which a crush protection unused at tick 0 has
+    # saved its crash: the first crash comes after a geometric number of ticks
+    first, last = window
+    return 1 - uniform_power_mean(1 - p, first, last)
+
+
+def capability(unavailable: list[float], need_working: bool) -> float:
+    # Probability the room provides a capability when a user checks its station, given
+    # the unavailability of each server providing it
+    if not unavailable:
+        return 0.0
+    if not need_working:
+        return 1.0
+    return 1 - math.prod(unavailable)
+
+
+def user_classes(settings: dict):
+    # (indexes of the suitable resolutions, needs GIS, needs DBMS, share of users)
+    gis, dbms = settings["user_need_gis_prob"], settings["user_need_dbms_prob"]
+    for resolution in RESOLUTIONS:
+        suitable = tuple(RESOLUTIONS.index(r) for r in SUITABLE_RESOLUTIONS[resolution])
+        for need_gis in (True, False):
+            for need_dbms in (True, False):
+                weight = (gis if need_gis else 1 - gis) * (dbms if need_dbms else 1 - dbms) / len(RESOLUTIONS)
+                if weight > 0:
+                    yield suitable, need_gis, need_dbms, weight
+
+
+def all_rooms_fail(fail: list[tuple[float, float]], picks: int) -> list[float]:
+    # Probability that `picks` uniform room picks all fail. fail[k] is (probability room k
+    # fails everyone, probability a visit fails otherwise): the first part does not change
+    # over a user's search and is shared by picks of the same room, the second is drawn anew
+    # per visit. Given the rooms' states picks fail independently with probability F, the
+    # mean of their per-visit failures, so the answer is E[F ** picks] from the moments of a
+    # sum of independent rooms. Returns the probability for 0..picks picks.
+    if not fail:
+        return [1.0] * (picks + 1)
+    # Moments of the sum room by room: E[(S + X) ** i] = sum C(i, j) E[S ** j] E[X ** (i - j)]
+    terms = [(i, j, math.comb(i, j)) for i in range(picks, 0, -1) for j in range(i)]
+    moments = [1.0] + [0.0] * picks
+    room = [1.0] * (picks + 1)
+    for always, sometimes in fail:
+        power = 1.0
+        for i in range(1, picks + 1):
+            power *= sometimes
+            room[i] = always + (1 - always) * power
+        # In place from the highest moment down, so lower ones are still those of S
+        for i, j, combinations in terms:
+            moments[i] += combinations * moments[j] * room[i - j]
+    return [moment / len(fail) ** i for i, moment in enumerate(moments)]
+
+
+def binomial(n: int, p: float) -> list[float]:
+    if p <= 0 or p >= 1:
+        return [float(k == round(n * p)) for k in range(n + 1)]
+    return [math.exp(math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1) +
+                     k * math.log(p) + (n - k) * math.log(1 - p)) for k in range(n + 1)]
+
+
+def abandonment(servers: int, load: float, hold: float, patience: float) -> list[float]:
+    # Probability an arrival gives up in an M/M/j+D queue for j = 0..servers: j stations
+    # busy for `hold` ticks on average, users searching for at most `patience` ticks
+    abandoned = [1.0]
+    blocking = 1.0
+    rate = load / hold
+    for j in range(1, servers + 1):
+        # Stationary virtual waiting time, relative to the probability of j - 1 busy stations
+        drift = j / hold - rate
+        rho = load / j
+        waiting = rate * patience if abs(drift * patience) < 1e-12 else -rate * math.expm1(-drift * patience) / drift
+        tail = rho * math.exp(-drift * patience)
+        abandoned.append(tail / (1 / blocking + waiting + tail))
+        # Erlang B for j servers, used by the next j
+        blocking = load * blocking / (j + load * blocking)
+        if blocking < 1e-15:
+            abandoned.extend([0.0] * (servers - j))
+            break
+    return abandoned
+
+
+# Steady state of the model in three parts: a birth-death chain for the number of broken
+# computers gives availability, a queue per room and set of suitable resolutions gives the
+# chance a search finds a station, and a fixed point over how many rooms users try ties the
+# rooms' loads to the users' success rate. With a window, the first and last tick measured
+# counted from the model's state, results are averages over those ticks instead of the
+# long run.
+def solve(model: Model, tolerance: float = 1e-6, max_iterations: int = 200,
+          window: tuple[int, int] = None) -> AnalyticResult:
+    start = time.perf_counter()
+    settings = model.settings
+    if settings.get("repair_policy", RANDOM) != RANDOM:
+        raise ValueError(f"The model only covers the {RANDOM} repair policy")
+    low, high = settings["comp_min_fix_time"], settings["comp_max_fix_time"]
+    stations = model.station_crash_probabilities
+    servers = model.server_crash_probabilities
+
+    # Computers: station and server repairs share one dispatcher. Crush protection only
+    # saves a server's first crash, so it does not change the steady state; but servers
+    # crash rarely, and within a window of tens of thousands of ticks many are still
+    # protected, which halved their downtime in validation runs of the small scenario.
+    distribution = broken_distribution(stations + servers, low, high)
+    broken = sum(b * w for b, w in enumerate(distribution))
+    repair = downtime(stations + servers, broken)
+    broken_stations = sum(unavailability(p, repair) for p in stations)
+    server_unavailable = [unavailability(p, repair) *
+                          (protection_spent(p, window) if protected and window is not None else 1.0)
+                          for p, protected in zip(servers, model.server_protected)]
+    broken_servers = sum(server_unavailable)
+
+    # Users: a fixed point of the number of rooms each class of user tries
+    rooms = model.rooms
+    arrival = settings["user_spawn_prob"]
+    work_low, work_high = settings["user_min_worktime"], settings["user_max_worktime"]
+    mean_work = (work_low + work_high) / 2
+    need_working = settings["capabilities_need_working_server"]
+    classes = list(user_classes(settings))
+
+    room_broken = []
+    interrupted = []
+    gis = []
+    dbms = []
+    for room in rooms:
+        mean_p = sum(room.crash_probabilities) / len(room.crash_probabilities) if room.crash_probabilities else 0
+        room_broken.append(unavailability(mean_p, repair))
+        interrupted.append(1 - uniform_power_mean(1 - mean_p, work_low, work_high))
+        gis.append(capability([server_unavailable[i] for i in room.gis_servers], need_working))
+        dbms.append(capability([server_unavailable[i] for i in room.dbms_servers], need_working))
+
+    # Each room is a queue per set of suitable resolutions: a user finds no station when
+    # every working suitable one stays taken for the whole search. The sets overlap, so a set
+    # is offered the load of each user class in proportion to the stations the two have in
+    # common. Lists are by resolution index, as hashing enum members would dominate the solve.
+    counts = [[room.stations[r] for r in RESOLUTIONS] for room in rooms]
+    pools = [suitable for suitable, *_ in classes]
+    working = {}
+    overlaps = {}
+    for k in range(len(rooms)):
+        for suitable in set(pools):
+            working[k, suitable] = binomial(sum(counts[k][r] for r in suitable), 1 - room_broken[k])
+            overlaps[k, suitable] = []
+            for c, other in enumerate(pools):
+                common = sum(counts[k][r] for r in other if r in suitable)
+                if common:
+                    # Users with fewer suitable stations only compete with what they hold
+                    overlaps[k, suitable].append((c, other, common / sum(counts[k][r] for r in other),
+                                                  set(other) < set(suitable)))
+    patience = STATION_ATTEMPTS - 1
+    persistence = {key: math.exp(-(STATION_ATTEMPTS + 1) * sum(j * w for j, w in enumerate(pmf)) / (mean_work + 1))
+                   for key, pmf in working.items()}
+    # No working suitable station or a missing capability fails every visit for a while
+    usable = [[(1 - working[k, suitable][0]) * (gis[k] if need_gis else 1.0) * (dbms[k] if need_dbms else 1.0)
+               for k in range(len(rooms))] for suitable, need_gis, need_dbms, _ in classes]
+
+    visits = [1.0] * len(classes)
+    success = [0.0] * len(classes)
+    offered = [[0.0] * len(classes) for _ in rooms]
+    busy = [{} for _ in rooms]
+    for _ in range(max_iterations):
+        for k in range(len(rooms)):
+            for c, (suitable, need_gis, need_dbms, weight) in enumerate(classes):
+                compatible = (gis[k] if need_gis else 1.0) * (dbms[k] if need_dbms else 1.0)
+                # A user without the capabilities they need leaves the station the next tick
+                hold = compatible * (mean_work + 1) + (1 - compatible)
+                offered[k][c] = arrival * weight * visits[c] / len(rooms) * hold
+            busy_before = dict(busy[k])
+            for suitable in set(pools):
+                load = 0.0
+                for c, other, share, held_only in overlaps[k, suitable]:
+                    load += offered[k][c] * share * (1 - busy_before.get(other, 0.0) if held_only else 1.0)
+                pmf = working[k, suitable]
+                abandoned = abandonment(len(pmf) - 1, load, mean_work + 1, patience)
+                if pmf[0] < 1:
+                    busy[k][suitable] = sum(w * a for w, a in zip(pmf[1:], abandoned[1:])) / (1 - pmf[0])
+                else:
+                    busy[k][suitable] = 1.0
+
+        change = 0.0
+        for c, (suitable, need_gis, need_dbms, weight) in enumerate(classes):
+            fail = []
+            for k in range(len(rooms)):
+                # A station breaking under the user sends them searching the room again
+                find = 1 - busy[k][suitable]
+                works = find * (1 - interrupted[k]) / (1 - find * interrupted[k])
+                # A full room stays full until one of its stations frees up, so part of being
+                # busy carries over to the next pick of the same room
+                frozen = busy[k][suitable] * persistence[k, suitable]
+                fail.append((1 - usable[c][k] * (1 - frozen), 1 - works / (1 - frozen) if frozen < 1 else 1.0))
+            failed = all_rooms_fail(fail, ROOM_ATTEMPTS)
+            success[c] = 1 - failed[-1] if rooms else 0.0
+            target = sum(failed[:-1])
+            change = max(change, abs(target - visits[c]))
+            # Damped, as full steps oscillate in crowded rooms
+            visits[c] += (target - visits[c]) / 2
+        if change < tolerance:
+            break
+
+    success_rate = sum(weight * success[c] for c, (*_, weight) in enumerate(classes))
+    # Little's law: every successful user holds a station for their work time plus a tick
+    occupied = arrival * success_rate * (mean_work + 1)
+
+    station_count = len(stations)
+    return AnalyticResult(
+        station_availability=1 - broken_stations / station_count if station_count else math.nan,
+        server_availability=1 - broken_servers / len(servers) if servers else math.nan,
+        station_utilization=occupied / station_count if station_count else math.nan,
+        success_rate=success_rate if rooms else 0.0,
+        broken_stations=broken_stations,
+        broken_servers=broken_servers,
+        mean_repair_time=repair,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def estimate(simulation, window: tuple[int, int] = None) -> AnalyticResult:
+    return solve(Model.from_simulation(simulation), window=window)
+
+
+def stations_needed(model: Model, success_rate: float, max_factor: float = 64.0) -> float | None:
+    # Smallest factor to scale every room by for the target success rate, None if out of reach
+    if solve(model.scaled(max_factor)).success_rate < success_rate:
+        return None
+    low, high = 0.0, max_factor
+    while high - low > 0.01:
+        middle = (low + high) / 2
+        if solve(model.scaled(middle)).success_rate < success_rate:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def measure(simulation, ticks: int, warmup: int = 0, sample_every: int = 10) -> dict:
+    # Time averages over a run after warmup, in the terms of AnalyticResult
+    simulation.run(warmup)
+    stations, servers = len(simulation.stations), len(simulation.servers)
+    successes = simulation.success_users_count
+    finished = simulation.users_count - len(simulation.users)
+    broken_stations = broken_servers = occupied = 0
+    samples = 0
+    done = 0
+    while done < ticks:
+        step = min(sample_every, ticks - done)
+        simulation.run(step)
+        done += step
+        broken_stations += simulation.broken_stations_count
+        broken_servers += simulation.broken_servers_count
+        occupied += simulation.working_users_count
+        samples += 1
+    successes = simulation.success_users_count - successes
+    finished = simulation.users_count - len(simulation.users) - finished
+    return {
+        "station_availability": 1 - broken_stations / samples / stations if samples and stations else math.nan,
+        "server_availability": 1 - broken_servers / samples / servers if samples and servers else math.nan,
+        "station_utilization": occupied / samples / stations if samples and stations else math.nan,
+        "success_rate": successes / finished if finished else math.nan,
+    }
+
+
+@dataclass
+class Validation:
+    scenario: str
+    analytic: list[AnalyticResult]
+    simulated: list[dict]
+    confidence: float
+    seconds: float
+    settings: dict = field(default_factory=dict)
+
+    def __estimate(self, values, bounds=(-math.inf, math.inf)) -> Estimate:
+        return ensemble.estimate(values, self.confidence, bounds)
+
+    # Every metric is a fraction; their errors are not
+    @property
+    def predicted_estimates(self) -> dict[str, Estimate]:
+        return {name: self.__estimate([getattr(r, name) for r in self.analytic], ensemble.PROPORTION)
+                for name in METRICS}
+
+    @property
+    def simulated_estimates(self) -> dict[str, Estimate]:
+        return {name: self.__estimate([r[name] for r in self.simulated], ensemble.PROPORTION) for name in METRICS}
+
+    @property
+    def errors(self) -> dict[str, Estimate]:
+        # Paired by replication, as each one has its own random topology
+        return {name: self.__estimate([getattr(a, name) - s[name] for a, s in zip(self.analytic, self.simulated)])
+                for name in METRICS}
+
+    @property
+    def analytic_seconds(self) -> float:
+        return sum(r.seconds for r in self.analytic) / len(self.analytic) if self.analytic else math.nan
+
+    def as_dict(self) -> dict:
+        return {
+            "scenario": self.scenario,
+            "settings": self.settings,
+            "confidence": self.confidence,
+            "seconds": self.seconds,
+            "analytic_seconds": self.analytic_seconds,
+            "predicted": {name: value.__dict__ for name, value in self.predicted_estimates.items()},
+            "simulated": {name: value.__dict__ for name, value in self.simulated_estimates.items()},
+            "errors": {name: value.__dict__ for name, value in self.errors.items()},
+        }
+
+
+def _validate(args) -> tuple[AnalyticResult, dict]:
+    scenario, seed, ticks, warmup, engine, settings = args
+    sim = scenarios.create(scenario, engine, settings, seed)
+    # The model is built from the replication's own topology, as scenarios are random
+    return estimate(sim, (warmup, warmup + ticks)), measure(sim, ticks, warmup)
+
+
+def validate(scenario: str = "small", replications: int = 20, ticks: int = 30_000, warmup: int = 5_000,
+             seed: int = 0, engine: str = "tick", settings: dict = None, workers: int = None,
+             confidence: float = 0.95) -> Validation:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    tasks = [(scenario, ensemble.replication_seed(seed, i), ticks, warmup, engine, settings)
+             for i in range(replications)]
+    if workers <= 1:
+        results = list(map(_validate, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_validate, tasks))
+
+    return Validation(scenario, [analytic for analytic, _ in results], [measured for _, measured in results],
+                      confidence, time.perf_counter() - start, dict(settings or {}))
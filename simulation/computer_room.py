@@ -1,26 +1,60 @@
-class ComputerRoom:
+import random
+
+from simulation.computers import ComputerListener, Resolution, Station
+from simulation.indexed import IndexedList
+
+# Resolutions that satisfy a user asking for at least the given one
+RESOLUTIONS = tuple(Resolution)
+SUITABLE_RESOLUTIONS = {minimal: tuple(r for r in Resolution if r.value >= minimal.value) for minimal in Resolution}
+# The same by ordinal, for the free-station index
+SUITABLE_ORDINALS = tuple(tuple(r.ordinal for r in SUITABLE_RESOLUTIONS[minimal]) for minimal in RESOLUTIONS)
+
+
+class RoomListener:
+    def room_stations_changed(self, room) -> None:
+        pass
+
+    def room_servers_changed(self, room) -> None:
+        pass
 
-    def __init__(self, servers=None):
-        if servers is None:
-            self.__servers = []
-        else:
-            self.__servers = servers.copy()
 
-        self.__stations = []
+class ComputerRoom(ComputerListener):
+
+    def __init__(self, servers=None, rng=random):
+        self.__rng = rng
+        self.__listeners = []
+        self.__servers = IndexedList(servers or ())
+        self.__stations = IndexedList()
+        # Working, unoccupied stations by display resolution ordinal
+        self.__free_stations = [IndexedList() for _ in RESOLUTIONS]
+        self.__broken_stations = IndexedList()
+        self.__broken_servers = IndexedList()
+        self.__occupied_stations = IndexedList()
+
+        # Attached servers with a capability; working ones are not broken
+        self.__gis_servers = 0
+        self.__dbms_servers = 0
+        self.__working_gis_servers = 0
+        self.__working_dbms_servers = 0
+
+        for server in self.__servers:
+            self.__attach_server(server)
 
     @property
     def have_gis(self) -> bool:
-        for s in self.__servers:
-            if s.have_gis:
-                return True
-        return False
+        return self.__gis_servers > 0
 
     @property
     def have_dbms(self) -> bool:
-        for s in self.__servers:
-            if s.have_dbms:
-                return True
-        return False
+        return self.__dbms_servers > 0
+
+    @property
+    def have_working_gis(self) -> bool:
+        return self.__working_gis_servers > 0
+
+    @property
+    def have_working_dbms(self) -> bool:
+        return self.__working_dbms_servers > 0
 
     @property
     def stations(self):
@@ -32,36 +66,159 @@ class ComputerRoom:
 
     @property
     def broken_stations(self):
-        return list(filter(lambda s: s.is_broken, self.__stations))
+        return list(self.__broken_stations)
+
+    @property
+    def broken_stations_count(self) -> int:
+        return len(self.__broken_stations)
 
     @property
     def broken_servers(self):
-        return list(filter(lambda s: s.is_broken, self.__servers))
+        return list(self.__broken_servers)
+
+    @property
+    def broken_servers_count(self) -> int:
+        return len(self.__broken_servers)
 
     @property
     def users(self):
-        result = []
-        for station in self.__stations:
-            if station.occupied:
-                result.append(station.user)
-        return result
+        return [station.user for station in self.__occupied_stations]
+
+    @property
+    def users_count(self) -> int:
+        return len(self.__occupied_stations)
+
+    @property
+    def free_stations_count(self) -> int:
+        return sum(map(len, self.__free_stations))
+
+    def count_free_stations(self, minimal_resolution: Resolution) -> int:
+        free_stations = self.__free_stations
+        count = 0
+        for ordinal in SUITABLE_ORDINALS[minimal_resolution.ordinal]:
+            count += len(free_stations[ordinal])
+        return count
+
+    def random_free_station(self, minimal_resolution: Resolution):
+        n = self.count_free_stations(minimal_resolution)
+        if n == 0:
+            return None
+        n = self.__rng.randrange(n)
+        for ordinal in SUITABLE_ORDINALS[minimal_resolution.ordinal]:
+            stations = self.__free_stations[ordinal]
+            if n < len(stations):
+                return stations[n]
+            n -= len(stations)
+
+    def __update_station(self, station) -> None:
+        if station.is_broken:
+            self.__broken_stations.add(station)
+        else:
+            self.__broken_stations.discard(station)
+
+        if station.occupied:
+            self.__occupied_stations.add(station)
+        else:
+            self.__occupied_stations.discard(station)
+
+        if station.occupied or station.is_broken:
+            self.__free_stations[station.display_resolution.ordinal].discard(station)
+        else:
+            self.__free_stations[station.display_resolution.ordinal].add(station)
+
+    def __count_server(self, server, delta: int, working_delta: int) -> None:
+        if server.have_gis:
+            self.__gis_servers += delta
+            self.__working_gis_servers += working_delta
+        if server.have_dbms:
+            self.__dbms_servers += delta
+            self.__working_dbms_servers += working_delta
+
+    def __attach_server(self, server) -> None:
+        server.subscribe(self)
+        if server.is_broken:
+            self.__broken_servers.add(server)
+        self.__count_server(server, 1, 0 if server.is_broken else 1)
+
+    def __detach_server(self, server) -> None:
+        server.unsubscribe(self)
+        self.__broken_servers.discard(server)
+        self.__count_server(server, -1, 0 if server.is_broken else -1)
+
+    def __update_server(self, server) -> None:
+        if server.is_broken:
+            if self.__broken_servers.add(server):
+                self.__count_server(server, 0, -1)
+        elif self.__broken_servers.discard(server):
+            self.__count_server(server, 0, 1)
+
+    def computer_state_changed(self, computer) -> None:
+        if isinstance(computer, Station):
+            self.__update_station(computer)
+        else:
+            self.__update_server(computer)
+
+    def station_occupancy_changed(self, station) -> None:
+        self.__update_station(station)
+
+    # Room -> Listener
+    def subscribe(self, listener: RoomListener) -> None:
+        if listener not in self.__listeners:
+            self.__listeners.append(listener)
+
+    def unsubscribe(self, listener: RoomListener) -> None:
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def __stations_changed(self) -> None:
+        for listener in self.__listeners:
+            listener.room_stations_changed(self)
+
+    def __servers_changed(self) -> None:
+        for listener in self.__listeners:
+            listener.room_servers_changed(self)
 
     # Room -- Station
     def add_station(self, station) -> None:
-        if station not in self.__stations:
-            self.__stations.append(station)
+        if self.__stations.add(station):
+            station.subscribe(self)
+            self.__update_station(station)
             station.set_computer_room(self)
+            self.__stations_changed()
+
+    def add_stations(self, stations) -> None:
+        # Bulk add_station; updates every index once per batch instead of per station
+        stations = [station for station in stations if station not in self.__stations]
+        self.__stations.extend(stations)
+        free = [[] for _ in RESOLUTIONS]
+        for station in stations:
+            station.subscribe(self)
+            station._join_room(self)
+            if not (station.occupied or station.is_broken):
+                free[station.display_resolution.ordinal].append(station)
+        self.__broken_stations.extend(station for station in stations if station.is_broken)
+        self.__occupied_stations.extend(station for station in stations if station.occupied)
+        for free_stations, batch in zip(self.__free_stations, free):
+            free_stations.extend(batch)
+        if stations:
+            self.__stations_changed()
 
     def remove_station(self, station) -> None:
-        if station in self.__stations:
-            self.__stations.remove(station)
+        if self.__stations.discard(station):
+            station.unsubscribe(self)
+            self.__broken_stations.discard(station)
+            self.__occupied_stations.discard(station)
+            self.__free_stations[station.display_resolution.ordinal].discard(station)
             station.remove_computer_room(self)
+            self.__stations_changed()
 
     # Room -> Server
     def add_server(self, server) -> None:
-        if server not in self.__servers:
-            self.__servers.append(server)
+        if self.__servers.add(server):
+            self.__attach_server(server)
+            self.__servers_changed()
 
     def remove_server(self, server) -> None:
-        if server in self.__servers:
-            self.__servers.remove(server)
+        if self.__servers.discard(server):
+            self.__detach_server(server)
+            self.__servers_changed()
@@ -10,16 +10,40 @@ class Resolution(enum.Enum):
     UltraHD = "3840x2160"
 
 
+# Position of each resolution, for lists indexed by resolution: hashing an Enum member
+# runs Python code, indexing a list does not
+for _ordinal, _resolution in enumerate(Resolution):
+    _resolution.ordinal = _ordinal
+del _ordinal, _resolution
+
+
+class ComputerListener:
+    def computer_state_changed(self, computer) -> None:
+        pass
+
+    def computer_repair_scheduled(self, computer, time: int) -> None:
+        pass
+
+    def station_occupancy_changed(self, station) -> None:
+        pass
+
+
 class Computer(SimulationObject, ABC):
+    __slots__ = ("_fix_time", "__crash_probability", "__broken", "_listeners", "_rng")
+
     _fix_time: int
     __crash_probability: float
     __broken: bool
+    _listeners: list[ComputerListener]
 
     @abstractmethod
     def __init__(self, crash_probability: float):
         self.__crash_probability = crash_probability
         self.__broken = False
         self._fix_time = 0
+        self._listeners = []
+        # Replaced by the simulation's generator when the computer is added to it
+        self._rng = random
 
     @abstractmethod
     def tick(self) -> None:
@@ -28,16 +52,34 @@ class Computer(SimulationObject, ABC):
                 self._fix_time -= 1
 
             if self._fix_time == 0:
-                self.__broken = False
-        elif not self.__broken and random.random() < self.__crash_probability:
-            self.__broken = True
+                self._set_broken(False)
+        elif not self.__broken and self._rng.random() < self.__crash_probability:
+            self._set_broken(True)
 
     def fix(self, time: int = 0) -> None:
         if time <= 0:
-            self.__broken = False
             self._fix_time = -1
+            self._set_broken(False)
         else:
             self._fix_time = time
+        for listener in self._listeners:
+            listener.computer_repair_scheduled(self, time)
+
+    def _set_broken(self, broken: bool) -> None:
+        if self.__broken == broken:
+            return
+        self.__broken = broken
+        for listener in self._listeners:
+            listener.computer_state_changed(self)
+
+    # Computer -> Listener
+    def subscribe(self, listener: ComputerListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ComputerListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
 
     @property
     def is_broken(self) -> bool:
@@ -49,6 +91,8 @@ class Computer(SimulationObject, ABC):
 
 
 class Server(Computer):
+    __slots__ = ("__crush_protect_used", "__have_crush_protect", "__have_dbms", "__have_gis")
+
     __crush_protect_used: bool
     __have_crush_protect: bool
     __have_dbms: bool
@@ -67,7 +111,8 @@ class Server(Computer):
             super().fix()
             self.__crush_protect_used = True
 
-
+    def _use_crush_protect(self) -> None:
+        self.__crush_protect_used = True
 
     @property
     def have_gis(self) -> bool:
@@ -86,17 +131,20 @@ class Server(Computer):
         return self.__crush_protect_used
 
 class Station(Computer):
+    __slots__ = ("__display_resolution", "__user", "__computer_room")
+
     __display_resolution: Resolution
 
     def __init__(self, crash_probability: float, display_resolution: Resolution,
-                 computer_room):
+                 computer_room=None):
         super().__init__(crash_probability)
         self.__display_resolution = display_resolution
-        self.__computer_room = computer_room
-        computer_room.add_station(self)
-
         self.__user = None
 
+        self.__computer_room = computer_room
+        if computer_room is not None:
+            computer_room.add_station(self)
+
     def tick(self) -> None:
         super().tick()
 
@@ -116,10 +164,22 @@ class Station(Computer):
     def have_dbms(self) -> bool:
         return self.__computer_room.have_dbms
 
+    @property
+    def have_working_gis(self) -> bool:
+        return self.__computer_room.have_working_gis
+
+    @property
+    def have_working_dbms(self) -> bool:
+        return self.__computer_room.have_working_dbms
+
     @property
     def user(self):
         return self.__user
 
+    @property
+    def computer_room(self):
+        return self.__computer_room
+
     # Station -- ComputerRoom
     def set_computer_room(self, room) -> None:
         if self.__computer_room is room:
@@ -130,6 +190,12 @@ class Station(Computer):
         self.__computer_room = room
         self.__computer_room.add_station(self)
 
+    def _join_room(self, room) -> None:
+        # For ComputerRoom.add_stations, which has already added the station to room
+        if self.__computer_room is not None and self.__computer_room is not room:
+            self.__computer_room.remove_station(self)
+        self.__computer_room = room
+
     def remove_computer_room(self, room) -> None:
         if room is self.__computer_room:
             self.__computer_room.remove_station(self)
@@ -143,10 +209,14 @@ class Station(Computer):
             user.remove_station(self)
 
         self.__user = user
+        for listener in self._listeners:
+            listener.station_occupancy_changed(self)
         self.__user.set_station(self)
 
     def remove_user(self, user):
         if self.__user is user:
             self.__user = None
+            for listener in self._listeners:
+                listener.station_occupancy_changed(self)
             user.remove_station(self)
 
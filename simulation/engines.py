@@ -0,0 +1,71 @@
+import importlib
+
+
+class TickEngine:
+    name = "tick"
+
+    def __init__(self, simulation):
+        self._simulation = simulation
+
+    def add_computer(self, computer) -> None:
+        pass
+
+    def add_computers(self, computers) -> None:
+        for computer in computers:
+            self.add_computer(computer)
+
+    def remove_computer(self, computer) -> None:
+        pass
+
+    def add_user(self, user) -> None:
+        pass
+
+    def remove_user(self, user) -> None:
+        pass
+
+    def room_servers_changed(self, room) -> None:
+        pass
+
+    def reseed(self) -> None:
+        pass
+
+    def fix_time(self, computer) -> int:
+        return computer._fix_time
+
+    def user_work_time(self, user) -> int:
+        return user.work_time
+
+    def chance(self, stream: str, probability: float) -> bool:
+        return self._simulation.rng.random() < probability
+
+    def run(self, ticks: int) -> None:
+        tick = self._simulation.tick
+        for _ in range(ticks):
+            tick()
+
+    def tick_servers(self) -> None:
+        for server in self._simulation.servers:
+            server.tick()
+
+    def tick_stations(self) -> None:
+        for station in self._simulation.stations:
+            station.tick()
+
+    def tick_users(self) -> None:
+        # Users leave the simulation while ticking
+        for user in list(self._simulation.users):
+            user.tick()
+
+
+ENGINES = {
+    "tick": "simulation.engines:TickEngine",
+    "vector": "simulation.vector:VectorEngine",
+    "event": "simulation.events:EventEngine",
+}
+
+
+def create_engine(name: str, simulation):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine: {name}")
+    module_name, class_name = ENGINES[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)(simulation)
@@ -0,0 +1,179 @@
+import math
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+from simulation import scenarios
+
+
+class Replication(NamedTuple):
+    seed: int
+    ticks: int
+    users_count: int
+    success_users_count: int
+    station_utilization: float
+    seconds: float
+    mean_time_to_repair: float = math.nan
+    crew_utilization: float = math.nan
+
+    @property
+    def success_rate(self) -> float:
+        if self.users_count == 0:
+            return math.nan
+        return self.success_users_count / self.users_count
+
+
+@dataclass
+class Estimate:
+    mean: float
+    std: float
+    low: float
+    high: float
+    n: int
+
+
+@dataclass
+class EnsembleResult:
+    scenario: str
+    replications: list[Replication]
+    success_rate: Estimate
+    station_utilization: Estimate
+    mean_time_to_repair: Estimate
+    crew_utilization: Estimate
+    confidence: float
+    seconds: float
+    settings: dict = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "scenario": self.scenario,
+            "settings": self.settings,
+            "confidence": self.confidence,
+            "seconds": self.seconds,
+            "success_rate": self.success_rate.__dict__,
+            "station_utilization": self.station_utilization.__dict__,
+            "mean_time_to_repair": self.mean_time_to_repair.__dict__,
+            "crew_utilization": self.crew_utilization.__dict__,
+            "replications": [r._asdict() for r in self.replications],
+        }
+
+
+def replication_seed(seed, index: int) -> int:
+    # Hashing (seed, index) gives every replication its own independent stream
+    return random.Random(f"{seed}:{index}").getrandbits(63)
+
+
+# Below this many degrees of freedom the quantile is found from the exact distribution
+EXACT_T_DF = 30
+# Bounds for estimates of a fraction
+PROPORTION = (0.0, 1.0)
+
+
+def student_t_cdf(t: float, df: int) -> float:
+    # Closed form for integer df (Abramowitz & Stegun 26.7.3 and 26.7.4)
+    theta = math.atan(abs(t) / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    term = total = 1.0
+    if df % 2:
+        for k in range(1, (df - 1) // 2):
+            term *= 2 * k / (2 * k + 1) * cos2
+            total += term
+        mass = 2 / math.pi * (theta + (math.sin(theta) * math.cos(theta) * total if df > 1 else 0.0))
+    else:
+        for k in range(1, df // 2):
+            term *= (2 * k - 1) / (2 * k) * cos2
+            total += term
+        mass = math.sin(theta) * total
+    return 0.5 + math.copysign(mass / 2, t)
+
+
+def student_t_quantile(p: float, df: int) -> float:
+    if df <= 0 or not 0 < p < 1:
+        return math.nan
+    if df < EXACT_T_DF:
+        if p < 0.5:
+            return -student_t_quantile(1 - p, df)
+        low, high = 0.0, 1.0
+        while student_t_cdf(high, df) < p:
+            low, high = high, high * 2
+        for _ in range(100):
+            middle = (low + high) / 2
+            if student_t_cdf(middle, df) < p:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2
+    # Cornish-Fisher expansion around the normal quantile
+    z = statistics.NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+def estimate(values, confidence: float = 0.95, bounds: tuple[float, float] = (-math.inf, math.inf)) -> Estimate:
+    values = [v for v in values if not math.isnan(v)]
+    n = len(values)
+    if n == 0:
+        return Estimate(math.nan, math.nan, math.nan, math.nan, 0)
+    mean = statistics.fmean(values)
+    if n == 1:
+        return Estimate(mean, math.nan, math.nan, math.nan, 1)
+    std = statistics.stdev(values)
+    half_width = student_t_quantile(0.5 + confidence / 2, n - 1) * std / math.sqrt(n)
+    low, high = bounds
+    return Estimate(mean, std, max(low, mean - half_width), min(high, mean + half_width), n)
+
+
+def replicate(scenario: str, seed: int, ticks: int, engine: str = "tick", settings: dict = None,
+              sample_every: int = 100) -> Replication:
+    start = time.perf_counter()
+    sim = scenarios.create(scenario, engine, settings, seed)
+
+    occupied = 0
+    samples = 0
+    done = 0
+    while done < ticks:
+        step = min(sample_every, ticks - done)
+        sim.run(step)
+        done += step
+        if len(sim.stations) > 0:
+            occupied += sim.working_users_count / len(sim.stations)
+            samples += 1
+
+    repairs = sim.repairs.stats()
+    return Replication(seed, ticks, sim.users_count, sim.success_users_count,
+                       occupied / samples if samples else math.nan, time.perf_counter() - start,
+                       repairs["mean_time_to_repair"], repairs["crew_utilization"])
+
+
+def _replicate(args) -> Replication:
+    return replicate(*args)
+
+
+def run(scenario: str = "small", replications: int = 100, workers: int = None, ticks: int = 10_000,
+        seed: int = None, engine: str = "tick", settings: dict = None, sample_every: int = 100,
+        confidence: float = 0.95) -> EnsembleResult:
+    if seed is None:
+        seed = random.getrandbits(63)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    tasks = [(scenario, replication_seed(seed, i), ticks, engine, settings, sample_every)
+             for i in range(replications)]
+    if workers <= 1:
+        results = list(map(_replicate, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_replicate, tasks,
+                                        chunksize=max(1, replications // (workers * 4))))
+
+    return EnsembleResult(scenario, results,
+                          estimate([r.success_rate for r in results], confidence, PROPORTION),
+                          estimate([r.station_utilization for r in results], confidence, PROPORTION),
+                          estimate([r.mean_time_to_repair for r in results], confidence, (0.0, math.inf)),
+                          estimate([r.crew_utilization for r in results], confidence, PROPORTION),
+                          confidence, time.perf_counter() - start, dict(settings or {}))
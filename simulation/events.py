@@ -0,0 +1,213 @@
+import heapq
+import math
+
+from simulation.computers import ComputerListener, Station
+from simulation.engines import TickEngine
+from simulation.repair import RANDOM
+
+CRASH = 0
+FIXED = 1
+WAKE = 2
+
+
+def geometric(probability: float, rng) -> float:
+    # Number of Bernoulli trials up to and including the first success
+    if probability <= 0:
+        return math.inf
+    if probability >= 1:
+        return 1
+    return math.floor(math.log(1.0 - rng.random()) / math.log(1.0 - probability)) + 1
+
+
+# Crash times, fix completions and user work completions are scheduled on a heap.
+# Ticks in which nothing can happen are skipped by run(); users that are working
+# at a valid station are parked and their work_time is settled lazily on wake-up.
+# Repair dispatch still needs every tick in which it could hand out a repair.
+# Under the random policy that is every tick while anything is broken: each pick
+# restarts a repair, so the next completion is only known by drawing the picks.
+# Between events run() does just that and leaves out the rest of the tick.
+class EventEngine(TickEngine, ComputerListener):
+    name = "event"
+
+    def __init__(self, simulation):
+        super().__init__(simulation)
+        self.__queue = []
+        self.__sequence = 0
+        self.__versions = {}
+        self.__fix_ticks = {}
+        self.__streams = {}
+
+        self.__active = {}
+        self.__parked = {}
+
+    def __schedule(self, tick, kind, obj) -> None:
+        version = self.__versions.get((kind, obj), 0) + 1
+        self.__versions[(kind, obj)] = version
+        if tick != math.inf:
+            self.__sequence += 1
+            heapq.heappush(self.__queue, (tick, self.__sequence, kind, obj, version))
+
+    def __cancel(self, kind, obj) -> None:
+        self.__versions[(kind, obj)] = self.__versions.get((kind, obj), 0) + 1
+
+    def __next_tick(self) -> float:
+        queue = self.__queue
+        while queue and self.__versions.get((queue[0][2], queue[0][3])) != queue[0][4]:
+            heapq.heappop(queue)
+        result = queue[0][0] if queue else math.inf
+        for next_tick, _ in self.__streams.values():
+            result = min(result, next_tick)
+        return result
+
+    @property
+    def now(self) -> int:
+        return self._simulation.ticks
+
+    # Computers
+    def add_computer(self, computer) -> None:
+        computer.subscribe(self)
+        if computer.is_broken:
+            if computer._fix_time > 0:
+                self.__fix_ticks[computer] = self.now + computer._fix_time
+                self.__schedule(self.now + computer._fix_time, FIXED, computer)
+        else:
+            self.__schedule(self.now + geometric(computer.chash_probability, self._simulation.rng), CRASH, computer)
+
+    def remove_computer(self, computer) -> None:
+        computer.unsubscribe(self)
+        self.__cancel(CRASH, computer)
+        self.__cancel(FIXED, computer)
+        self.__fix_ticks.pop(computer, None)
+
+    def computer_state_changed(self, computer) -> None:
+        if computer.is_broken:
+            self.__cancel(CRASH, computer)
+            if isinstance(computer, Station):
+                if computer.user in self.__parked:
+                    self.__wake(computer.user)
+            elif self._simulation.capabilities_need_working_server:
+                for room in self._simulation.computer_rooms:
+                    if computer in room.servers:
+                        self.__wake_room(room, self.now)
+        else:
+            self.__cancel(FIXED, computer)
+            self.__fix_ticks.pop(computer, None)
+            self.__schedule(self.now + geometric(computer.chash_probability, self._simulation.rng), CRASH, computer)
+
+    def reseed(self) -> None:
+        # Crash times and stream gaps were drawn from the old generator; they are
+        # memoryless, so redrawing them from now on leaves the model unchanged
+        simulation = self._simulation
+        for computer in [*simulation.servers, *simulation.stations]:
+            if not computer.is_broken:
+                self.__schedule(self.now + geometric(computer.chash_probability, simulation.rng), CRASH, computer)
+        self.__streams.clear()
+
+    def computer_repair_scheduled(self, computer, time: int) -> None:
+        if time > 0 and computer.is_broken:
+            self.__fix_ticks[computer] = self.now + time
+            self.__schedule(self.now + time, FIXED, computer)
+
+    def fix_time(self, computer) -> int:
+        if computer in self.__fix_ticks:
+            return self.__fix_ticks[computer] - self.now
+        return computer._fix_time
+
+    # Users
+    def add_user(self, user) -> None:
+        self.__active[user] = None
+
+    def remove_user(self, user) -> None:
+        self.__active.pop(user, None)
+        self.__parked.pop(user, None)
+        # Keep counting versions: the user object is recycled and stale wake-ups must not match
+        self.__cancel(WAKE, user)
+
+    def __park(self, user) -> None:
+        del self.__active[user]
+        self.__parked[user] = self.now
+        self.__schedule(self.now + user.work_time + 1, WAKE, user)
+
+    def __wake(self, user) -> None:
+        user._advance_work(self.now - 1 - self.__parked.pop(user))
+        self.__cancel(WAKE, user)
+        self.__active[user] = None
+
+    def __wake_room(self, room, tick: int) -> None:
+        for station in room.stations:
+            if station.user in self.__parked:
+                if tick <= self.now:
+                    self.__wake(station.user)
+                else:
+                    self.__schedule(tick, WAKE, station.user)
+
+    def room_servers_changed(self, room) -> None:
+        self.__wake_room(room, self.now + 1)
+
+    def user_work_time(self, user) -> int:
+        if user in self.__parked:
+            return user.work_time - (self.now - self.__parked[user])
+        return user.work_time
+
+    # Ticking
+    def chance(self, stream: str, probability: float) -> bool:
+        now = self.now
+        next_tick, stream_probability = self.__streams.get(stream, (None, None))
+        if stream_probability != probability:
+            next_tick = now - 1 + geometric(probability, self._simulation.rng)
+        if next_tick > now:
+            self.__streams[stream] = (next_tick, probability)
+            return False
+        self.__streams[stream] = (now + geometric(probability, self._simulation.rng), probability)
+        return True
+
+    def run(self, ticks: int) -> None:
+        simulation = self._simulation
+        end = simulation.ticks + ticks
+        # Streams are drawn by chance() during a tick, so the first tick of a run is never
+        # skipped: it draws new streams, e.g. after reseed(), and redraws changed probabilities
+        ticked = False
+        while simulation.ticks < end:
+            if ticked and not self.__active:
+                if not simulation.repairs.waiting:
+                    target = min(self.__next_tick(), end)
+                    if target - 1 > simulation.ticks:
+                        simulation._skip_ticks(int(target) - 1 - simulation.ticks)
+                elif simulation.repair_policy == RANDOM:
+                    # A pick schedules a fix, possibly before the next event
+                    while min(self.__next_tick(), end) - 1 > simulation.ticks:
+                        simulation._skip_ticks(1)
+                        simulation._dispatch_repairs()
+            simulation.tick()
+            ticked = True
+
+    def tick_servers(self) -> None:
+        now = self.now
+        queue = self.__queue
+        versions = self.__versions
+        while queue and queue[0][0] <= now:
+            _, _, kind, obj, version = heapq.heappop(queue)
+            # Versions are never reset, so an entry superseded before this one fired stays stale
+            if versions.get((kind, obj)) != version:
+                continue
+            if kind == CRASH:
+                if getattr(obj, "have_crush_protect", False) and not obj.crush_protect_used:
+                    obj._use_crush_protect()
+                    self.__schedule(now + geometric(obj.chash_probability, self._simulation.rng), CRASH, obj)
+                else:
+                    obj._set_broken(True)
+            elif kind == FIXED:
+                obj._fix_time = 0
+                obj._set_broken(False)
+            elif kind == WAKE and obj in self.__parked:
+                self.__wake(obj)
+
+    def tick_stations(self) -> None:
+        # Station events are handled together with server events in tick_servers
+        pass
+
+    def tick_users(self) -> None:
+        for user in list(self.__active):
+            user.tick()
+            if user in self.__active and user.have_station and user.can_work:
+                self.__park(user)
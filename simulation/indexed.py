@@ -0,0 +1,66 @@
+from collections.abc import Sequence
+
+
+class IndexedList(Sequence):
+    # Sequence with O(1) membership test, add and swap-remove, so random.choice and
+    # random.sample work on it. Removal moves the last item into the freed slot.
+
+    def __init__(self, items=()):
+        self.__items = []
+        self.__positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item) -> bool:
+        if item in self.__positions:
+            return False
+        self.__positions[item] = len(self.__items)
+        self.__items.append(item)
+        return True
+
+    def extend(self, items) -> None:
+        positions = self.__positions
+        items = [item for item in dict.fromkeys(items) if item not in positions]
+        start = len(self.__items)
+        positions.update(zip(items, range(start, start + len(items))))
+        self.__items.extend(items)
+
+    def discard(self, item) -> bool:
+        position = self.__positions.pop(item, None)
+        if position is None:
+            return False
+        last = self.__items.pop()
+        if position < len(self.__items):
+            self.__items[position] = last
+            self.__positions[last] = position
+        return True
+
+    def remove(self, item) -> None:
+        if not self.discard(item):
+            raise ValueError(f"{item!r} is not in IndexedList")
+
+    def __contains__(self, item) -> bool:
+        return item in self.__positions
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __getitem__(self, index):
+        return self.__items[index]
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def index(self, item, *args) -> int:
+        if item not in self.__positions:
+            raise ValueError(f"{item!r} is not in IndexedList")
+        return self.__positions[item]
+
+    def count(self, item) -> int:
+        return 1 if item in self.__positions else 0
+
+    def copy(self) -> "IndexedList":
+        return IndexedList(self.__items)
+
+    def __repr__(self) -> str:
+        return f"IndexedList({self.__items!r})"
@@ -0,0 +1,178 @@
+import json
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("Metrics recording requires numpy") from e
+
+from simulation.sim import SimulationListener
+
+# name: (dtype, one value per room)
+COLUMNS = {
+    "tick": ("<i8", False),
+    "users": ("<i4", False),
+    "working_users": ("<i4", False),
+    "broken_stations": ("<i4", False),
+    "broken_servers": ("<i4", False),
+    "free_stations": ("<i4", False),
+    "successes": ("<i4", False),
+    "failures": ("<i4", False),
+    "repair_queue": ("<i4", False),
+    "busy_crews": ("<i4", False),
+    "room_free_stations": ("<i4", True),
+}
+META = "meta.json"
+LENGTH = "length"
+
+
+def column_path(path, name: str) -> str:
+    return os.path.join(path, f"{name}.bin")
+
+
+# Appends a row every `stride` ticks to a directory with one raw file per column.
+# Files grow by `chunk` rows at a time; rows are buffered and written in blocks,
+# and the row count in the length file is updated after the data, so a reader
+# opening the directory mid-run only ever sees complete rows.
+class MetricsRecorder(SimulationListener):
+
+    def __init__(self, simulation, path, stride: int = 1, chunk: int = 65536, flush_every: int = 1024,
+                 profile=None):
+        if stride < 1:
+            raise ValueError("stride must be positive")
+        if not simulation.computer_rooms:
+            raise ValueError("Build the simulation before recording metrics")
+
+        self.__simulation = simulation
+        self.__path = path
+        self.__stride = stride
+        self.__chunk = chunk
+        self.__flush_every = flush_every
+        self.__rooms = list(simulation.computer_rooms)
+        # A running Profile adds a cumulative time column per tick phase
+        self.__profile = profile
+        self.__layout = dict(COLUMNS)
+        if profile is not None:
+            self.__layout.update({f"{phase}_ns": ("<i8", False) for phase in profile.phases})
+        self.__rows = 0
+        self.__capacity = 0
+        self.__columns = {}
+        self.__buffer = []
+        # Successes and failures are recorded as deltas since the previous row
+        self.__successes = simulation.success_users_count
+        self.__failures = self.__failed_users()
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, META), "w") as f:
+            json.dump({"stride": stride, "columns": {name: [dtype, [len(self.__rooms)] if per_room else []]
+                                                     for name, (dtype, per_room) in self.__layout.items()}}, f)
+        for name in self.__layout:
+            open(column_path(path, name), "wb").close()
+        self.__length = np.memmap(os.path.join(path, LENGTH), dtype="<i8", mode="w+", shape=(1,))
+        self.__grow(chunk)
+        simulation.subscribe(self)
+
+    @property
+    def stride(self) -> int:
+        return self.__stride
+
+    @property
+    def rows(self) -> int:
+        return self.__rows + len(self.__buffer)
+
+    def __failed_users(self) -> int:
+        simulation = self.__simulation
+        return simulation.users_count - simulation.success_users_count - len(simulation.users)
+
+    def __grow(self, rows: int) -> None:
+        self.__capacity += math.ceil(rows / self.__chunk) * self.__chunk
+        self.__columns.clear()
+        for name, (dtype, per_room) in self.__layout.items():
+            shape = (self.__capacity, len(self.__rooms)) if per_room else (self.__capacity,)
+            with open(column_path(self.__path, name), "r+b") as f:
+                f.truncate(np.dtype(dtype).itemsize * math.prod(shape))
+            self.__columns[name] = np.memmap(column_path(self.__path, name), dtype=dtype, mode="r+", shape=shape)
+
+    def __row(self, tick: int) -> tuple:
+        simulation = self.__simulation
+        successes = simulation.success_users_count
+        failures = self.__failed_users()
+        row = (tick, len(simulation.users), simulation.working_users_count, simulation.broken_stations_count,
+               simulation.broken_servers_count, simulation.free_stations_count,
+               successes - self.__successes, failures - self.__failures,
+               simulation.repairs.queued, simulation.repairs.busy_crews,
+               [room.free_stations_count for room in self.__rooms])
+        if self.__profile is not None:
+            row += tuple(stats.total_ns for stats in self.__profile.stats.values())
+        self.__successes = successes
+        self.__failures = failures
+        return row
+
+    def __write(self, values, n: int) -> None:
+        if self.__rows + n > self.__capacity:
+            self.__grow(self.__rows + n - self.__capacity)
+        start = self.__rows
+        for column, value in zip(self.__columns.values(), values):
+            column[start:start + n] = value
+        self.__rows += n
+        self.__length[0] = self.__rows
+
+    def flush(self) -> None:
+        if self.__buffer:
+            rows = self.__buffer
+            self.__buffer = []
+            self.__write(zip(*rows), len(rows))
+
+    def tick_finished(self, simulation) -> None:
+        if simulation.ticks % self.__stride == 0:
+            self.__buffer.append(self.__row(simulation.ticks))
+            if len(self.__buffer) >= self.__flush_every:
+                self.flush()
+
+    def ticks_skipped(self, simulation, ticks: int) -> None:
+        stride = self.__stride
+        end = simulation.ticks
+        first = (end - ticks) // stride * stride + stride
+        if first > end:
+            return
+        self.__buffer.append(self.__row(first))
+        idle = range(first + stride, end + 1, stride)
+        if idle:
+            # Nothing changes while ticks are skipped, so the rows only differ by tick
+            self.flush()
+            row = self.__row(0)
+            self.__write((np.arange(idle.start, idle.stop, stride),) + row[1:], len(idle))
+
+    def close(self) -> None:
+        self.__simulation.unsubscribe(self)
+        self.flush()
+        for column in self.__columns.values():
+            column.flush()
+        self.__length.flush()
+        self.__columns.clear()
+        for name, (dtype, per_room) in self.__layout.items():
+            row_size = np.dtype(dtype).itemsize * (len(self.__rooms) if per_room else 1)
+            with open(column_path(self.__path, name), "r+b") as f:
+                f.truncate(row_size * self.__rows)
+
+    def __enter__(self) -> "MetricsRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read(path) -> dict:
+    # Zero-copy views of the rows written so far; safe to call while recording
+    with open(os.path.join(path, META)) as f:
+        meta = json.load(f)
+    rows = int(np.fromfile(os.path.join(path, LENGTH), dtype="<i8")[0])
+    columns = {}
+    for name, (dtype, shape) in meta["columns"].items():
+        shape = (rows, *shape)
+        if rows == 0:
+            columns[name] = np.empty(shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(column_path(path, name), dtype=dtype, mode="r", shape=shape)
+    return columns
@@ -0,0 +1,132 @@
+import time
+from dataclasses import dataclass, field
+
+from simulation.sim import SimulationListener
+
+# Phases of Simulation.tick and the object that implements each of them;
+# "tick" is the whole tick including the phases
+PHASES = (
+    ("simulation", "tick"),
+    ("engine", "tick_servers"),
+    ("engine", "tick_stations"),
+    ("engine", "tick_users"),
+    ("simulation", "_spawn_users"),
+    ("simulation", "_dispatch_repairs"),
+    ("simulation", "_reshuffle"),
+)
+# Histogram bucket b counts calls that took [2**(b-1), 2**b) ns
+BUCKETS = 64
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    histogram: list[int] = field(default_factory=lambda: [0] * BUCKETS)
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.calls if self.calls else 0.0
+
+    def percentile(self, q: float) -> int:
+        # Upper bound of the bucket holding the q-th percentile, capped by the slowest call
+        target = q * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(1 << bucket, self.max_ns)
+        return 0
+
+    def as_dict(self) -> dict:
+        return {"calls": self.calls, "total_ns": self.total_ns, "mean_ns": self.mean_ns, "max_ns": self.max_ns,
+                "p50_ns": self.percentile(0.5), "p99_ns": self.percentile(0.99)}
+
+
+# Instruments a simulation by shadowing the phase methods with timed wrappers on the
+# instances themselves, so nothing is checked or timed while no profile is running.
+class Profile(SimulationListener):
+
+    def __init__(self, simulation, dump_every: int = 0, report=print):
+        self.__simulation = simulation
+        self.__dump_every = dump_every
+        self.__report = report
+        self.__stats = {name: PhaseStats() for _, name in PHASES}
+        self.__running = False
+
+    @property
+    def phases(self) -> tuple[str, ...]:
+        return tuple(self.__stats)
+
+    @property
+    def stats(self) -> dict[str, PhaseStats]:
+        return self.__stats
+
+    @property
+    def running(self) -> bool:
+        return self.__running
+
+    def __owners(self):
+        owners = {"simulation": self.__simulation, "engine": self.__simulation.engine}
+        return [(owners[owner], name) for owner, name in PHASES]
+
+    def __timed(self, name: str, method):
+        stats = self.__stats[name]
+        histogram = stats.histogram
+        clock = time.perf_counter_ns
+
+        def timed():
+            start = clock()
+            method()
+            elapsed = clock() - start
+            stats.calls += 1
+            stats.total_ns += elapsed
+            histogram[elapsed.bit_length()] += 1
+            if elapsed > stats.max_ns:
+                stats.max_ns = elapsed
+        return timed
+
+    def start(self) -> None:
+        if self.__running:
+            return
+        for owner, name in self.__owners():
+            setattr(owner, name, self.__timed(name, getattr(owner, name)))
+        if self.__dump_every > 0:
+            self.__simulation.subscribe(self)
+        self.__running = True
+
+    def stop(self) -> None:
+        if not self.__running:
+            return
+        for owner, name in self.__owners():
+            delattr(owner, name)
+        self.__simulation.unsubscribe(self)
+        self.__running = False
+
+    def reset(self) -> None:
+        # In place, the running wrappers hold on to the stats objects
+        for stats in self.__stats.values():
+            stats.calls = stats.total_ns = stats.max_ns = 0
+            stats.histogram[:] = [0] * BUCKETS
+
+    def as_dict(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.__stats.items()}
+
+    def summary(self) -> str:
+        lines = [f"{'phase':<18} {'calls':>9} {'total ms':>10} {'mean us':>9} {'p99 us':>9} {'max us':>9}"]
+        for name, stats in self.__stats.items():
+            lines.append(f"{name:<18} {stats.calls:>9} {stats.total_ns / 1e6:>10.1f} {stats.mean_ns / 1e3:>9.2f} "
+                         f"{stats.percentile(0.99) / 1e3:>9.2f} {stats.max_ns / 1e3:>9.2f}")
+        return "\n".join(lines)
+
+    def tick_finished(self, simulation) -> None:
+        if simulation.ticks % self.__dump_every == 0:
+            self.__report(f"tick {simulation.ticks}\n{self.summary()}")
+
+    def __enter__(self) -> "Profile":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
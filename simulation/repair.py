@@ -0,0 +1,200 @@
+import heapq
+import math
+
+from simulation.computers import ComputerListener, Server, Station
+
+# Every tick one random broken computer gets a new repair time, restarting its repair
+# if it was already running; crews are ignored
+RANDOM = "random"
+
+
+# Policies order the computers waiting for a crew, smallest key first; ties go to
+# the computer that broke first. time is the repair the computer will need.
+def fifo(simulation, computer, time: int) -> tuple:
+    return ()
+
+
+def servers_first(simulation, computer, time: int) -> tuple:
+    return (isinstance(computer, Station),)
+
+
+def shortest_fix_first(simulation, computer, time: int) -> tuple:
+    return (time,)
+
+
+def most_users_impacted(simulation, computer, time: int) -> tuple:
+    if isinstance(computer, Server):
+        return (-sum(room.users_count for room in simulation.computer_rooms if computer in room.servers),)
+    return (-computer.occupied,)
+
+
+POLICIES = {
+    "fifo": fifo,
+    "servers-first": servers_first,
+    "shortest-fix-first": shortest_fix_first,
+    "most-users-impacted": most_users_impacted,
+}
+
+
+def check_policy(policy) -> None:
+    if policy != RANDOM and policy not in POLICIES:
+        raise ValueError(f"Unknown repair policy {policy!r}, choose from: {', '.join([RANDOM, *POLICIES])}")
+
+
+# Repair crews take broken computers off a heap kept up to date by the simulation's
+# crash and fix events, so a dispatch costs O(log n). A crew stays with its computer
+# until it is fixed; each computer's repair time is drawn when it breaks.
+class RepairCrews(ComputerListener):
+
+    def __init__(self, simulation):
+        self.__simulation = simulation
+        # Policy the heap is keyed for, picked up from the settings on dispatch
+        self.__policy = None
+        self.__queue = []
+        self.__sequence = 0
+        # Waiting computer -> (sequence, repair time); heap entries with another sequence are stale
+        self.__jobs = {}
+        # Computer -> tick its crew started
+        self.__assigned = {}
+
+        self.__broken_since = {}
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        # Crew utilization and time to repair are measured from here, e.g. after a warm-up
+        now = self.__simulation.ticks
+        self.__start = now
+        self.__busy_ticks = 0
+        self.__repaired = 0
+        self.__repair_ticks = 0
+        self.__assigned = dict.fromkeys(self.__assigned, now)
+
+    @property
+    def queued(self) -> int:
+        return len(self.__jobs)
+
+    @property
+    def busy_crews(self) -> int:
+        return len(self.__assigned)
+
+    @property
+    def waiting(self) -> bool:
+        # Whether dispatch() has anything to do next tick
+        simulation = self.__simulation
+        if simulation.repair_policy == RANDOM:
+            return simulation.broken_stations_count + simulation.broken_servers_count > 0
+        if simulation.repair_policy != self.__policy:
+            return True
+        return bool(self.__jobs) and len(self.__assigned) < simulation.repair_crews
+
+    def __enqueue(self, computer) -> None:
+        simulation = self.__simulation
+        time = simulation.rng.randint(simulation.comp_min_fix_time, simulation.comp_max_fix_time)
+        self.__sequence += 1
+        self.__jobs[computer] = (self.__sequence, time)
+        heapq.heappush(self.__queue, (POLICIES[self.__policy](simulation, computer, time), self.__sequence, computer))
+
+    def __release(self, computer) -> None:
+        self.__jobs.pop(computer, None)
+        start = self.__assigned.pop(computer, None)
+        if start is not None:
+            self.__busy_ticks += self.__simulation.ticks - start
+
+    def __rebuild(self, policy: str) -> None:
+        # Computers already under repair keep it while there are crews for them
+        check_policy(policy)
+        simulation = self.__simulation
+        for computer in list(self.__assigned):
+            self.__release(computer)
+        self.__policy = policy
+        self.__queue = []
+        self.__jobs = {}
+        if policy == RANDOM:
+            return
+        engine = simulation.engine
+        for computer in [*simulation.broken_servers, *simulation.broken_stations]:
+            if engine.fix_time(computer) > 0 and len(self.__assigned) < simulation.repair_crews:
+                self.__assigned[computer] = simulation.ticks
+            else:
+                self.__enqueue(computer)
+
+    def dispatch(self) -> None:
+        simulation = self.__simulation
+        if simulation.repair_policy != self.__policy:
+            self.__rebuild(simulation.repair_policy)
+        if self.__policy == RANDOM:
+            # The simulation picks the computer; one repairer, busy while anything is broken
+            if simulation.broken_stations_count + simulation.broken_servers_count > 0:
+                self.__busy_ticks += 1
+            return
+
+        queue = self.__queue
+        jobs = self.__jobs
+        assigned = self.__assigned
+        crews = simulation.repair_crews
+        while jobs and len(assigned) < crews:
+            _, sequence, computer = heapq.heappop(queue)
+            job = jobs.get(computer)
+            if job is None or job[0] != sequence:
+                continue
+            del jobs[computer]
+            assigned[computer] = simulation.ticks
+            computer.fix(job[1])
+
+    def computer_state_changed(self, computer) -> None:
+        now = self.__simulation.ticks
+        if computer.is_broken:
+            self.__broken_since[computer] = now
+            if self.__policy is not None and self.__policy != RANDOM:
+                self.__enqueue(computer)
+        else:
+            since = self.__broken_since.pop(computer, None)
+            # Crush protection undoes a crash within its tick; that is not a repair
+            if since is not None and now > since:
+                self.__repaired += 1
+                self.__repair_ticks += now - since
+            self.__release(computer)
+
+    def computer_removed(self, computer) -> None:
+        self.__broken_since.pop(computer, None)
+        self.__release(computer)
+
+    def _state(self, ids: dict) -> dict:
+        # For checkpoints; ids numbers the computers
+        jobs = self.__jobs
+        return {
+            "policy": self.__policy,
+            "sequence": self.__sequence,
+            "queue": [[list(key), sequence, ids[computer]] for key, sequence, computer in self.__queue
+                      if jobs.get(computer, (None,))[0] == sequence],
+            "jobs": [[ids[computer], sequence, time] for computer, (sequence, time) in jobs.items()],
+            "assigned": [[ids[computer], start] for computer, start in self.__assigned.items()],
+            "broken_since": [[ids[computer], tick] for computer, tick in self.__broken_since.items()],
+            "stats": [self.__start, self.__busy_ticks, self.__repaired, self.__repair_ticks],
+        }
+
+    def _restore(self, state: dict, computers: list) -> None:
+        self.__policy = state["policy"]
+        self.__sequence = state["sequence"]
+        self.__queue = [(tuple(key), sequence, computers[i]) for key, sequence, i in state["queue"]]
+        heapq.heapify(self.__queue)
+        self.__jobs = {computers[i]: (sequence, time) for i, sequence, time in state["jobs"]}
+        self.__assigned = {computers[i]: start for i, start in state["assigned"]}
+        self.__broken_since = {computers[i]: tick for i, tick in state["broken_since"]}
+        self.__start, self.__busy_ticks, self.__repaired, self.__repair_ticks = state["stats"]
+
+    def stats(self) -> dict:
+        simulation = self.__simulation
+        now = simulation.ticks
+        elapsed = now - self.__start
+        crews = 1 if self.__policy == RANDOM else simulation.repair_crews
+        busy = self.__busy_ticks + sum(now - start for start in self.__assigned.values())
+        return {
+            "policy": simulation.repair_policy,
+            "crews": crews,
+            "repaired": self.__repaired,
+            "mean_time_to_repair": self.__repair_ticks / self.__repaired if self.__repaired else math.nan,
+            "crew_utilization": busy / (crews * elapsed) if elapsed > 0 and crews > 0 else math.nan,
+            "queued": len(self.__jobs),
+            "busy_crews": len(self.__assigned),
+        }
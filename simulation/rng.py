@@ -0,0 +1,112 @@
+import itertools
+import operator
+import random as _random
+from functools import partial
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Drop-in replacement for the random module functions the simulation uses.
+# With numpy, uniforms are pre-drawn in blocks and random() is a C-level next()
+# over them; without numpy it falls back to a private random.Random.
+class BufferedRandom:
+
+    def __init__(self, seed=None, block: int = 4096):
+        self.__block = block
+        self.seed(seed)
+
+    def seed(self, seed=None) -> None:
+        if np is not None:
+            self.__generator = np.random.default_rng(seed)
+            self.__start([])
+        else:
+            self.__generator = _random.Random(seed)
+            self.random = self.__generator.random
+
+    def __start(self, pending: list) -> None:
+        self.__current = pending
+        self.__iterator = iter(pending)
+        self.random = partial(next, itertools.chain(self.__iterator, itertools.chain.from_iterable(self.__blocks())))
+
+    def __blocks(self):
+        generator = self.__generator
+        block = self.__block
+        while True:
+            self.__current = generator.random(block).tolist()
+            self.__iterator = iter(self.__current)
+            yield self.__iterator
+
+    def getstate(self) -> dict:
+        # JSON-serializable; restoring it continues the stream exactly, without drawing from it
+        if np is None:
+            version, state, gauss = self.__generator.getstate()
+            return {"random": [version, list(state), gauss]}
+        pending = self.__current[len(self.__current) - operator.length_hint(self.__iterator):]
+        return {"numpy": self.__generator.bit_generator.state, "pending": pending}
+
+    def setstate(self, state: dict) -> None:
+        if "random" in state:
+            if np is not None:
+                raise ValueError("Random state was saved without numpy")
+            version, internal, gauss = state["random"]
+            self.__generator = _random.Random()
+            self.__generator.setstate((version, tuple(internal), gauss))
+            self.random = self.__generator.random
+        else:
+            if np is None:
+                raise ValueError("Random state was saved with numpy")
+            self.__generator = np.random.default_rng()
+            self.__generator.bit_generator.state = state["numpy"]
+            self.__start(list(state["pending"]))
+
+    def reseed(self) -> int:
+        # Replace the state with a fresh seed drawn from the stream itself
+        seed = self.getrandbits(64)
+        self.seed(seed)
+        return seed
+
+    def spawn(self, n: int) -> list["BufferedRandom"]:
+        return [BufferedRandom(self.getrandbits(64), self.__block) for _ in range(n)]
+
+    @property
+    def generator(self):
+        return self.__generator
+
+    def randrange(self, start: int, stop: int = None) -> int:
+        if stop is None:
+            return int(self.random() * start)
+        return start + int(self.random() * (stop - start))
+
+    def randint(self, a: int, b: int) -> int:
+        return a + int(self.random() * (b - a + 1))
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, seq, k: int = 1) -> list:
+        n = len(seq)
+        return [seq[int(self.random() * n)] for _ in range(k)]
+
+    def sample(self, seq, k: int) -> list:
+        pool = list(seq)
+        if k > len(pool):
+            raise ValueError("Sample larger than population")
+        for i in range(k):
+            j = i + int(self.random() * (len(pool) - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    def getrandbits(self, k: int) -> int:
+        result = 0
+        for _ in range(0, k, 32):
+            result = (result << 32) | int(self.random() * 4294967296)
+        return result >> (-k % 32)
+
+    def randbytes(self, n: int) -> bytes:
+        return self.getrandbits(n * 8).to_bytes(n, "little")
@@ -0,0 +1,36 @@
+import time
+from dataclasses import dataclass, asdict
+
+from simulation.sim import Simulation
+
+
+@dataclass
+class RunResult:
+    ticks: int
+    seconds: float
+    ticks_per_second: float
+    users_count: int
+    success_users_count: int
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def run(simulation: Simulation, ticks: int, report_every: int = 0, report=print) -> RunResult:
+    start = time.perf_counter()
+
+    if report_every <= 0:
+        simulation.run(ticks)
+    else:
+        done = 0
+        while done < ticks:
+            step = min(report_every, ticks - done)
+            simulation.run(step)
+            done += step
+            elapsed = time.perf_counter() - start
+            report(f"{done}/{ticks} ticks, {done / elapsed:.0f} ticks/s, "
+                   f"users {simulation.users_count}/{simulation.success_users_count}")
+
+    seconds = time.perf_counter() - start
+    return RunResult(ticks, seconds, ticks / seconds if seconds > 0 else float("inf"),
+                     simulation.users_count, simulation.success_users_count)
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+from simulation import checkpoint, repair
+from simulation.computers import Server, Station, Resolution
+from simulation.engines import create_engine
+from simulation.sim import Simulation
+
+# Next to a scenario file that asks for caching
+CACHE_DIR = ".scenario_cache"
+
+
+def small(sim: Simulation) -> None:
+    rng = sim.rng
+    for i in range(rng.randint(2, 5)):
+        sim.add_server(Server(rng.uniform(0.000001, 0.0001), bool(rng.randbytes(1)), bool(rng.randbytes(1)),
+                              bool(rng.randbytes(1))))
+
+    stations = []
+    for i in range(rng.randint(2, 4)):
+        room = sim.create_room(rng.choices(sim.servers, k=rng.randint(2, len(sim.servers))))
+        batch = [Station(rng.uniform(0.0005, 0.001),
+                         rng.choice((Resolution.HD, Resolution.UltraHD, Resolution.FullHD))) for j in range(2, 9)]
+        room.add_stations(batch)
+        stations.extend(batch)
+    sim.add_stations(stations)
+
+
+def campus(sim: Simulation, servers: int = 40, rooms: int = 100, stations: int = 30) -> None:
+    rng = sim.rng
+    for i in range(servers):
+        sim.add_server(Server(rng.uniform(0.000001, 0.0001), bool(rng.randbytes(1)), bool(rng.randbytes(1)),
+                              bool(rng.randbytes(1))))
+
+    built = []
+    for i in range(rooms):
+        room = sim.create_room(rng.sample(sim.servers, k=rng.randint(2, min(6, len(sim.servers)))))
+        batch = [Station(rng.uniform(0.0005, 0.001),
+                         rng.choice((Resolution.HD, Resolution.UltraHD, Resolution.FullHD))) for j in range(stations)]
+        room.add_stations(batch)
+        built.extend(batch)
+    sim.add_stations(built)
+
+
+SCENARIOS = {
+    "small": small,
+    "campus": campus,
+}
+
+
+# Scenario files (TOML or JSON) describe a topology declaratively:
+#
+#   seed = 1                      # optional default seed
+#   cache = true                  # optional, keep built topologies in .scenario_cache
+#   [settings]                    # Simulation settings, as for --set
+#   user_spawn_prob = 1.0
+#   [[servers]]                   # a pool of identical-looking servers
+#   name = "core"
+#   count = 40
+#   crash_probability = [0.000001, 0.0001]
+#   gis = 0.5                     # true/false, or the chance that a server has it
+#   dbms = true
+#   crush_protect = false
+#   [[rooms]]                     # a group of identical-looking rooms
+#   count = 100
+#   servers = { core = [2, 6] }   # distinct servers per room from each pool; a bare
+#                                 # count or range draws from all servers
+#   crash_probability = [0.0005, 0.001]
+#   stations = { HD = 10, FullHD = 10, UltraHD = [5, 15] }
+#
+# Counts and probabilities are a number or a [low, high] range drawn per object.
+def read_scenario(path) -> dict:
+    path = str(path)
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ValueError("TOML scenarios need Python 3.11 or later; use JSON instead")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_scenario_file(name: str) -> bool:
+    return name not in SCENARIOS and (name.endswith((".toml", ".json")) or os.path.isfile(name))
+
+
+def fingerprint(name: str) -> str:
+    # Identifies a scenario's content for result caches; built-in scenarios by name
+    if not is_scenario_file(name):
+        return name
+    return hashlib.sha256(json.dumps(read_scenario(name), sort_keys=True).encode()).hexdigest()
+
+
+def _count(value, rng, what: str) -> int:
+    if isinstance(value, list):
+        low, high = value
+        value = rng.randint(low, high)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"Expected a count or a [low, high] range for {what}, got {value!r}")
+    return value
+
+
+def _probability(value, rng, what: str) -> float:
+    if isinstance(value, list):
+        low, high = value
+        return rng.uniform(low, high)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Expected a probability or a [low, high] range for {what}, got {value!r}")
+    return value
+
+
+def _flag(value, rng) -> bool:
+    if isinstance(value, bool):
+        return value
+    return rng.random() < value
+
+
+def check_setting(key: str, value) -> None:
+    if not hasattr(Simulation, key):
+        raise ValueError(f"Unknown simulation setting: {key}")
+    if key == "repair_policy":
+        repair.check_policy(value)
+
+
+def apply_settings(sim: Simulation, settings: dict) -> None:
+    for key, value in (settings or {}).items():
+        check_setting(key, value)
+        setattr(sim, key, value)
+
+
+def build_scenario(spec: dict, sim: Simulation) -> None:
+    # One pass: servers, then rooms with their stations attached in bulk
+    rng = sim.rng
+    apply_settings(sim, spec.get("settings"))
+
+    pools = {}
+    for i, pool in enumerate(spec.get("servers", ())):
+        name = pool.get("name", f"pool{i}")
+        if name in pools:
+            raise ValueError(f"Duplicate server pool: {name}")
+        pools[name] = [Server(_probability(pool.get("crash_probability", [0.000001, 0.0001]), rng, name),
+                              _flag(pool.get("gis", 0.5), rng), _flag(pool.get("dbms", 0.5), rng),
+                              _flag(pool.get("crush_protect", 0.5), rng))
+                       for _ in range(_count(pool.get("count", 1), rng, name))]
+        for server in pools[name]:
+            sim.add_server(server)
+    servers = [server for pool in pools.values() for server in pool]
+
+    stations = []
+    for i, group in enumerate(spec.get("rooms", ())):
+        name = group.get("name", f"rooms{i}")
+        attach = group.get("servers", [2, 6])
+        counts = group.get("stations", {})
+        unknown = set(counts) - {resolution.name for resolution in Resolution}
+        if unknown:
+            raise ValueError(f"Unknown resolution in {name}: {', '.join(sorted(unknown))}")
+        for _ in range(_count(group.get("count", 1), rng, name)):
+            if isinstance(attach, dict):
+                if set(attach) - set(pools):
+                    raise ValueError(f"Unknown server pool in {name}: {', '.join(sorted(set(attach) - set(pools)))}")
+                room_servers = []
+                for pool, count in attach.items():
+                    room_servers += rng.sample(pools[pool], min(_count(count, rng, name), len(pools[pool])))
+            else:
+                room_servers = rng.sample(servers, min(_count(attach, rng, name), len(servers)))
+            room = sim.create_room(room_servers)
+            batch = [Station(_probability(group.get("crash_probability", [0.0005, 0.001]), rng, name),
+                             Resolution[resolution])
+                     for resolution, count in counts.items() for _ in range(_count(count, rng, name))]
+            room.add_stations(batch)
+            stations.extend(batch)
+    sim.add_stations(stations)
+
+
+def cache_path(cache_dir, spec: dict, seed: int) -> str:
+    from simulation.sweep import engine_version
+    key = hashlib.sha256(json.dumps({"scenario": spec, "seed": seed, "version": engine_version()},
+                                    sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{key[:32]}.ckpt")
+
+
+def from_scenario(scenario, engine: str = "tick", seed=None, settings: dict = None, cache=None) -> Simulation:
+    # The topology is built with the tick engine, so it does not depend on the engine
+    # asked for. A cached topology is a checkpoint of the build, generator state
+    # included; loading it hands the computers to the engine in the same order as
+    # swapping engines after a build, so runs do not depend on the cache.
+    spec = scenario
+    if not isinstance(scenario, dict):
+        spec = read_scenario(scenario)
+        if cache is None and spec.get("cache"):
+            cache = os.path.join(os.path.dirname(os.path.abspath(scenario)), CACHE_DIR)
+    if seed is None:
+        seed = spec.get("seed")
+
+    path = cache_path(cache, spec, seed) if cache and seed is not None else None
+    if path is not None and os.path.exists(path):
+        sim = checkpoint.load(path, engine)
+    else:
+        sim = Simulation(seed=seed)
+        build_scenario(spec, sim)
+        if path is not None:
+            os.makedirs(cache, exist_ok=True)
+            checkpoint.save(sim, path)
+        if engine != "tick":
+            sim._replace_engine(create_engine(engine, sim))
+
+    apply_settings(sim, settings)
+    return sim
+
+
+def build(name: str, sim: Simulation = None) -> Simulation:
+    if name not in SCENARIOS:
+        raise ValueError(f"Unknown scenario: {name}")
+    if sim is None:
+        sim = Simulation()
+    SCENARIOS[name](sim)
+    return sim
+
+
+def create(name: str, engine: str = "tick", settings: dict = None, seed=None) -> Simulation:
+    # A built-in scenario by name, or a scenario file
+    if is_scenario_file(name):
+        try:
+            return from_scenario(name, engine, seed, settings)
+        except (OSError, KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot load scenario {name}: {e}") from e
+    # Built on the tick engine like scenario files, so a seed gives the same topology on every engine
+    sim = Simulation(seed=seed)
+    apply_settings(sim, settings)
+    build(name, sim)
+    if engine != "tick":
+        sim._replace_engine(create_engine(engine, sim))
+    return sim
@@ -0,0 +1,418 @@
+import bisect
+import multiprocessing
+import os
+import struct
+import threading
+from multiprocessing import shared_memory
+
+from simulation.computers import Resolution, Station
+from simulation.engines import TickEngine
+from simulation.ensemble import replication_seed
+from simulation.repair import RANDOM
+from simulation.rng import BufferedRandom
+
+RESOLUTIONS = (Resolution.HD, Resolution.FullHD, Resolution.UltraHD)
+
+# Cross-shard message: kind, resolution, flags, room attempts, destination room,
+# work time or fix time, crash probability
+RECORD = struct.Struct("<BBBBiqd")
+USER = 0
+STATION = 1
+NEED_GIS = 1
+NEED_DBMS = 2
+BROKEN = 4
+
+# Counters every shard publishes in shared memory at each barrier
+STATS = ("ticks", "users_count", "success_users_count", "users", "working_users", "stations",
+         "broken_stations", "free_stations", "broken_servers", "outbox")
+FIELDS = {name: i for i, name in enumerate(STATS)}
+
+
+def partition(rooms, shards: int) -> list[int]:
+    # Owner shard of every room: largest rooms first, each onto the least loaded shard
+    loads = [0] * shards
+    owners = [0] * len(rooms)
+    for r in sorted(range(len(rooms)), key=lambda r: -len(rooms[r].stations)):
+        shard = loads.index(min(loads))
+        owners[r] = shard
+        loads[shard] += len(rooms[r].stations) + 1
+    return owners
+
+
+# Runs one shard inside a worker process forked from the full simulation. The shard
+# ticks only the stations and users of the rooms it owns. Servers, room/server
+# assignments and every global decision (spawns, which shard gets the repair crew,
+# station and server reshuffles) are replicated: each shard draws them from the same
+# seeded stream using counts published at the last barrier, so all shards agree
+# without a round trip. Users moving to a room of another shard and stations
+# reshuffled into one are sent through the shared-memory outboxes and arrive at the
+# next barrier.
+class ShardEngine(TickEngine):
+    name = "shard"
+
+    def __init__(self, simulation, index: int, owners: list[int], seed: int, stats, outboxes, capacity: int,
+                 barrier, epoch: int):
+        super().__init__(simulation)
+        self.__index = index
+        self.__owners = owners
+        self.__shards = len(outboxes)
+        self.__rooms = list(simulation.computer_rooms)
+        self.__local_rooms = [room for room, owner in zip(self.__rooms, owners) if owner == index]
+        self.__room_index = {room: r for r, room in enumerate(self.__rooms)}
+        self.__stats = stats
+        self.__outboxes = outboxes
+        self.__capacity = capacity
+        self.__sent = 0
+        self.__barrier = barrier
+        self.__epoch = epoch
+        self.__global = BufferedRandom(seed)
+        self.__broken_starts = [0] * self.__shards
+        self.__broken_total = 0
+        self.__free_starts = [0] * self.__shards
+        self.__free_total = 0
+
+        simulation._replace_engine(self)
+        simulation.reseed(replication_seed(seed, index))
+        for server in simulation.servers:
+            server._rng = self.__global
+        users = list(simulation.users)
+        for user, owner in [(user, self.__owner(user, i)) for i, user in enumerate(users)]:
+            if owner != index:
+                user.remove()
+        for station in list(simulation.stations):
+            room = station.computer_room
+            if (self.__owners[self.__room_index[room]] if room is not None else 0) != index:
+                simulation.remove_station(station)
+        # Replicated users and counters are carried by the parent; shards count from zero
+        simulation._restore_counters(simulation.ticks, 0, 0)
+
+        simulation._spawn_users = self.__spawn_users
+        simulation._dispatch_repairs = self.__dispatch_repairs
+        simulation._reshuffle = self.__reshuffle
+        self.__publish()
+        self.__barrier.wait()
+        self.__snapshot()
+
+    def __owner(self, user, i: int) -> int:
+        _, _, _, _, room, station, _, _ = user._state()
+        if station is not None:
+            room = station.computer_room
+        if room is None:
+            return i % self.__shards
+        return self.__owners[self.__room_index[room]]
+
+    def run(self, ticks: int) -> None:
+        # Every run ends on a barrier, so the published counters are current
+        tick = self._simulation.tick
+        done = 0
+        while done < ticks:
+            step = min(self.__epoch, ticks - done)
+            for _ in range(step):
+                tick()
+            done += step
+            self.__exchange()
+
+    # Barrier
+    def __exchange(self) -> None:
+        fields = len(STATS)
+        self.__stats[self.__index * fields + FIELDS["outbox"]] = self.__sent
+        self.__barrier.wait()
+        for shard, outbox in enumerate(self.__outboxes):
+            if shard == self.__index:
+                continue
+            for i in range(self.__stats[shard * fields + FIELDS["outbox"]]):
+                record = RECORD.unpack_from(outbox, i * RECORD.size)
+                if self.__owners[record[4]] == self.__index:
+                    self.__receive(*record)
+        self.__sent = 0
+        self.__publish()
+        self.__barrier.wait()
+        self.__snapshot()
+
+    def __publish(self) -> None:
+        sim = self._simulation
+        base = self.__index * len(STATS)
+        for i, value in enumerate((sim.ticks, sim.users_count, sim.success_users_count, len(sim.users),
+                                   sim.working_users_count, len(sim.stations), sim.broken_stations_count,
+                                   sim.free_stations_count, sim.broken_servers_count)):
+            self.__stats[base + i] = value
+
+    def __snapshot(self) -> None:
+        fields = len(STATS)
+        broken = [self.__stats[s * fields + FIELDS["broken_stations"]] for s in range(self.__shards)]
+        free = [self.__stats[s * fields + FIELDS["free_stations"]] for s in range(self.__shards)]
+        self.__broken_starts = [sum(broken[:s]) for s in range(self.__shards)]
+        self.__broken_total = sum(broken)
+        self.__free_starts = [sum(free[:s]) for s in range(self.__shards)]
+        self.__free_total = sum(free)
+
+    def __send(self, kind: int, resolution: Resolution, flags: int, room_attempts: int, room: int, time: int,
+               probability: float) -> None:
+        if self.__sent == self.__capacity:
+            raise RuntimeError(f"Shard {self.__index} outbox is full; use a shorter epoch or a larger capacity")
+        RECORD.pack_into(self.__outboxes[self.__index], self.__sent * RECORD.size, kind,
+                         RESOLUTIONS.index(resolution), flags, room_attempts, room, time, probability)
+        self.__sent += 1
+
+    def __receive(self, kind: int, resolution: int, flags: int, room_attempts: int, room: int, time: int,
+                  probability: float) -> None:
+        sim = self._simulation
+        room = self.__rooms[room]
+        if kind == USER:
+            user = sim.create_user(RESOLUTIONS[resolution], bool(flags & NEED_GIS), bool(flags & NEED_DBMS), time)
+            user._restore(room, 0, room_attempts)
+        else:
+            station = Station(probability, RESOLUTIONS[resolution])
+            station._fix_time = time
+            if flags & BROKEN:
+                station._set_broken(True)
+            room.add_station(station)
+            sim.add_station(station)
+
+    # Local phases
+    def tick_servers(self) -> None:
+        # Replicated: every shard draws the same crashes from the shared stream
+        for server in self._simulation.servers:
+            server.tick()
+
+    def tick_users(self) -> None:
+        for user in list(self._simulation.users):
+            if user.have_room or user.work_time <= 0:
+                user.tick()
+            else:
+                self.__choose_room(user)
+
+    def __choose_room(self, user) -> None:
+        # User.tick would only pick among rooms; a pick owned by another shard moves the user there
+        resolution, need_gis, need_dbms, work_time, _, _, _, room_attempts = user._state()
+        if room_attempts > 3:
+            user.tick()
+            return
+        rng = self._simulation.rng
+        r = rng.randrange(len(self.__rooms))
+        if self.__owners[r] == self.__index:
+            room = self.__rooms[r]
+        elif room_attempts < 3 and not user.have_station:
+            self.__send(USER, resolution, NEED_GIS * need_gis | NEED_DBMS * need_dbms, room_attempts + 1, r,
+                        work_time, 0.0)
+            user.remove()
+            return
+        else:
+            # Holding a station here, or out of attempts after this room anyway
+            room = rng.choice(self.__local_rooms)
+        user._restore(room, 0, room_attempts + 1)
+
+    # Replicated phases, shadowing the Simulation methods
+    def __spawn_users(self) -> None:
+        sim, rng = self._simulation, self.__global
+        if rng.random() < sim.user_spawn_prob:
+            resolution = rng.choice(RESOLUTIONS)
+            need_gis = rng.random() < sim.user_need_gis_prob
+            need_dbms = rng.random() < sim.user_need_dbms_prob
+            work_time = rng.randint(sim.user_min_worktime, sim.user_max_worktime)
+            r = rng.randrange(len(self.__rooms))
+            if self.__owners[r] == self.__index:
+                sim._restore_counters(sim.ticks, sim.users_count + 1, sim.success_users_count)
+                sim.create_user(resolution, need_gis, need_dbms, work_time)._restore(self.__rooms[r], 0, 1)
+
+    def __dispatch_repairs(self) -> None:
+        sim, rng = self._simulation, self.__global
+        total = self.__broken_total + sim.broken_servers_count
+        if total > 0:
+            i = rng.randrange(total)
+            time = rng.randint(sim.comp_min_fix_time, sim.comp_max_fix_time)
+            if i >= self.__broken_total:
+                sim.broken_servers[i - self.__broken_total].fix(time)
+            elif bisect.bisect_right(self.__broken_starts, i) - 1 == self.__index and sim.broken_stations_count:
+                sim.rng.choice(sim.broken_stations).fix(time)
+
+    def __reshuffle(self) -> None:
+        sim, rng, rooms = self._simulation, self.__global, self.__rooms
+        if rng.random() < sim.station_replace_prob and self.__free_total > 0:
+            i = rng.randrange(self.__free_total)
+            r = rng.randrange(len(rooms))
+            if bisect.bisect_right(self.__free_starts, i) - 1 == self.__index and sim.free_stations_count:
+                station = sim.rng.choice(sim.free_stations)
+                if self.__owners[r] == self.__index:
+                    station.set_computer_room(rooms[r])
+                else:
+                    self.__send(STATION, station.display_resolution, BROKEN * station.is_broken, 0, r,
+                                station._fix_time, station.chash_probability)
+                    sim.remove_station(station)
+
+        if rng.random() < sim.server_replace_prob:
+            candidates = [room for room in rooms if len(room.servers) > 1]
+            if candidates:
+                room = rng.choice(candidates)
+                room.remove_server(rng.choice(room.servers))
+                self.room_servers_changed(room)
+
+        if rng.random() < sim.server_replace_prob:
+            server = rng.choice(sim.servers)
+            candidates = [room for room in rooms if server not in room.servers]
+            if candidates:
+                rng.choice(candidates).add_server(server)
+
+
+def _serve(simulation, index, owners, seed, memory, shards, capacity, barrier, epoch, connection) -> None:
+    stats, outboxes = _views(memory, shards, capacity)
+    try:
+        engine = ShardEngine(simulation, index, owners, seed, stats, outboxes, capacity, barrier, epoch)
+        connection.send(None)
+        while (ticks := connection.recv()) is not None:
+            engine.run(ticks)
+            connection.send(None)
+    except threading.BrokenBarrierError:
+        connection.send(f"shard {index}: barrier broken by another shard")
+    except BaseException as e:
+        barrier.abort()
+        connection.send(f"shard {index}: {e!r}")
+    finally:
+        for view in outboxes:
+            view.release()
+        stats.release()
+
+
+def _views(memory, shards: int, capacity: int):
+    size = shards * len(STATS) * 8
+    stats = memory.buf[:size].cast("q")
+    box = capacity * RECORD.size
+    return stats, [memory.buf[size + s * box:size + (s + 1) * box] for s in range(shards)]
+
+
+# Parent side of a sharded run. The simulation is handed over: its rooms are split
+# between forked worker processes and it must not be ticked afterwards; read the
+# totals from here instead. Counters are summed over the shards at epoch barriers.
+class ShardedSimulation:
+
+    def __init__(self, simulation, shards: int = None, epoch: int = 1, seed: int = None, capacity: int = 4096):
+        rooms = simulation.computer_rooms
+        shards = shards or os.cpu_count() or 1
+        if not 1 <= shards <= len(rooms):
+            raise ValueError(f"Need between 1 and {len(rooms)} shards, got {shards}")
+        if epoch < 1:
+            raise ValueError("Epoch must be at least one tick")
+        if simulation.repair_policy != RANDOM:
+            # Crews would need one queue across the shards
+            raise ValueError(f"Repair policy {simulation.repair_policy} needs an unsharded run")
+        if seed is None:
+            seed = simulation.rng.getrandbits(63)
+
+        self.__shards = shards
+        self.__epoch = epoch
+        self.__owners = partition(rooms, shards)
+        self.__base = (simulation.users_count, simulation.success_users_count)
+        self.__memory = shared_memory.SharedMemory(create=True,
+                                                   size=shards * (len(STATS) * 8 + capacity * RECORD.size))
+        self.__stats, outboxes = _views(self.__memory, shards, capacity)
+        for view in outboxes:
+            view.release()
+
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(shards)
+        self.__connections = []
+        self.__processes = []
+        for index in range(shards):
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, name=f"shard-{index}", daemon=True,
+                                      args=(simulation, index, self.__owners, seed, self.__memory, shards, capacity,
+                                            barrier, epoch, child))
+            process.start()
+            child.close()
+            self.__connections.append(parent)
+            self.__processes.append(process)
+        self.__wait()
+
+    @property
+    def shards(self) -> int:
+        return self.__shards
+
+    @property
+    def epoch(self) -> int:
+        return self.__epoch
+
+    @property
+    def owners(self) -> list[int]:
+        return self.__owners
+
+    def __wait(self) -> None:
+        errors = [connection.recv() for connection in self.__connections]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            self.close()
+            # Shards stopped by a broken barrier only echo the first failure
+            raise RuntimeError(min(errors, key=lambda error: "barrier broken" in error))
+
+    def run(self, ticks: int) -> None:
+        if not self.__connections:
+            raise RuntimeError("Sharded simulation is closed")
+        for connection in self.__connections:
+            connection.send(ticks)
+        self.__wait()
+
+    def close(self) -> None:
+        for connection in self.__connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for process in self.__processes:
+            process.join()
+        self.__connections = []
+        self.__processes = []
+        if self.__stats is not None:
+            self.__stats.release()
+            self.__stats = None
+            self.__memory.close()
+            self.__memory.unlink()
+
+    def __enter__(self) -> "ShardedSimulation":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def shard_stats(self) -> list[dict]:
+        fields = len(STATS)
+        return [{name: self.__stats[s * fields + i] for i, name in enumerate(STATS[:-1])}
+                for s in range(self.__shards)]
+
+    def __total(self, name: str) -> int:
+        i = FIELDS[name]
+        return sum(self.__stats[s * len(STATS) + i] for s in range(self.__shards))
+
+    @property
+    def ticks(self) -> int:
+        return self.__stats[FIELDS["ticks"]]
+
+    @property
+    def users_count(self) -> int:
+        return self.__base[0] + self.__total("users_count")
+
+    @property
+    def success_users_count(self) -> int:
+        return self.__base[1] + self.__total("success_users_count")
+
+    @property
+    def live_users_count(self) -> int:
+        return self.__total("users")
+
+    @property
+    def working_users_count(self) -> int:
+        return self.__total("working_users")
+
+    @property
+    def stations_count(self) -> int:
+        return self.__total("stations")
+
+    @property
+    def broken_stations_count(self) -> int:
+        return self.__total("broken_stations")
+
+    @property
+    def free_stations_count(self) -> int:
+        return self.__total("free_stations")
+
+    @property
+    def broken_servers_count(self) -> int:
+        return self.__stats[FIELDS["broken_servers"]]
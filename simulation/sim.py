@@ -1,19 +1,35 @@
+import os
 import random
 
+from simulation import checkpoint
 from simulation.computer_room import ComputerRoom
-from simulation.computers import Server, Station, Resolution
+from simulation.computers import ComputerListener, Server, Station, Resolution
+from simulation.engines import create_engine
+from simulation.indexed import IndexedList
+from simulation.repair import RepairCrews, RANDOM
+from simulation.rng import BufferedRandom
 from simulation.user import User
 
 
-def chance(probability=0.5):
-    return random.random() < probability
+def chance(probability=0.5, rng=random):
+    return rng.random() < probability
 
 
-class Simulation:
-    __users: list[User]
-    __servers: list[Server]
-    __stations: list[Station]
-    __rooms: list[ComputerRoom]
+class SimulationListener:
+
+    def tick_finished(self, simulation) -> None:
+        pass
+
+    def ticks_skipped(self, simulation, ticks: int) -> None:
+        # The engine advanced the clock without running ticks; nothing changed meanwhile
+        pass
+
+
+class Simulation(ComputerListener):
+    __users: IndexedList
+    __servers: IndexedList
+    __stations: IndexedList
+    __rooms: IndexedList
 
     # simulation settings
     # user
@@ -27,15 +43,122 @@ class Simulation:
     comp_max_fix_time = 60
     station_replace_prob = 1 / 200
     server_replace_prob = 1 / 2000
+    # a room loses GIS/DBMS while all servers providing it are broken
+    capabilities_need_working_server = False
+    # repair: "random" or one of repair.POLICIES, which send repair_crews crews
+    repair_policy = RANDOM
+    repair_crews = 1
+
+    def __init__(self, engine: str = "tick", seed=None, rng=None):
+        self.__rng = rng if rng is not None else BufferedRandom(seed)
+        self.__users = IndexedList()
+        self.__servers = IndexedList()
+        self.__stations = IndexedList()
+        self.__rooms = IndexedList()
+        # Removed users, recycled by create_user
+        self.__user_pool = []
 
-    def __init__(self):
-        self.__users = []
-        self.__servers = []
-        self.__stations = []
-        self.__rooms = []
+        self.__broken_stations = IndexedList()
+        self.__broken_servers = IndexedList()
+        self.__free_stations = IndexedList()
+        self.__occupied_stations = IndexedList()
+        self.__gis_servers = 0
+        self.__dbms_servers = 0
 
         self.__all_time_users = 0
         self.__successful_users = 0
+        self.__ticks = 0
+
+        self.__repairs = RepairCrews(self)
+        self.__engine = create_engine(engine, self)
+        self.__forks = []
+        self.__listeners = []
+
+    @property
+    def rng(self):
+        return self.__rng
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def ticks(self) -> int:
+        return self.__ticks
+
+    @property
+    def repairs(self) -> RepairCrews:
+        return self.__repairs
+
+    @property
+    def settings(self) -> dict:
+        return {key: getattr(self, key) for key, value in vars(Simulation).items()
+                if not key.startswith("_") and isinstance(value, (bool, int, float, str))}
+
+    def _restore_counters(self, ticks: int, all_time_users: int, successful_users: int) -> None:
+        self.__ticks = ticks
+        self.__all_time_users = all_time_users
+        self.__successful_users = successful_users
+        self.__repairs.reset_stats()
+
+    def _replace_engine(self, engine) -> None:
+        # Hands every computer and user over to engine, settling the state the old one kept to itself
+        old = self.__engine
+        computers = [*self.__servers, *self.__stations]
+        for computer in computers:
+            computer._fix_time = old.fix_time(computer)
+            computer.unsubscribe(old)
+        for user in self.__users:
+            user._advance_work(user.work_time - old.user_work_time(user))
+        self.__engine = engine
+        engine.add_computers(computers)
+        for user in self.__users:
+            engine.add_user(user)
+
+    def reseed(self, seed=None) -> None:
+        self.__rng.seed(seed)
+        self.__engine.reseed()
+
+    # Checkpoints
+    def save(self, path) -> None:
+        checkpoint.save(self, path)
+
+    @classmethod
+    def load(cls, path, engine: str = None) -> "Simulation":
+        return checkpoint.load(path, engine)
+
+    @classmethod
+    def from_scenario(cls, scenario, engine: str = "tick", seed=None, settings: dict = None,
+                      cache=None) -> "Simulation":
+        # scenario is a TOML/JSON scenario file or its parsed content; see scenarios.read_scenario
+        from simulation import scenarios
+        return scenarios.from_scenario(scenario, engine, seed, settings, cache)
+
+    def fork(self, n: int) -> int:
+        branch, children = checkpoint.fork(self, n)
+        self.__forks = children
+        return branch
+
+    def join_forks(self) -> list[int]:
+        codes = [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in self.__forks]
+        self.__forks = []
+        return codes
+
+    def profile(self, dump_every: int = 0, report=print):
+        # Started profile of the tick phases; stop() it or use it as a context manager
+        from simulation.profiling import Profile
+        profile = Profile(self, dump_every, report)
+        profile.start()
+        return profile
+
+    # Simulation -> Listener
+    def subscribe(self, listener: SimulationListener) -> None:
+        if listener not in self.__listeners:
+            self.__listeners.append(listener)
+
+    def unsubscribe(self, listener: SimulationListener) -> None:
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
 
     @property
     def users_count(self):
@@ -46,104 +169,205 @@ class Simulation:
         return self.__successful_users
 
     def add_server(self, server: Server) -> None:
-        if server not in self.__servers:
-            self.__servers.append(server)
+        if self.__servers.add(server):
+            server._rng = self.__rng
+            server.subscribe(self)
+            if server.is_broken:
+                self.__broken_servers.add(server)
+                self.__repairs.computer_state_changed(server)
+            self.__gis_servers += server.have_gis
+            self.__dbms_servers += server.have_dbms
+            self.__engine.add_computer(server)
 
     def create_room(self, servers: list[Server] = None) -> ComputerRoom:
-        room = ComputerRoom(servers.copy())
-        self.__rooms.append(room)
+        room = ComputerRoom(servers, self.__rng)
+        self.__rooms.add(room)
         return room
 
     def add_station(self, station: Station) -> None:
-        if station not in self.__stations:
-            self.__stations.append(station)
+        if self.__stations.add(station):
+            station._rng = self.__rng
+            station.subscribe(self)
+            self.computer_state_changed(station)
+            self.station_occupancy_changed(station)
+            self.__engine.add_computer(station)
+
+    def add_stations(self, stations) -> None:
+        # Bulk add_station for loaders
+        stations = [station for station in stations if station not in self.__stations]
+        self.__stations.extend(stations)
+        for station in stations:
+            station._rng = self.__rng
+            station.subscribe(self)
+        broken = [station for station in stations if station.is_broken]
+        self.__broken_stations.extend(broken)
+        self.__occupied_stations.extend(station for station in stations if station.occupied)
+        self.__free_stations.extend(station for station in stations if not station.occupied)
+        for station in broken:
+            self.__repairs.computer_state_changed(station)
+        self.__engine.add_computers(stations)
+
+    def remove_station(self, station: Station) -> None:
+        if self.__stations.discard(station):
+            if station.user is not None:
+                station.user.remove_station(station)
+            if station.computer_room is not None:
+                station.remove_computer_room(station.computer_room)
+            station.unsubscribe(self)
+            self.__broken_stations.discard(station)
+            self.__free_stations.discard(station)
+            self.__occupied_stations.discard(station)
+            self.__repairs.computer_removed(station)
+            self.__engine.remove_computer(station)
 
     def add_user(self, user: User):
-        if user not in self.__users:
-            self.__users.append(user)
+        if self.__users.add(user):
+            self.__engine.add_user(user)
 
     @property
-    def computer_rooms(self) -> list[ComputerRoom]:
+    def computer_rooms(self) -> IndexedList:
         return self.__rooms
 
+    def create_user(self, minimal_resolution: Resolution, need_gis: bool, need_dbms: bool, work_time: int) -> User:
+        if self.__user_pool:
+            user = self.__user_pool.pop()
+            user._reset(self, minimal_resolution, need_gis, need_dbms, work_time)
+        else:
+            user = User(self, minimal_resolution, need_gis, need_dbms, work_time)
+        self.add_user(user)
+        return user
+
     def remove_user(self, user: User, successful=False):
         if successful:
             self.__successful_users += 1
         self.__users.remove(user)
+        self.__engine.remove_user(user)
+        self.__user_pool.append(user)
+
+    def computer_state_changed(self, computer) -> None:
+        broken = self.__broken_stations if isinstance(computer, Station) else self.__broken_servers
+        if computer.is_broken:
+            broken.add(computer)
+        else:
+            broken.discard(computer)
+        self.__repairs.computer_state_changed(computer)
+
+    def station_occupancy_changed(self, station) -> None:
+        if station.occupied:
+            self.__free_stations.discard(station)
+            self.__occupied_stations.add(station)
+        else:
+            self.__occupied_stations.discard(station)
+            self.__free_stations.add(station)
 
     @property
     def broken_stations(self) -> list[Station]:
-        return list(filter(lambda s: s.is_broken, self.__stations))
+        return list(self.__broken_stations)
+
+    @property
+    def broken_stations_count(self) -> int:
+        return len(self.__broken_stations)
 
     @property
     def broken_servers(self) -> list[Server]:
-        return list(filter(lambda s: s.is_broken, self.__servers))
+        return list(self.__broken_servers)
+
+    @property
+    def broken_servers_count(self) -> int:
+        return len(self.__broken_servers)
 
     @property
     def free_stations(self) -> list[Station]:
-        return list(filter(lambda s: not s.occupied, self.__stations))
+        return list(self.__free_stations)
+
+    @property
+    def free_stations_count(self) -> int:
+        return len(self.__free_stations)
 
     @property
-    def users(self) -> list[User]:
+    def users(self) -> IndexedList:
         return self.__users
 
     @property
     def working_users(self) -> list[User]:
-        return list(filter(lambda u: u.have_station, self.__users))
+        return [station.user for station in self.__occupied_stations]
 
     @property
-    def servers(self) -> list[Server]:
+    def working_users_count(self) -> int:
+        return len(self.__occupied_stations)
+
+    @property
+    def servers(self) -> IndexedList:
         return self.__servers
 
     @property
-    def stations(self) -> list[Station]:
+    def stations(self) -> IndexedList:
         return self.__stations
 
     @property
     def have_gis(self) -> bool:
-        for s in self.__servers:
-            if s.have_gis:
-                return True
-        return False
+        return self.__gis_servers > 0
 
     @property
     def have_dbms(self) -> bool:
-        for s in self.__servers:
-            if s.have_dbms:
-                return True
-        return False
+        return self.__dbms_servers > 0
+
+    def run(self, ticks: int) -> None:
+        self.__engine.run(ticks)
+
+    def _skip_ticks(self, ticks: int) -> None:
+        self.__ticks += ticks
+        for listener in self.__listeners:
+            listener.ticks_skipped(self, ticks)
 
     def tick(self) -> None:
-        for server in self.__servers:
-            server.tick()
-        for station in self.__stations:
-            station.tick()
-        for user in self.__users:
-            user.tick()
+        self.__ticks += 1
+        self.__engine.tick_servers()
+        self.__engine.tick_stations()
+        self.__engine.tick_users()
+        self._spawn_users()
+        self._dispatch_repairs()
+        self._reshuffle()
+        for listener in self.__listeners:
+            listener.tick_finished(self)
 
-        if chance(self.user_spawn_prob):
+    def _spawn_users(self) -> None:
+        rng = self.__rng
+        if self.__engine.chance("spawn", self.user_spawn_prob):
             self.__all_time_users += 1
-            self.add_user(User(self,
-                               random.choice([Resolution.HD, Resolution.FullHD, Resolution.UltraHD]),
-                               chance(self.user_need_gis_prob),
-                               chance(self.user_need_dbms_prob),
-                               random.randint(self.user_min_worktime, self.user_max_worktime)))
+            self.create_user(rng.choice([Resolution.HD, Resolution.FullHD, Resolution.UltraHD]),
+                             chance(self.user_need_gis_prob, rng),
+                             chance(self.user_need_dbms_prob, rng),
+                             rng.randint(self.user_min_worktime, self.user_max_worktime))
 
-        broken_computers = self.broken_stations + self.broken_servers
-        if len(broken_computers) > 0:
-            random.choice(broken_computers).fix(random.randint(self.comp_min_fix_time, self.comp_max_fix_time))
+    def _dispatch_repairs(self) -> None:
+        self.__repairs.dispatch()
+        if self.repair_policy != RANDOM:
+            return
+        rng = self.__rng
+        broken_count = len(self.__broken_stations) + len(self.__broken_servers)
+        if broken_count > 0:
+            i = rng.randrange(broken_count)
+            if i < len(self.__broken_stations):
+                computer = self.__broken_stations[i]
+            else:
+                computer = self.__broken_servers[i - len(self.__broken_stations)]
+            computer.fix(rng.randint(self.comp_min_fix_time, self.comp_max_fix_time))
 
-        if chance(self.station_replace_prob) and len(self.free_stations) > 0:
-            random.choice(self.free_stations).set_computer_room(random.choice(self.__rooms))
+    def _reshuffle(self) -> None:
+        rng = self.__rng
+        if self.__engine.chance("station_replace", self.station_replace_prob) and len(self.__free_stations) > 0:
+            rng.choice(self.__free_stations).set_computer_room(rng.choice(self.__rooms))
 
-        if chance(self.server_replace_prob):
+        if self.__engine.chance("server_remove", self.server_replace_prob):
             rooms = list(filter(lambda r: len(r.servers) > 1, self.__rooms))
             if len(rooms) > 0:
-                room = random.choice(rooms)
-                room.remove_server(random.choice(room.servers))
+                room = rng.choice(rooms)
+                room.remove_server(rng.choice(room.servers))
+                self.__engine.room_servers_changed(room)
 
-        if chance(self.server_replace_prob):
-            server = random.choice(self.__servers)
+        if self.__engine.chance("server_add", self.server_replace_prob):
+            server = rng.choice(self.__servers)
             rooms = list(filter(lambda r: server not in r.servers, self.__rooms))
             if len(rooms) > 0:
-                random.choice(rooms).add_server(server)
+                rng.choice(rooms).add_server(server)
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 
 class SimulationObject(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def tick(self) -> None:
         pass
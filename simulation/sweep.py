@@ -0,0 +1,154 @@
+import ast
+import hashlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+
+from simulation import ensemble, scenarios
+from simulation.engines import ENGINES
+from simulation.ensemble import Replication, Estimate
+
+
+def simulation_modules() -> list[Path]:
+    # Every module a replication can run: ensemble.replicate, the engines (imported by
+    # name) and whatever they import, at the top or inside functions
+    package = Path(__file__).parent
+    pending = ["ensemble"] + [target.split(":")[0].rpartition(".")[2] for target in ENGINES.values()]
+    found = set()
+    while pending:
+        name = pending.pop()
+        path = package / f"{name}.py"
+        if name in found or not path.exists():
+            continue
+        found.add(name)
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module == "simulation":
+                pending += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module.startswith("simulation."):
+                pending.append(node.module.split(".")[1])
+            elif isinstance(node, ast.Import):
+                pending += [alias.name.split(".")[1] for alias in node.names if alias.name.startswith("simulation.")]
+    return sorted(package / f"{name}.py" for name in found)
+
+
+def engine_version() -> str:
+    digest = hashlib.sha256()
+    for path in simulation_modules():
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def grid(**axes) -> list[dict]:
+    keys = list(axes)
+    return [dict(zip(keys, values)) for values in itertools.product(*axes.values())]
+
+
+class ResultStore:
+    def __init__(self, path):
+        self.__path = Path(path)
+        self.__path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(**cell) -> str:
+        return hashlib.sha256(json.dumps(cell, sort_keys=True).encode()).hexdigest()
+
+    def __file(self, key: str) -> Path:
+        return self.__path / key[:2] / f"{key[2:]}.json"
+
+    def get(self, key: str):
+        try:
+            with open(self.__file(key)) as f:
+                return Replication(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, replication: Replication) -> None:
+        path = self.__file(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(replication._asdict(), f)
+        os.replace(tmp, path)
+
+
+@dataclass
+class SweepPoint:
+    settings: dict
+    replications: list[Replication]
+    success_rate: Estimate
+    station_utilization: Estimate
+    mean_time_to_repair: Estimate
+    crew_utilization: Estimate
+
+    def as_dict(self) -> dict:
+        return {
+            "settings": self.settings,
+            "success_rate": self.success_rate.__dict__,
+            "station_utilization": self.station_utilization.__dict__,
+            "mean_time_to_repair": self.mean_time_to_repair.__dict__,
+            "crew_utilization": self.crew_utilization.__dict__,
+        }
+
+
+def _replicate(args) -> tuple[str, Replication]:
+    key, task = args
+    return key, ensemble.replicate(*task)
+
+
+def run(points: list[dict], scenario: str = "small", replications: int = 20, ticks: int = 10_000,
+        seed: int = 0, engine: str = "tick", store: ResultStore = None, workers: int = None,
+        sample_every: int = 100, confidence: float = 0.95, report=None) -> list[SweepPoint]:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    version = engine_version()
+    scenario_key = scenarios.fingerprint(scenario)
+    seeds = [ensemble.replication_seed(seed, i) for i in range(replications)]
+
+    def cell_key(point: dict, cell_seed: int) -> str:
+        return ResultStore.key(settings=point, scenario=scenario_key, seed=cell_seed, ticks=ticks,
+                               engine=engine, sample_every=sample_every, version=version)
+
+    cells = {}
+    missing = []
+    for point in points:
+        for cell_seed in seeds:
+            key = cell_key(point, cell_seed)
+            if key in cells:
+                continue
+            cells[key] = store.get(key) if store is not None else None
+            if cells[key] is None:
+                missing.append((key, (scenario, cell_seed, ticks, engine, point, sample_every)))
+
+    if report is not None:
+        report(f"{len(cells) - len(missing)} cached, {len(missing)} to compute")
+
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 and missing else nullcontext() as executor:
+        if executor is None:
+            results = map(_replicate, missing)
+        else:
+            results = executor.map(_replicate, missing, chunksize=max(1, len(missing) // (workers * 4)))
+        # Results are stored as they arrive so an interrupted sweep keeps its finished cells
+        for key, replication in results:
+            cells[key] = replication
+            if store is not None:
+                store.put(key, replication)
+
+    result = []
+    for point in points:
+        point_replications = [cells[cell_key(point, cell_seed)] for cell_seed in seeds]
+        result.append(SweepPoint(point, point_replications,
+                                 ensemble.estimate([r.success_rate for r in point_replications], confidence,
+                                                   ensemble.PROPORTION),
+                                 ensemble.estimate([r.station_utilization for r in point_replications], confidence,
+                                                   ensemble.PROPORTION),
+                                 ensemble.estimate([r.mean_time_to_repair for r in point_replications], confidence,
+                                                   (0.0, math.inf)),
+                                 ensemble.estimate([r.crew_utilization for r in point_replications], confidence,
+                                                   ensemble.PROPORTION)))
+    return result
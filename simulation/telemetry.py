@@ -0,0 +1,562 @@
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import os
+import struct
+import threading
+from array import array
+
+from simulation.computer_room import RoomListener
+from simulation.computers import ComputerListener, Resolution, Station
+from simulation.sim import SimulationListener
+
+RESOLUTIONS = (Resolution.HD, Resolution.FullHD, Resolution.UltraHD)
+
+# Frame layout, little-endian: header, then the sections of its kind. An id list is
+# a u32 count followed by u32 ids; a room table is an id list of rooms, u32 offsets
+# (one more than rooms) and the u32 ids of every room's members.
+#   keyframe: server flags (u32 count, u8 each), room servers table over all rooms,
+#             station flags (u32 count, u8 each), station rooms (u32 each, NO_ROOM if none)
+#   delta:    stations broken, fixed, occupied, freed; servers broken, fixed (id lists);
+#             changed room servers and changed room stations (room tables)
+HEADER = struct.Struct("<Bq7I")
+KEYFRAME = 1
+DELTA = 2
+COUNTERS = ("users", "working_users", "users_count", "success_users_count", "broken_stations", "broken_servers",
+            "free_stations")
+DELTA_LISTS = ("stations_broken", "stations_fixed", "stations_occupied", "stations_freed", "servers_broken",
+               "servers_fixed")
+DELTA_TABLES = ("room_servers", "room_stations")
+NO_ROOM = 0xFFFFFFFF
+# Station flags; the resolution index sits above them
+BROKEN = 1
+OCCUPIED = 2
+# Server flags
+GIS = 2
+DBMS = 4
+
+# How often the server loop picks up the frames queued by the simulation thread
+FLUSH_SECONDS = 0.005
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+CONTINUATION, TEXT, BINARY, CLOSE, PING, PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def _ids(ids) -> bytes:
+    return struct.pack("<I", len(ids)) + array("I", ids).tobytes()
+
+
+def _table(rows: dict) -> bytes:
+    offsets = [0]
+    members = []
+    for ids in rows.values():
+        members.extend(ids)
+        offsets.append(len(members))
+    return _ids(list(rows)) + array("I", offsets).tobytes() + _ids(members)
+
+
+# Delta sections of a tick in which nothing changed
+_UNCHANGED = _ids([]) * len(DELTA_LISTS) + _table({}) * len(DELTA_TABLES)
+
+
+def _read_ids(frame, offset: int) -> tuple[list[int], int]:
+    n = struct.unpack_from("<I", frame, offset)[0]
+    offset += 4
+    return array("I", frame[offset:offset + 4 * n]).tolist(), offset + 4 * n
+
+
+def _read_table(frame, offset: int) -> tuple[dict, int]:
+    keys, offset = _read_ids(frame, offset)
+    offsets = array("I", frame[offset:offset + 4 * (len(keys) + 1)]).tolist()
+    members, offset = _read_ids(frame, offset + 4 * (len(keys) + 1))
+    return {key: members[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}, offset
+
+
+def decode(frame) -> dict:
+    kind, tick, *counters = HEADER.unpack_from(frame)
+    result = {"keyframe": kind == KEYFRAME, "tick": tick, "counters": dict(zip(COUNTERS, counters))}
+    offset = HEADER.size
+    if kind == KEYFRAME:
+        n = struct.unpack_from("<I", frame, offset)[0]
+        result["servers"] = bytes(frame[offset + 4:offset + 4 + n])
+        result["room_servers"], offset = _read_table(frame, offset + 4 + n)
+        n = struct.unpack_from("<I", frame, offset)[0]
+        result["stations"] = bytes(frame[offset + 4:offset + 4 + n])
+        result["station_rooms"] = array("I", frame[offset + 4 + n:offset + 4 + 5 * n]).tolist()
+    elif kind == DELTA:
+        for name in DELTA_LISTS:
+            result[name], offset = _read_ids(frame, offset)
+        for name in DELTA_TABLES:
+            result[name], offset = _read_table(frame, offset)
+    else:
+        raise ValueError(f"Unknown telemetry frame kind: {kind}")
+    return result
+
+
+# Encodes what changed during each tick into one frame and hands it to publish(frame,
+# keyframe). Listener callbacks only record which objects changed; their current state
+# is read once when the tick is encoded. Every keyframe_every ticks, and whenever a
+# station unknown to the last keyframe shows up, a full keyframe is sent instead.
+class TelemetryRecorder(SimulationListener, ComputerListener, RoomListener):
+
+    def __init__(self, simulation, publish, keyframe_every: int = 500):
+        if keyframe_every < 1:
+            raise ValueError("keyframe_every must be positive")
+        self.__simulation = simulation
+        self.__publish = publish
+        self.__keyframe_every = keyframe_every
+        self.__station_ids = {}
+        self.__server_ids = {}
+        self.__room_ids = {}
+        self.__computers = []
+        self.__rooms = []
+        self.__stations = set()
+        self.__servers = set()
+        self.__occupancy = set()
+        self.__room_servers = set()
+        self.__room_stations = set()
+        self.__since_keyframe = 0
+        self.__running = False
+
+    def start(self) -> None:
+        if self.__running:
+            return
+        self.__running = True
+        self.__simulation.subscribe(self)
+        self.__keyframe()
+
+    def stop(self) -> None:
+        if not self.__running:
+            return
+        self.__running = False
+        self.__simulation.unsubscribe(self)
+        self.__detach()
+
+    def __detach(self) -> None:
+        for computer in self.__computers:
+            computer.unsubscribe(self)
+        for room in self.__rooms:
+            room.unsubscribe(self)
+
+    def __counters(self) -> tuple:
+        sim = self.__simulation
+        return (len(sim.users), sim.working_users_count, sim.users_count, sim.success_users_count,
+                sim.broken_stations_count, sim.broken_servers_count, sim.free_stations_count)
+
+    def __keyframe(self) -> None:
+        sim = self.__simulation
+        self.__detach()
+        servers = list(sim.servers)
+        stations = list(sim.stations)
+        rooms = list(sim.computer_rooms)
+        self.__server_ids = {server: i for i, server in enumerate(servers)}
+        self.__station_ids = {station: i for i, station in enumerate(stations)}
+        self.__room_ids = {room: i for i, room in enumerate(rooms)}
+        self.__computers = servers + stations
+        self.__rooms = rooms
+        for computer in self.__computers:
+            computer.subscribe(self)
+        for room in rooms:
+            room.subscribe(self)
+        for changed in (self.__stations, self.__servers, self.__occupancy, self.__room_servers, self.__room_stations):
+            changed.clear()
+        self.__since_keyframe = 0
+
+        resolutions = {resolution: i << 2 for i, resolution in enumerate(RESOLUTIONS)}
+        server_flags = bytes(BROKEN * s.is_broken | GIS * s.have_gis | DBMS * s.have_dbms for s in servers)
+        station_flags = bytes(BROKEN * s.is_broken | OCCUPIED * s.occupied | resolutions[s.display_resolution]
+                              for s in stations)
+        room_ids = self.__room_ids
+        station_rooms = array("I", [room_ids.get(s.computer_room, NO_ROOM) for s in stations])
+        server_ids = self.__server_ids
+        room_servers = {i: [server_ids[s] for s in room.servers] for i, room in enumerate(rooms)}
+        self.__publish(b"".join((HEADER.pack(KEYFRAME, sim.ticks, *self.__counters()),
+                                 struct.pack("<I", len(servers)), server_flags, _table(room_servers),
+                                 struct.pack("<I", len(stations)), station_flags, station_rooms.tobytes())), True)
+
+    def __delta(self) -> None:
+        sim = self.__simulation
+        station_ids, server_ids = self.__station_ids, self.__server_ids
+        stations, servers, occupancy = self.__stations, self.__servers, self.__occupancy
+        if not (stations or servers or occupancy or self.__room_servers or self.__room_stations):
+            self.__publish(HEADER.pack(DELTA, sim.ticks, *self.__counters()) + _UNCHANGED, False)
+            return
+        room_stations = {}
+        for room in self.__room_stations:
+            ids = [station_ids.get(station) for station in room.stations]
+            if None in ids:
+                self.__keyframe()
+                return
+            room_stations[self.__room_ids[room]] = ids
+        room_servers = {self.__room_ids[room]: [server_ids[server] for server in room.servers]
+                        for room in self.__room_servers}
+
+        lists = (
+            [station_ids[s] for s in stations if s.is_broken],
+            [station_ids[s] for s in stations if not s.is_broken],
+            [station_ids[s] for s in occupancy if s.occupied],
+            [station_ids[s] for s in occupancy if not s.occupied],
+            [server_ids[s] for s in servers if s.is_broken],
+            [server_ids[s] for s in servers if not s.is_broken],
+        )
+        stations.clear()
+        servers.clear()
+        occupancy.clear()
+        self.__room_servers.clear()
+        self.__room_stations.clear()
+        self.__publish(b"".join((HEADER.pack(DELTA, sim.ticks, *self.__counters()), *map(_ids, lists),
+                                 _table(room_servers), _table(room_stations))), False)
+
+    # Simulation -> Telemetry
+    def tick_finished(self, simulation) -> None:
+        self.__since_keyframe += 1
+        if self.__since_keyframe >= self.__keyframe_every:
+            self.__keyframe()
+        else:
+            self.__delta()
+
+    def ticks_skipped(self, simulation, ticks: int) -> None:
+        # Nothing changed, but the clock moved; the next tick's frame would say so as well
+        self.__since_keyframe += ticks - 1
+        self.tick_finished(simulation)
+
+    # Computers and rooms -> Telemetry
+    def computer_state_changed(self, computer) -> None:
+        (self.__stations if isinstance(computer, Station) else self.__servers).add(computer)
+
+    def station_occupancy_changed(self, station) -> None:
+        self.__occupancy.add(station)
+
+    def room_servers_changed(self, room) -> None:
+        self.__room_servers.add(room)
+
+    def room_stations_changed(self, room) -> None:
+        self.__room_stations.add(room)
+
+
+# Applies decoded frames to rebuild the published state, as a dashboard would
+class Mirror:
+
+    def __init__(self):
+        self.tick = None
+        self.counters = {}
+        self.servers = bytearray()
+        self.stations = bytearray()
+        self.station_rooms = []
+        self.room_servers = {}
+
+    @property
+    def synced(self) -> bool:
+        return self.tick is not None
+
+    def apply(self, frame) -> bool:
+        # False for a delta that arrives before any keyframe; it is ignored
+        frame = decode(frame)
+        if frame["keyframe"]:
+            self.servers = bytearray(frame["servers"])
+            self.stations = bytearray(frame["stations"])
+            self.station_rooms = frame["station_rooms"]
+            self.room_servers = frame["room_servers"]
+        elif not self.synced:
+            return False
+        else:
+            for flags, flag, on, off in ((self.stations, BROKEN, "stations_broken", "stations_fixed"),
+                                         (self.stations, OCCUPIED, "stations_occupied", "stations_freed"),
+                                         (self.servers, BROKEN, "servers_broken", "servers_fixed")):
+                for i in frame[on]:
+                    flags[i] |= flag
+                for i in frame[off]:
+                    flags[i] &= ~flag
+            self.room_servers.update(frame["room_servers"])
+            for room, stations in frame["room_stations"].items():
+                for station in stations:
+                    self.station_rooms[station] = room
+        self.tick = frame["tick"]
+        self.counters = frame["counters"]
+        return True
+
+
+# WebSocket framing (RFC 6455), enough for a server pushing binary messages
+def websocket_frame(payload: bytes, opcode: int = BINARY, mask: bytes = None) -> bytes:
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    if mask is None:
+        return header + payload
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return header[:1] + bytes([header[1] | 0x80]) + header[2:] + mask + masked
+
+
+async def read_websocket_frame(reader) -> tuple[int, bytes]:
+    first, second = await reader.readexactly(2)
+    n = second & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(n)
+    if mask is not None:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0F, payload
+
+
+def websocket_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+async def stream(host: str, port: int, path: str = "/stream"):
+    # Yields the binary frames published by a TelemetryServer
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+        response = await reader.readuntil(b"\r\n\r\n")
+        if not response.startswith(b"HTTP/1.1 101") or websocket_accept(key).encode() not in response:
+            raise ConnectionError(f"Telemetry handshake failed: {response.splitlines()[0].decode()}")
+        while True:
+            opcode, payload = await read_websocket_frame(reader)
+            if opcode == CLOSE:
+                return
+            if opcode == BINARY:
+                yield payload
+    except asyncio.IncompleteReadError:
+        return
+    finally:
+        writer.close()
+
+
+class _Client:
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.frames = collections.deque()
+        self.ready = asyncio.Event()
+        # Waiting for the next keyframe after falling behind
+        self.resync = False
+        self.coalesced = 0
+
+
+# Serves a simulation's telemetry on localhost from an asyncio loop on its own thread:
+#   GET /          JSON status
+#   GET /keyframe  the latest keyframe
+#   GET /stream    WebSocket: the latest keyframe, the deltas since, then every new frame
+# The simulation thread only encodes frames and queues them for the loop. A client that
+# has more than max_frames frames waiting skips ahead to the next keyframe; one whose
+# socket accepts nothing for drain_timeout seconds is disconnected.
+class TelemetryServer:
+
+    def __init__(self, simulation, host: str = "127.0.0.1", port: int = 0, keyframe_every: int = 500,
+                 max_frames: int = None, drain_timeout: float = 5.0):
+        self.__simulation = simulation
+        self.__host = host
+        self.__port = port
+        self.__max_frames = max_frames or 2 * keyframe_every
+        self.__drain_timeout = drain_timeout
+        self.__recorder = TelemetryRecorder(simulation, self.__queue, keyframe_every)
+        self.__pending = collections.deque()
+        self.__keyframe = None
+        self.__backlog = []
+        self.__clients = set()
+        self.__frames = 0
+        self.__coalesced = 0
+        self.__dropped = 0
+        self.__loop = None
+        self.__server = None
+        self.__thread = None
+
+    @property
+    def port(self) -> int:
+        return self.__port
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.__host}:{self.__port}/"
+
+    @property
+    def clients(self) -> int:
+        return len(self.__clients)
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            return
+        started = threading.Event()
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__serve, args=(started,), name="telemetry", daemon=True)
+        self.__thread.start()
+        started.wait()
+        if self.__server is None:
+            self.__thread.join()
+            self.__thread = None
+            raise OSError(f"Cannot serve telemetry on {self.__host}:{self.__port}")
+        # The first keyframe is encoded here, on the calling thread
+        self.__recorder.start()
+
+    def stop(self) -> None:
+        if self.__thread is None:
+            return
+        self.__recorder.stop()
+        asyncio.run_coroutine_threadsafe(self.__close(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__thread = None
+
+    def __enter__(self) -> "TelemetryServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def __serve(self, started) -> None:
+        loop = self.__loop
+        asyncio.set_event_loop(loop)
+        try:
+            self.__server = loop.run_until_complete(asyncio.start_server(self.__handle, self.__host, self.__port))
+            self.__port = self.__server.sockets[0].getsockname()[1]
+        except OSError:
+            started.set()
+            loop.close()
+            return
+        started.set()
+        loop.call_soon(self.__flush)
+        loop.run_forever()
+        loop.close()
+
+    async def __close(self) -> None:
+        self.__server.close()
+        for client in self.__clients:
+            client.writer.write(websocket_frame(struct.pack("!H", 1001), CLOSE))
+            client.writer.close()
+        # Handlers see their connection closed and return by themselves, unless a
+        # client stopped reading and its buffered frames keep the socket open
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if handlers:
+            _, pending = await asyncio.wait(handlers, timeout=1.0)
+            if pending:
+                for client in self.__clients:
+                    client.writer.transport.abort()
+                await asyncio.wait(pending)
+        await self.__server.wait_closed()
+
+    # Simulation thread; waking the loop for every tick would cost more than encoding it
+    def __queue(self, frame: bytes, keyframe: bool) -> None:
+        self.__pending.append((frame, keyframe))
+
+    # Loop thread
+    def __flush(self) -> None:
+        self.__loop.call_later(FLUSH_SECONDS, self.__flush)
+        pending = self.__pending
+        while pending:
+            frame, keyframe = pending.popleft()
+            self.__frames += 1
+            if keyframe:
+                self.__keyframe = frame
+                self.__backlog = []
+            else:
+                self.__backlog.append(frame)
+            for client in self.__clients:
+                self.__offer(client, frame, keyframe)
+
+    def __offer(self, client: _Client, frame: bytes, keyframe: bool) -> None:
+        if client.resync:
+            if not keyframe:
+                return
+            client.resync = False
+        elif len(client.frames) >= self.__max_frames:
+            client.frames.clear()
+            client.coalesced += 1
+            self.__coalesced += 1
+            if not keyframe:
+                client.resync = True
+                return
+        client.frames.append(frame)
+        client.ready.set()
+
+    def __status(self) -> dict:
+        status = {"host": self.__host, "port": self.__port, "clients": len(self.__clients), "frames": self.__frames,
+                  "coalesced": self.__coalesced, "dropped": self.__dropped}
+        if self.__keyframe is not None:
+            latest = self.__backlog[-1] if self.__backlog else self.__keyframe
+            _, status["tick"], *counters = HEADER.unpack_from(latest)
+            status.update(zip(COUNTERS, counters))
+        return status
+
+    async def __handle(self, reader, writer) -> None:
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if method != "GET":
+                self.__respond(writer, "405 Method Not Allowed", "text/plain", b"Only GET is supported\n")
+            elif path == "/stream" and headers.get("upgrade", "").lower() == "websocket":
+                await self.__stream(reader, writer, headers.get("sec-websocket-key", ""))
+            elif path == "/":
+                self.__respond(writer, "200 OK", "application/json", json.dumps(self.__status()).encode())
+            elif path == "/keyframe" and self.__keyframe is not None:
+                self.__respond(writer, "200 OK", "application/octet-stream", self.__keyframe)
+            else:
+                self.__respond(writer, "404 Not Found", "text/plain", b"Not found\n")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def __respond(writer, status: str, content_type: str, body: bytes) -> None:
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+
+    async def __stream(self, reader, writer, key: str) -> None:
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n".encode())
+        client = _Client(writer)
+        if self.__keyframe is not None:
+            for frame in [self.__keyframe, *self.__backlog]:
+                self.__offer(client, frame, frame is self.__keyframe)
+        self.__clients.add(client)
+        sender = asyncio.ensure_future(self.__send(client))
+        try:
+            while not sender.done():
+                receive = asyncio.ensure_future(read_websocket_frame(reader))
+                await asyncio.wait((receive, sender), return_when=asyncio.FIRST_COMPLETED)
+                if not receive.done():
+                    receive.cancel()
+                    break
+                opcode, payload = receive.result()
+                if opcode == CLOSE:
+                    writer.write(websocket_frame(payload[:2], CLOSE))
+                    break
+                if opcode == PING:
+                    writer.write(websocket_frame(payload, PONG))
+        finally:
+            self.__clients.discard(client)
+            sender.cancel()
+
+    async def __send(self, client: _Client) -> None:
+        writer = client.writer
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                while client.frames:
+                    writer.writelines([websocket_frame(frame) for frame in client.frames])
+                    client.frames.clear()
+                    await asyncio.wait_for(writer.drain(), self.__drain_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.__dropped += 1
+            # Whatever is still buffered for it would only hold the connection open
+            writer.transport.abort()
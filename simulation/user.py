@@ -1,33 +1,47 @@
-import random
 from simulation.simulation_object import SimulationObject
 
 
 class User(SimulationObject):
+    __slots__ = ("__simulation", "__need_dbms", "__need_gis", "__minimal_resolution", "__work_time",
+                 "__current_room", "__current_station", "__station_attempts", "__room_attempts")
+
     __work_time: int
     __need_gis: bool
     __need_dbms: bool
 
-    __station_attempts: int = 0
-    __room_attempts: int = 0
+    __station_attempts: int
+    __room_attempts: int
 
     def __init__(self, simulation, minimal_resolution, need_gis: bool,
                  need_dbms: bool,
                  work_time: int):
+        self._reset(simulation, minimal_resolution, need_gis, need_dbms, work_time)
+
+    # Also used to recycle a removed user from the simulation's pool
+    def _reset(self, simulation, minimal_resolution, need_gis: bool, need_dbms: bool, work_time: int) -> None:
         self.__simulation = simulation
         self.__need_dbms = need_dbms
         self.__need_gis = need_gis
         self.__minimal_resolution = minimal_resolution
         self.__work_time = work_time
 
+        self.__station_attempts = 0
+        self.__room_attempts = 0
+
         self.__current_room = None
         self.__current_station = None
 
     def __check_station(self) -> bool:
-        if self.__current_station is None:
+        station = self.__current_station
+        if station is None:
             return False
-        return (not self.__current_station.is_broken and
-                (not self.__need_gis or self.__current_station.have_gis) and
-                (not self.__need_dbms or self.__current_station.have_dbms))
+        if self.__simulation.capabilities_need_working_server:
+            return (not station.is_broken and
+                    (not self.__need_gis or station.have_working_gis) and
+                    (not self.__need_dbms or station.have_working_dbms))
+        return (not station.is_broken and
+                (not self.__need_gis or station.have_gis) and
+                (not self.__need_dbms or station.have_dbms))
 
     def tick(self) -> None:
         if self.__work_time <= 0:
@@ -39,19 +53,15 @@ class User(SimulationObject):
 
         if self.__current_room is None:
             if len(self.__simulation.computer_rooms) > 0:
-                self.__current_room = random.choice(self.__simulation.computer_rooms)
+                self.__current_room = self.__simulation.rng.choice(self.__simulation.computer_rooms)
                 self.__station_attempts = 0
             self.__room_attempts += 1
             return
 
         if self.__current_station is None:
-
-            stations = list(filter(lambda
-                                       s: s.display_resolution.value >= self.__minimal_resolution.value and not s.occupied and not s.is_broken,
-                                   self.__current_room.stations))
-
-            if len(stations) > 0:
-                self.set_station(random.choice(stations))
+            station = self.__current_room.random_free_station(self.__minimal_resolution)
+            if station is not None:
+                self.set_station(station)
 
             self.__station_attempts += 1
             if self.__station_attempts > 3:
@@ -66,6 +76,19 @@ class User(SimulationObject):
 
         self.__work_time -= 1
 
+    def _advance_work(self, ticks: int) -> None:
+        self.__work_time -= ticks
+
+    # Checkpoint support
+    def _state(self) -> tuple:
+        return (self.__minimal_resolution, self.__need_gis, self.__need_dbms, self.__work_time,
+                self.__current_room, self.__current_station, self.__station_attempts, self.__room_attempts)
+
+    def _restore(self, room, station_attempts: int, room_attempts: int) -> None:
+        self.__current_room = room
+        self.__station_attempts = station_attempts
+        self.__room_attempts = room_attempts
+
     @property
     def work_time(self) -> int:
         return self.__work_time
@@ -78,6 +101,10 @@ class User(SimulationObject):
     def need_dbms(self) -> bool:
         return self.__need_dbms
 
+    @property
+    def can_work(self) -> bool:
+        return self.__check_station()
+
     @property
     def have_station(self) -> bool:
         return self.__current_station is not None
@@ -0,0 +1,147 @@
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("The vector engine requires numpy") from e
+
+from simulation.computers import ComputerListener, Server
+from simulation.engines import TickEngine
+
+
+# Crash/repair state of every computer lives in arrays; the Server and Station
+# objects only mirror the broken flag, which is written back on transitions.
+class VectorEngine(TickEngine, ComputerListener):
+    name = "vector"
+
+    def __init__(self, simulation, capacity: int = 1024):
+        super().__init__(simulation)
+        self.__computers = []
+        self.__indexes = {}
+        self.__size = 0
+        # Slots of removed computers, reused before the arrays grow
+        self.__free = []
+        self.__broken = np.zeros(capacity, dtype=bool)
+        self.__fix_time = np.zeros(capacity, dtype=np.int64)
+        self.__crash_probability = np.zeros(capacity, dtype=np.float64)
+        self.__crush_protect = np.zeros(capacity, dtype=bool)
+        self.__rng = np.random.default_rng(simulation.rng.getrandbits(64))
+
+    def __grow(self) -> None:
+        capacity = len(self.__broken) * 2
+        self.__broken = np.resize(self.__broken, capacity)
+        self.__fix_time = np.resize(self.__fix_time, capacity)
+        self.__crash_probability = np.resize(self.__crash_probability, capacity)
+        self.__crush_protect = np.resize(self.__crush_protect, capacity)
+
+    def add_computer(self, computer) -> None:
+        if computer in self.__indexes:
+            return
+        if self.__free:
+            i = self.__free.pop()
+            self.__computers[i] = computer
+        else:
+            if self.__size == len(self.__broken):
+                self.__grow()
+            i = self.__size
+            self.__size += 1
+            self.__computers.append(computer)
+        self.__indexes[computer] = i
+
+        self.__broken[i] = computer.is_broken
+        self.__fix_time[i] = computer._fix_time
+        self.__crash_probability[i] = computer.chash_probability
+        self.__crush_protect[i] = (isinstance(computer, Server) and
+                                   computer.have_crush_protect and not computer.crush_protect_used)
+        computer.subscribe(self)
+
+    def add_computers(self, computers) -> None:
+        computers = [computer for computer in computers if computer not in self.__indexes]
+        reused = min(len(computers), len(self.__free))
+        for computer in computers[:reused]:
+            self.add_computer(computer)
+        computers = computers[reused:]
+        start = self.__size
+        end = start + len(computers)
+        while end > len(self.__broken):
+            self.__grow()
+
+        self.__size = end
+        self.__computers.extend(computers)
+        self.__indexes.update(zip(computers, range(start, end)))
+
+        self.__broken[start:end] = [computer.is_broken for computer in computers]
+        self.__fix_time[start:end] = [computer._fix_time for computer in computers]
+        self.__crash_probability[start:end] = [computer.chash_probability for computer in computers]
+        self.__crush_protect[start:end] = [isinstance(computer, Server) and computer.have_crush_protect and
+                                           not computer.crush_protect_used for computer in computers]
+        for computer in computers:
+            computer.subscribe(self)
+
+    def remove_computer(self, computer) -> None:
+        # The slot can no longer crash or be repaired until a new computer takes it
+        i = self.__indexes.pop(computer, None)
+        if i is None:
+            return
+        computer.unsubscribe(self)
+        self.__computers[i] = None
+        self.__broken[i] = False
+        self.__fix_time[i] = -1
+        self.__crash_probability[i] = 0.0
+        self.__crush_protect[i] = False
+        self.__free.append(i)
+
+    def reseed(self) -> None:
+        self.__rng = np.random.default_rng(self._simulation.rng.getrandbits(64))
+
+    def fix_time(self, computer) -> int:
+        return int(self.__fix_time[self.__indexes[computer]])
+
+    def index(self, computer) -> int:
+        return self.__indexes[computer]
+
+    @property
+    def broken(self):
+        return self.__broken[:self.__size]
+
+    @property
+    def fix_times(self):
+        return self.__fix_time[:self.__size]
+
+    def tick_servers(self) -> None:
+        n = self.__size
+        if n == 0:
+            return
+        broken = self.__broken[:n]
+        fix_time = self.__fix_time[:n]
+        crush_protect = self.__crush_protect[:n]
+        was_broken = broken.copy()
+
+        repairing = broken & (fix_time >= 0)
+        fix_time[repairing] -= 1
+        fixed = broken & (fix_time == 0)
+        crashed = ~was_broken & (self.__rng.random(n) < self.__crash_probability[:n])
+
+        saved = crashed & crush_protect
+        if saved.any():
+            crashed &= ~saved
+            fix_time[saved] = -1
+            crush_protect[saved] = False
+            for i in np.flatnonzero(saved):
+                self.__computers[i]._use_crush_protect()
+
+        broken[fixed] = False
+        broken[crashed] = True
+
+        for i in np.flatnonzero(fixed | crashed):
+            self.__computers[i]._set_broken(bool(broken[i]))
+
+    def tick_stations(self) -> None:
+        # Stations are advanced together with servers in tick_servers
+        pass
+
+    def computer_repair_scheduled(self, computer, time: int) -> None:
+        i = self.__indexes[computer]
+        if time <= 0:
+            self.__broken[i] = False
+            self.__fix_time[i] = -1
+        else:
+            self.__fix_time[i] = time
@@ -0,0 +1,167 @@
+import contextlib
+import threading
+import time
+from typing import NamedTuple
+
+# Longest stretch of ticks run without giving a waiting reader the lock
+BATCH_SECONDS = 0.005
+
+
+class RunUntilResult(NamedTuple):
+    ticks: int
+    seconds: float
+    reached: bool
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds > 0 else float("inf")
+
+
+def rooms_without_gis(simulation) -> int:
+    return sum(not room.have_gis for room in simulation.computer_rooms)
+
+
+def rooms_without_dbms(simulation) -> int:
+    return sum(not room.have_dbms for room in simulation.computer_rooms)
+
+
+# Values watched by run_until, which stops when the value goes up
+CONDITIONS = {
+    "Room loses GIS": rooms_without_gis,
+    "Room loses DBMS": rooms_without_dbms,
+    "Server breaks": lambda simulation: simulation.broken_servers_count,
+    "Station breaks": lambda simulation: simulation.broken_stations_count,
+    "User succeeds": lambda simulation: simulation.success_users_count,
+}
+
+
+# Runs Simulation.tick on a background thread, as fast as possible or at a target
+# tick rate. Readers take a consistent view of the simulation with frame(): the
+# worker finishes its current tick, hands over the lock and waits for it back.
+class SimulationWorker:
+
+    def __init__(self, simulation, tick_rate: float = 0):
+        self.__simulation = simulation
+        self.__lock = threading.Lock()
+        self.__running = threading.Event()
+        self.__stopped = threading.Event()
+        self.__frame_done = threading.Event()
+        self.__frame_wanted = False
+        self.__tick_rate = tick_rate
+        self.__until = None
+        self.__result = None
+        self.__thread = threading.Thread(target=self.__run, name="simulation", daemon=True)
+
+    @property
+    def simulation(self):
+        return self.__simulation
+
+    @property
+    def tick_rate(self) -> float:
+        return self.__tick_rate
+
+    @tick_rate.setter
+    def tick_rate(self, tick_rate: float) -> None:
+        # Ticks per second, 0 for as fast as possible
+        self.__tick_rate = tick_rate
+
+    @property
+    def paused(self) -> bool:
+        return not self.__running.is_set()
+
+    @property
+    def fast_forwarding(self) -> bool:
+        return self.__until is not None
+
+    def run_until(self, watch, limit: int) -> None:
+        # Ticks flat out until watch(simulation) goes up or the simulation reaches the
+        # limit tick, then pauses; pause() cancels
+        self.__result = None
+        self.__until = (watch, limit)
+        self.__running.set()
+
+    def take_result(self) -> RunUntilResult | None:
+        result, self.__result = self.__result, None
+        return result
+
+    def start(self, paused: bool = False) -> None:
+        if not paused:
+            self.__running.set()
+        self.__thread.start()
+
+    def pause(self) -> None:
+        self.__running.clear()
+
+    def resume(self) -> None:
+        self.__running.set()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        self.__running.set()
+        if self.__thread.is_alive() and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    @contextlib.contextmanager
+    def frame(self):
+        self.__frame_done.clear()
+        self.__frame_wanted = True
+        with self.__lock:
+            self.__frame_wanted = False
+            yield self.__simulation
+        self.__frame_done.set()
+
+    def __run(self) -> None:
+        simulation = self.__simulation
+        clock = time.perf_counter
+        start, start_tick, rate = clock(), simulation.ticks, None
+        while not self.__stopped.is_set():
+            if not self.__running.wait(0.1) or self.__stopped.is_set():
+                start, start_tick, rate = clock(), simulation.ticks, None
+                continue
+
+            if self.__until is not None:
+                self.__fast_forward(*self.__until)
+                start, start_tick, rate = clock(), simulation.ticks, None
+                continue
+
+            if rate != self.__tick_rate:
+                start, start_tick, rate = clock(), simulation.ticks, self.__tick_rate
+
+            with self.__lock:
+                deadline = clock() + BATCH_SECONDS
+                while not self.__frame_wanted and self.__running.is_set():
+                    if rate > 0 and simulation.ticks - start_tick >= (clock() - start) * rate:
+                        break
+                    simulation.tick()
+                    if clock() >= deadline:
+                        break
+
+            if self.__frame_wanted:
+                self.__frame_done.wait(0.1)
+            elif rate > 0:
+                # Ahead of schedule; sleep until the next tick is due
+                time.sleep(max(0.0, start + (simulation.ticks - start_tick + 1) / rate - clock()))
+
+    def __fast_forward(self, watch, limit: int) -> None:
+        simulation = self.__simulation
+        clock = time.perf_counter
+        start, start_tick = clock(), simulation.ticks
+        value = watch(simulation)
+        reached = False
+        while not reached and simulation.ticks < limit and self.__running.is_set() and not self.__stopped.is_set():
+            with self.__lock:
+                deadline = clock() + BATCH_SECONDS
+                while not self.__frame_wanted and simulation.ticks < limit:
+                    simulation.tick()
+                    previous, value = value, watch(simulation)
+                    if value > previous:
+                        reached = True
+                        break
+                    if clock() >= deadline:
+                        break
+            if self.__frame_wanted:
+                self.__frame_done.wait(0.1)
+
+        self.__result = RunUntilResult(simulation.ticks - start_tick, clock() - start, reached)
+        self.__until = None
+        self.__running.clear()
@@ -0,0 +1,21 @@
+import pytest
+
+from simulation import analytic
+
+# Largest mean error, analytic minus simulated, over the validation runs below
+TOLERANCE = {"station_availability": 0.01, "server_availability": 0.01, "station_utilization": 0.01,
+             "success_rate": 0.02}
+
+
+def test_protection_spent():
+    assert analytic.protection_spent(0.01, (0, 0)) == 0
+    assert analytic.protection_spent(0.01, (50, 50)) == pytest.approx(1 - 0.99 ** 50)
+    assert analytic.protection_spent(0.01, (0, 10 ** 6)) == pytest.approx(1, abs=1e-3)
+
+
+def test_analytic_matches_simulation():
+    validation = analytic.validate("small", 8, 30_000, 5_000, 0, "event", workers=1)
+    for name, tolerance in TOLERANCE.items():
+        assert abs(validation.errors[name].mean) < tolerance, name
+    # Ignoring unused crush protection biased this by about -1 point, outside the interval
+    assert validation.errors["server_availability"].low < 0 < validation.errors["server_availability"].high
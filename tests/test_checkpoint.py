@@ -0,0 +1,102 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+from simulation import checkpoint, scenarios
+from simulation.computers import ComputerListener
+from simulation.rng import BufferedRandom
+from simulation.sim import Simulation
+
+ENGINES = ["tick", pytest.param("vector", marks=pytest.mark.skipif(importlib.util.find_spec("numpy") is None,
+                                                                   reason="needs numpy")), "event"]
+
+
+class CrashLog(ComputerListener):
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.ids = {computer: i for i, computer in enumerate([*simulation.servers, *simulation.stations])}
+        self.crashes = []
+        for computer in self.ids:
+            computer.subscribe(self)
+
+    def computer_state_changed(self, computer) -> None:
+        if computer.is_broken:
+            self.crashes.append((self.simulation.ticks, self.ids[computer]))
+
+
+def state(sim: Simulation) -> tuple:
+    return (sim.ticks, sim.users_count, sim.success_users_count, len(sim.users), sim.working_users_count,
+            sim.broken_stations_count, sim.broken_servers_count, sim.free_stations_count)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_save_does_not_change_the_run(engine, tmp_path):
+    saved = scenarios.create("small", engine, {}, 5)
+    plain = scenarios.create("small", engine, {}, 5)
+    saved.run(2000)
+    plain.run(2000)
+    saved.save(tmp_path / "sim.ckpt")
+    saved.run(3000)
+    plain.run(3000)
+    assert state(saved) == state(plain)
+    assert saved.rng.random() == plain.rng.random()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_load_restores_state_and_generator(engine, tmp_path):
+    sim = scenarios.create("small", engine, {}, 5)
+    sim.run(2000)
+    sim.save(tmp_path / "sim.ckpt")
+    loaded = Simulation.load(tmp_path / "sim.ckpt", "tick")
+    assert state(loaded) == state(sim)
+    assert loaded.settings == sim.settings
+    assert [s.is_broken for s in loaded.stations] == [s.is_broken for s in sim.stations]
+    assert [s.occupied for s in loaded.stations] == [s.occupied for s in sim.stations]
+    assert [sim.engine.fix_time(s) for s in sim.stations] == [loaded.engine.fix_time(s) for s in loaded.stations]
+    assert loaded.rng.random() == sim.rng.random()
+
+
+@pytest.mark.parametrize("policy", ["fifo", "most-users-impacted"])
+def test_load_restores_repair_crews(policy, tmp_path):
+    sim = scenarios.create("campus", "tick", {"repair_policy": policy, "repair_crews": 2}, 5)
+    sim.run(400)
+    sim.save(tmp_path / "sim.ckpt")
+    loaded = Simulation.load(tmp_path / "sim.ckpt")
+    assert loaded.repairs.stats() == sim.repairs.stats()
+    assert sim.repairs.stats()["queued"] > 0
+    # The queue keeps its order: the next repairs go to the same computers
+    sim.run(100)
+    loaded.run(100)
+    assert loaded.repairs.stats() == sim.repairs.stats()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_forked_branches_are_independent(engine, tmp_path):
+    sim = scenarios.create("small", engine, {"station_replace_prob": 0, "server_replace_prob": 0}, 5)
+    sim.run(2000)
+    log = CrashLog(sim)
+    branch, children = checkpoint.fork(sim, 3)
+    try:
+        sim.run(1000)
+        (tmp_path / f"{branch}.json").write_text(json.dumps(log.crashes))
+    finally:
+        if branch:
+            os._exit(0)
+    for pid in children:
+        os.waitpid(pid, 0)
+    crashes = [{tuple(crash) for crash in json.loads((tmp_path / f"{b}.json").read_text())} for b in range(3)]
+    assert all(crashes)
+    # Crash times pending at the fork must be redrawn too, not only later draws
+    assert len(crashes[0] & crashes[1] & crashes[2]) < min(map(len, crashes)) / 2
+
+
+def test_generator_state_round_trip():
+    rng = BufferedRandom(3, block=16)
+    for _ in range(21):
+        rng.random()
+    copy = BufferedRandom()
+    copy.setstate(rng.getstate())
+    assert [copy.random() for _ in range(100)] == [rng.random() for _ in range(100)]
@@ -0,0 +1,70 @@
+import importlib.util
+
+import pytest
+
+from simulation import scenarios
+from simulation.computer_room import SUITABLE_RESOLUTIONS
+from simulation.computers import Resolution
+
+ENGINES = ["tick", pytest.param("vector", marks=pytest.mark.skipif(importlib.util.find_spec("numpy") is None,
+                                                                   reason="needs numpy")), "event"]
+# Rooms change often and fill up, so every index sees many updates
+SETTINGS = {"station_replace_prob": 0.2, "server_replace_prob": 0.2, "user_spawn_prob": 0.5}
+
+
+def snapshots(engine: str, policy: str, ticks: int = 2000, every: int = 50):
+    sim = scenarios.create("small", engine, {**SETTINGS, "repair_policy": policy}, 13)
+    for _ in range(ticks // every):
+        sim.run(every)
+        yield sim
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("policy", ["random", "fifo"])
+def test_free_station_index(engine, policy):
+    for sim in snapshots(engine, policy):
+        for room in sim.computer_rooms:
+            free = [s for s in room.stations if not s.is_broken and not s.occupied]
+            assert room.free_stations_count == len(free)
+            for resolution in Resolution:
+                suitable = [s for s in free if s.display_resolution in SUITABLE_RESOLUTIONS[resolution]]
+                assert room.count_free_stations(resolution) == len(suitable)
+                station = room.random_free_station(resolution)
+                assert station in suitable if suitable else station is None
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("policy", ["random", "fifo"])
+def test_aggregates(engine, policy):
+    for sim in snapshots(engine, policy):
+        stations = list(sim.stations)
+        assert sim.broken_stations_count == sum(s.is_broken for s in stations)
+        assert set(sim.broken_stations) == {s for s in stations if s.is_broken}
+        assert sim.broken_servers_count == sum(s.is_broken for s in sim.servers)
+        assert set(sim.broken_servers) == {s for s in sim.servers if s.is_broken}
+        assert sim.free_stations_count == sum(not s.occupied for s in stations)
+        assert sim.working_users_count == sum(s.occupied for s in stations)
+        assert set(sim.working_users) == {s.user for s in stations if s.occupied}
+        for room in sim.computer_rooms:
+            assert room.broken_stations_count == sum(s.is_broken for s in room.stations)
+            assert room.broken_servers_count == sum(s.is_broken for s in room.servers)
+            assert room.users_count == sum(s.occupied for s in room.stations)
+            assert set(room.users) == {s.user for s in room.stations if s.occupied}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("need_working", [True, False])
+def test_capability_counters(engine, need_working):
+    # Servers in the built-in scenarios hardly ever break within a test run
+    spec = {"servers": [{"count": 6, "crash_probability": 0.01}],
+            "rooms": [{"count": 4, "servers": [2, 4], "stations": {"HD": 3, "FullHD": 3, "UltraHD": 2}}]}
+    sim = scenarios.from_scenario(spec, engine, 13, {**SETTINGS, "capabilities_need_working_server": need_working})
+    for _ in range(40):
+        sim.run(50)
+        assert sim.have_gis == any(s.have_gis for s in sim.servers)
+        assert sim.have_dbms == any(s.have_dbms for s in sim.servers)
+        for room in sim.computer_rooms:
+            assert room.have_gis == any(s.have_gis for s in room.servers)
+            assert room.have_dbms == any(s.have_dbms for s in room.servers)
+            assert room.have_working_gis == any(s.have_gis and not s.is_broken for s in room.servers)
+            assert room.have_working_dbms == any(s.have_dbms and not s.is_broken for s in room.servers)
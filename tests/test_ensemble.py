@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+from simulation import ensemble
+
+# Two-sided 95% and 99% quantiles from standard tables
+T_TABLE = {1: (12.706, 63.657), 2: (4.303, 9.925), 3: (3.182, 5.841), 5: (2.571, 4.032), 10: (2.228, 3.169),
+           29: (2.045, 2.756), 30: (2.042, 2.750), 60: (2.000, 2.660), 120: (1.980, 2.617)}
+
+
+def test_replications_do_not_depend_on_workers():
+    serial = ensemble.run("small", replications=3, workers=1, ticks=500, seed=4)
+    parallel = ensemble.run("small", replications=3, workers=2, ticks=500, seed=4)
+    assert ([(r.seed, r.users_count, r.success_users_count) for r in serial.replications] ==
+            [(r.seed, r.users_count, r.success_users_count) for r in parallel.replications])
+    assert len({r.seed for r in serial.replications}) == 3
+
+
+def test_estimate():
+    estimate = ensemble.estimate([0.2, math.nan, 0.4, 0.6])
+    assert estimate.n == 3 and estimate.mean == pytest.approx(0.4)
+    assert estimate.low < 0.4 < estimate.high
+    assert math.isnan(ensemble.estimate([0.5]).low)
+
+
+@pytest.mark.parametrize("df", sorted(T_TABLE))
+def test_student_t_quantile(df):
+    for p, expected in zip((0.975, 0.995), T_TABLE[df]):
+        assert ensemble.student_t_quantile(p, df) == pytest.approx(expected, abs=1e-3)
+        assert ensemble.student_t_quantile(1 - p, df) == pytest.approx(-expected, abs=1e-3)
+
+
+def test_estimate_bounds():
+    estimate = ensemble.estimate([0.4, 0.9, 1.0], 0.95, ensemble.PROPORTION)
+    assert estimate.low >= 0 and estimate.high == 1.0
+    unbounded = ensemble.estimate([0.4, 0.9, 1.0], 0.95)
+    assert unbounded.high > 1.0 and unbounded.mean == estimate.mean
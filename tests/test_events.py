@@ -0,0 +1,79 @@
+import pytest
+
+from simulation import scenarios
+from simulation.computers import ComputerListener, Resolution, Station
+from simulation.sim import Simulation, SimulationListener
+
+
+class StateLog(ComputerListener):
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.changes = []
+
+    def computer_state_changed(self, computer) -> None:
+        self.changes.append((self.simulation.ticks, computer.is_broken))
+
+
+def state_changes(engine: str) -> list:
+    sim = Simulation(engine, seed=1)
+    station = Station(0.0, Resolution.HD)
+    sim.create_room([]).add_station(station)
+    sim.add_station(station)
+    # Only the repairs scheduled below
+    sim._dispatch_repairs = lambda: None
+    log = StateLog(sim)
+    station.subscribe(log)
+
+    station._set_broken(True)
+    station.fix(60)
+    sim.run(1)
+    station.fix(5)
+    sim.run(19)
+    station._set_broken(True)
+    sim.run(100)
+    return log.changes
+
+
+def test_rescheduled_fix_matches_tick_engine():
+    # The superseded fix(60) must not repair the station when it breaks again
+    assert state_changes("event") == state_changes("tick") == [(0, True), (6, False), (20, True)]
+
+
+
+class SkipLog(SimulationListener):
+
+    def __init__(self):
+        self.skipped = 0
+        self.under_repair = 0
+
+    def ticks_skipped(self, simulation, ticks: int) -> None:
+        self.skipped += ticks
+        if simulation.broken_stations_count + simulation.broken_servers_count:
+            self.under_repair += ticks
+
+
+def outcome(sim) -> tuple:
+    return (sim.ticks, sim.users_count, sim.success_users_count, len(sim.users),
+            [station.is_broken for station in sim.stations], [sim.engine.fix_time(s) for s in sim.broken_stations],
+            sim.repairs.stats(), sim.rng.random())
+
+
+@pytest.mark.parametrize("policy", ["fifo", "random"])
+def test_skipping_changes_nothing(policy):
+    # Skipped ticks are ones in which a tick would draw nothing and change nothing
+    settings = {"user_spawn_prob": 0.01, "station_replace_prob": 0.01, "repair_policy": policy}
+    skipped = scenarios.create("small", "event", settings, 12)
+    stepped = scenarios.create("small", "event", settings, 12)
+    log = SkipLog()
+    skipped.subscribe(log)
+    for _ in range(4):
+        skipped.run(5000)
+        skipped.reseed(skipped.ticks)
+        for _ in range(5000):
+            stepped.tick()
+        stepped.reseed(stepped.ticks)
+    assert log.skipped > 10000
+    if policy == "random":
+        assert log.under_repair > 5000
+    assert outcome(skipped) == outcome(stepped)
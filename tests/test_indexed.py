@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from simulation.indexed import IndexedList
+
+
+def check(items: IndexedList, expected: set) -> None:
+    assert set(items) == expected and len(items) == len(expected)
+    for position, item in enumerate(items):
+        assert items.index(item) == position
+        assert item in items
+
+
+def test_positions_follow_swap_remove():
+    rng = random.Random(2)
+    items = IndexedList()
+    expected = set()
+    for _ in range(2000):
+        action = rng.random()
+        if action < 0.4:
+            item = rng.randrange(100)
+            assert items.add(item) == (item not in expected)
+            expected.add(item)
+        elif action < 0.5:
+            batch = [rng.randrange(100) for _ in range(5)]
+            items.extend(batch)
+            expected.update(batch)
+        elif action < 0.9 and expected:
+            item = rng.choice(items)
+            items.remove(item)
+            expected.discard(item)
+        else:
+            item = rng.randrange(100)
+            assert items.discard(item) == (item in expected)
+            expected.discard(item)
+        check(items, expected)
+
+
+def test_missing_items():
+    items = IndexedList([1, 2, 3])
+    with pytest.raises(ValueError):
+        items.remove(4)
+    with pytest.raises(ValueError):
+        items.index(4)
+    items.remove(1)
+    assert list(items) == [3, 2]
+    assert items.count(2) == 1 and items.count(1) == 0
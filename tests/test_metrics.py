@@ -0,0 +1,87 @@
+import pytest
+
+from simulation import scenarios
+from simulation.sim import SimulationListener
+
+pytest.importorskip("numpy")
+
+from simulation import metrics  # noqa: E402
+
+# Few users, so the event engine skips idle stretches
+SETTINGS = {"user_spawn_prob": 0.003, "station_replace_prob": 0.01}
+
+
+# Recomputes the recorder's rows directly from the simulation
+class Reference(SimulationListener):
+
+    def __init__(self, simulation, stride: int):
+        self.stride = stride
+        self.rows = []
+        self.skipped = 0
+        self.successes = simulation.success_users_count
+        self.failures = self.failed(simulation)
+        simulation.subscribe(self)
+
+    @staticmethod
+    def failed(simulation) -> int:
+        return simulation.users_count - simulation.success_users_count - len(simulation.users)
+
+    def row(self, simulation, tick: int) -> dict:
+        successes, failures = simulation.success_users_count, self.failed(simulation)
+        row = {"tick": tick, "users": len(simulation.users), "working_users": simulation.working_users_count,
+               "broken_stations": simulation.broken_stations_count,
+               "broken_servers": simulation.broken_servers_count, "free_stations": simulation.free_stations_count,
+               "successes": successes - self.successes, "failures": failures - self.failures,
+               "repair_queue": simulation.repairs.queued, "busy_crews": simulation.repairs.busy_crews,
+               "room_free_stations": [room.free_stations_count for room in simulation.computer_rooms]}
+        self.successes, self.failures = successes, failures
+        return row
+
+    def tick_finished(self, simulation) -> None:
+        if simulation.ticks % self.stride == 0:
+            self.rows.append(self.row(simulation, simulation.ticks))
+
+    def ticks_skipped(self, simulation, ticks: int) -> None:
+        self.skipped += ticks
+        for tick in range(simulation.ticks - ticks + 1, simulation.ticks + 1):
+            if tick % self.stride == 0:
+                self.rows.append(self.row(simulation, tick))
+
+
+def assert_rows(columns: dict, rows: list) -> None:
+    assert {name: len(column) for name, column in columns.items()} == dict.fromkeys(columns, len(rows))
+    for name, column in columns.items():
+        assert column.tolist() == [row[name] for row in rows], name
+
+
+@pytest.mark.parametrize("engine", ["tick", "event"])
+def test_recorded_columns_match_simulation(engine, tmp_path):
+    sim = scenarios.create("small", engine, SETTINGS, 5)
+    reference = Reference(sim, 3)
+    recorder = metrics.MetricsRecorder(sim, tmp_path, stride=3, chunk=64, flush_every=10)
+    sim.run(700)
+    # Mid-run readers see whole flushed rows only
+    recorder.flush()
+    assert_rows(metrics.read(tmp_path), reference.rows)
+    sim.run(700)
+    recorder.close()
+    columns = metrics.read(tmp_path)
+    assert_rows(columns, reference.rows)
+    assert recorder.rows == len(reference.rows) == 1400 // 3
+    if engine == "event":
+        assert reference.skipped > 0
+    # Closing trims the files from whole chunks to the rows written
+    rooms = len(sim.computer_rooms)
+    assert (tmp_path / "room_free_stations.bin").stat().st_size == 4 * rooms * recorder.rows
+    assert (tmp_path / "tick.bin").stat().st_size == 8 * recorder.rows
+
+
+def test_read_before_first_flush(tmp_path):
+    sim = scenarios.create("small", "tick", SETTINGS, 5)
+    recorder = metrics.MetricsRecorder(sim, tmp_path, flush_every=100)
+    sim.run(50)
+    columns = metrics.read(tmp_path)
+    assert recorder.rows == 50 and len(columns["tick"]) == 0
+    assert columns["room_free_stations"].shape == (0, len(sim.computer_rooms))
+    recorder.close()
+    assert metrics.read(tmp_path)["tick"].tolist() == list(range(1, 51))
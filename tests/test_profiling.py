@@ -0,0 +1,77 @@
+import importlib.util
+
+import pytest
+
+from simulation import scenarios
+from simulation.profiling import BUCKETS, PHASES, PhaseStats, Profile
+
+# The event engine skips ticks, so its phases do not run once per tick
+ENGINES = ["tick", pytest.param("vector", marks=pytest.mark.skipif(importlib.util.find_spec("numpy") is None,
+                                                                   reason="needs numpy"))]
+
+
+def outcome(sim) -> tuple:
+    return (sim.ticks, sim.users_count, sim.success_users_count, sim.broken_stations_count,
+            sim.broken_servers_count, sim.rng.random())
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_every_phase_is_timed_once_per_tick(engine):
+    sim = scenarios.create("small", engine, {}, 6)
+    with Profile(sim) as profile:
+        sim.run(300)
+    for name, stats in profile.stats.items():
+        assert stats.calls == 300, name
+        assert sum(stats.histogram) == stats.calls
+        assert 0 < stats.max_ns <= stats.total_ns
+    # Phases run inside the tick
+    assert profile.stats["tick"].total_ns > sum(stats.total_ns for name, stats in profile.stats.items()
+                                                if name != "tick")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stop_restores_the_methods(engine):
+    profiled = scenarios.create("small", engine, {}, 6)
+    plain = scenarios.create("small", engine, {}, 6)
+    profile = Profile(profiled)
+    profile.start()
+    profiled.run(200)
+    profile.stop()
+    owners = {"simulation": profiled, "engine": profiled.engine}
+    for owner, name in PHASES:
+        assert name not in vars(owners[owner])
+    profiled.run(200)
+    plain.run(400)
+    assert outcome(profiled) == outcome(plain)
+    assert profile.stats["tick"].calls == 200
+
+
+def test_reset_keeps_wrappers_counting():
+    sim = scenarios.create("small", "tick", {}, 6)
+    with Profile(sim) as profile:
+        sim.run(100)
+        profile.reset()
+        assert all(stats.calls == 0 and not any(stats.histogram) for stats in profile.stats.values())
+        sim.run(50)
+    assert all(stats.calls == 50 == sum(stats.histogram) for stats in profile.stats.values())
+
+
+def test_dump_every_reports_while_running():
+    reports = []
+    sim = scenarios.create("small", "tick", {}, 6)
+    with Profile(sim, dump_every=40, report=reports.append):
+        sim.run(100)
+    sim.run(100)
+    assert [report.splitlines()[0] for report in reports] == ["tick 40", "tick 80"]
+
+
+def test_percentile():
+    stats = PhaseStats()
+    assert stats.percentile(0.5) == 0
+    for elapsed in [3] * 90 + [1000] * 10:
+        stats.calls += 1
+        stats.histogram[elapsed.bit_length()] += 1
+        stats.max_ns = max(stats.max_ns, elapsed)
+    assert len(stats.histogram) == BUCKETS
+    assert stats.percentile(0.5) == stats.percentile(0.9) == 4
+    assert stats.percentile(0.99) == stats.max_ns == 1000
@@ -0,0 +1,34 @@
+import pytest
+
+from simulation import repair, scenarios
+
+ENGINES = ["tick", "event"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("policy", sorted(repair.POLICIES))
+def test_crews_repair_one_computer_each(engine, policy):
+    sim = scenarios.create("small", engine, {"repair_policy": policy, "repair_crews": 2}, 9)
+    for _ in range(50):
+        sim.run(100)
+        stats = sim.repairs.stats()
+        assert stats["busy_crews"] <= 2
+        assert stats["busy_crews"] + stats["queued"] == sim.broken_stations_count + sim.broken_servers_count
+    assert stats["repaired"] > 0
+    assert sim.comp_min_fix_time <= stats["mean_time_to_repair"]
+    assert 0 < stats["crew_utilization"] <= 1
+
+
+def test_random_policy_is_the_default():
+    default = scenarios.create("small", "tick", {}, 9)
+    explicit = scenarios.create("small", "tick", {"repair_policy": repair.RANDOM, "repair_crews": 4}, 9)
+    default.run(3000)
+    explicit.run(3000)
+    assert default.repairs.stats() == explicit.repairs.stats()
+    assert (default.users_count, default.success_users_count) == (explicit.users_count, explicit.success_users_count)
+
+
+def test_check_policy():
+    repair.check_policy(repair.RANDOM)
+    with pytest.raises(ValueError, match="fifo"):
+        repair.check_policy("bogus")
@@ -0,0 +1,62 @@
+import importlib.util
+
+import pytest
+
+from simulation import scenarios
+
+ENGINES = ["tick", pytest.param("vector", marks=pytest.mark.skipif(importlib.util.find_spec("numpy") is None,
+                                                                   reason="needs numpy")), "event"]
+
+SPEC = {
+    "servers": [{"name": "core", "count": [3, 6]}],
+    "rooms": [{"count": [4, 8], "servers": {"core": [2, 3]}, "stations": {"HD": [2, 5], "FullHD": 3, "UltraHD": 2}}],
+}
+
+
+def topology(sim) -> tuple:
+    servers = {server: i for i, server in enumerate(sim.servers)}
+    return ([(s.chash_probability, s.have_gis, s.have_dbms, s.have_crush_protect) for s in sim.servers],
+            [[servers[s] for s in room.servers] for room in sim.computer_rooms],
+            [[(s.chash_probability, s.display_resolution) for s in room.stations] for room in sim.computer_rooms])
+
+
+def state(sim) -> tuple:
+    return (sim.ticks, sim.users_count, sim.success_users_count, len(sim.users), sim.broken_stations_count,
+            sim.free_stations_count)
+
+
+def test_counts_stay_in_their_ranges():
+    sim = scenarios.from_scenario(SPEC, "tick", 11)
+    assert 3 <= len(sim.servers) <= 6
+    assert 4 <= len(sim.computer_rooms) <= 8
+    for room in sim.computer_rooms:
+        assert 2 <= len(room.servers) <= 3
+        assert 7 <= len(room.stations) <= 10
+    with pytest.raises(ValueError, match="Unknown resolution"):
+        scenarios.from_scenario({"rooms": [{"stations": {"8K": 1}}]}, "tick", 11)
+
+
+@pytest.mark.parametrize("name", sorted(scenarios.SCENARIOS))
+@pytest.mark.parametrize("seed", [7, 8])
+def test_same_seed_gives_same_topology_on_every_engine(name, seed):
+    reference = topology(scenarios.create(name, "tick", {}, seed))
+    for engine in ("vector", "event") if importlib.util.find_spec("numpy") else ("event",):
+        assert topology(scenarios.create(name, engine, {}, seed)) == reference
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_scenario_cache_does_not_change_the_run(engine, tmp_path):
+    runs = []
+    for cache in (tmp_path, tmp_path, None):
+        sim = scenarios.from_scenario(SPEC, engine, 11, cache=cache)
+        sim.run(2000)
+        runs.append((topology(sim), state(sim), sim.rng.random()))
+    assert runs[0] == runs[1] == runs[2]
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_unknown_settings_are_rejected():
+    with pytest.raises(ValueError, match="Unknown simulation setting"):
+        scenarios.create("small", "tick", {"no_such_setting": 1}, 1)
+    with pytest.raises(ValueError, match="Unknown repair policy"):
+        scenarios.create("small", "tick", {"repair_policy": "bogus"}, 1)
@@ -0,0 +1,63 @@
+import pytest
+
+from simulation import ensemble, scenarios
+from simulation.sharding import ShardedSimulation, partition
+
+SETTINGS = {"user_spawn_prob": 0.3, "station_replace_prob": 0.05, "server_replace_prob": 0.02}
+
+
+def success_rate(sim) -> float:
+    return sim.success_users_count / sim.users_count
+
+
+def test_partition_balances_stations():
+    sim = scenarios.create("campus", "tick", {}, 1)
+    rooms = sim.computer_rooms
+    owners = partition(rooms, 3)
+    assert set(owners) == {0, 1, 2}
+    loads = [sum(len(room.stations) + 1 for room, owner in zip(rooms, owners) if owner == s) for s in range(3)]
+    assert max(loads) - min(loads) <= max(len(room.stations) + 1 for room in rooms)
+
+
+def test_sharded_totals_add_up():
+    sim = scenarios.create("small", "tick", SETTINGS, 2)
+    stations = len(sim.stations)
+    users = sim.users_count
+    with ShardedSimulation(sim, 3, epoch=7, seed=5) as sharded:
+        sharded.run(1000)
+        stats = sharded.shard_stats()
+        assert sharded.ticks == 1000 and all(shard["ticks"] == 1000 for shard in stats)
+        # Stations only move between shards
+        assert sharded.stations_count == stations == sum(shard["stations"] for shard in stats)
+        assert sharded.users_count == users + sum(shard["users_count"] for shard in stats) > users
+        assert sharded.success_users_count == sum(shard["success_users_count"] for shard in stats) > 0
+        assert sharded.live_users_count == sum(shard["users"] for shard in stats)
+        assert 0 <= sharded.working_users_count <= sharded.live_users_count
+        assert sharded.free_stations_count + sharded.broken_stations_count <= stations
+        # Servers are replicated
+        assert len({shard["broken_servers"] for shard in stats}) == 1
+
+
+def test_sharded_run_matches_single_process():
+    # Independent streams, so only the distributions agree; pairing runs of the same
+    # campus takes the spread between campuses out of the comparison
+    differences = []
+    for seed in range(10):
+        sim = scenarios.create("small", "tick", SETTINGS, seed)
+        sim.run(4000)
+        with ShardedSimulation(scenarios.create("small", "tick", SETTINGS, seed), 2, epoch=10) as sharded:
+            sharded.run(4000)
+            differences.append(success_rate(sharded) - success_rate(sim))
+    estimate = ensemble.estimate(differences)
+    assert estimate.low <= 0 <= estimate.high
+    assert estimate.high - estimate.low < 0.05
+
+
+def test_rejects_bad_arguments():
+    sim = scenarios.create("small", "tick", {}, 1)
+    with pytest.raises(ValueError):
+        ShardedSimulation(sim, 4)
+    with pytest.raises(ValueError):
+        ShardedSimulation(sim, 2, epoch=0)
+    with pytest.raises(ValueError):
+        ShardedSimulation(scenarios.create("small", "tick", {"repair_policy": "fifo"}, 1), 2)
@@ -0,0 +1,19 @@
+from simulation import sweep
+
+
+def test_engine_version_covers_the_simulation():
+    names = {path.name for path in sweep.simulation_modules()}
+    assert {"sim.py", "engines.py", "vector.py", "events.py", "repair.py", "rng.py", "scenarios.py",
+            "ensemble.py"} <= names
+    assert not names & {"__main__.py", "runner.py", "metrics.py", "telemetry.py", "sharding.py", "analytic.py"}
+
+
+def test_cached_replications_are_reused(tmp_path):
+    store = sweep.ResultStore(tmp_path)
+    points = sweep.grid(station_replace_prob=[0.0, 0.01])
+    first = sweep.run(points, replications=2, ticks=500, store=store, workers=1)
+    lines = []
+    second = sweep.run(points, replications=2, ticks=500, store=store, workers=1, report=lines.append)
+    assert lines == ["4 cached, 0 to compute"]
+    assert ([[(r.seed, r.users_count, r.success_users_count) for r in p.replications] for p in first] ==
+            [[(r.seed, r.users_count, r.success_users_count) for r in p.replications] for p in second])
@@ -0,0 +1,35 @@
+import pytest
+
+from simulation import scenarios
+from simulation.telemetry import Mirror, TelemetryRecorder, decode
+
+
+def mirror_state(mirror: Mirror) -> tuple:
+    return (mirror.tick, mirror.counters, bytes(mirror.servers), bytes(mirror.stations), list(mirror.station_rooms),
+            mirror.room_servers)
+
+
+@pytest.mark.parametrize("engine", ["tick", "event"])
+def test_deltas_rebuild_keyframes(engine):
+    # One mirror follows deltas from a single keyframe, the other gets a fresh keyframe every tick
+    sim = scenarios.create("small", engine, {"station_replace_prob": 0.05, "server_replace_prob": 0.05}, 3)
+    frames = {"delta": [], "keyframe": []}
+    mirrors = {"delta": Mirror(), "keyframe": Mirror()}
+    recorders = [TelemetryRecorder(sim, lambda frame, keyframe: frames["delta"].append(frame), 10 ** 9),
+                 TelemetryRecorder(sim, lambda frame, keyframe: frames["keyframe"].append(frame), 1)]
+    for recorder in recorders:
+        recorder.start()
+
+    deltas = 0
+    for _ in range(2000):
+        sim.tick()
+        for name, mirror in mirrors.items():
+            for frame in frames[name]:
+                deltas += name == "delta" and not decode(frame)["keyframe"]
+                mirror.apply(frame)
+            frames[name].clear()
+        assert mirror_state(mirrors["delta"]) == mirror_state(mirrors["keyframe"])
+    assert deltas > 0
+
+    for recorder in recorders:
+        recorder.stop()
@@ -0,0 +1,39 @@
+import importlib.util
+
+import pytest
+
+from simulation import scenarios
+from simulation.computers import Resolution, Server, Station
+from simulation.user import User
+
+ENGINES = ["tick", pytest.param("vector", marks=pytest.mark.skipif(importlib.util.find_spec("numpy") is None,
+                                                                   reason="needs numpy")), "event"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pooled_user_is_reset(engine):
+    sim = scenarios.create("small", engine, {"user_spawn_prob": 0.5}, 4)
+    sim.run(500)
+    user = next(user for user in sim.users if user.have_station)
+    station = user._state()[5]
+    user.remove()
+    assert station.user is None and user not in sim.users
+
+    reused = sim.create_user(Resolution.UltraHD, True, False, 7)
+    assert reused is user
+    assert reused._state() == User(sim, Resolution.UltraHD, True, False, 7)._state()
+    assert reused in sim.users
+    # Nothing left over from its previous life, such as a pending wake-up, may touch it
+    for _ in range(500):
+        sim.run(1)
+        for user in sim.users:
+            station = user._state()[5]
+            assert station is None or station.user is user
+        assert sim.working_users_count == sum(station.occupied for station in sim.stations)
+
+
+def test_entities_have_no_instance_dict():
+    sim = scenarios.create("small", "tick", {}, 4)
+    for entity in (Server(0.1, True, True, True), Station(0.1, Resolution.HD),
+                   sim.create_user(Resolution.HD, False, False, 1)):
+        assert not hasattr(entity, "__dict__")
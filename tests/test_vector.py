@@ -0,0 +1,42 @@
+import pytest
+
+from simulation import ensemble, scenarios
+from simulation.computers import Resolution, Station
+
+pytest.importorskip("numpy")
+
+SETTINGS = {"station_replace_prob": 0.01, "server_replace_prob": 0.01}
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_vector_engine_matches_tick_engine(seed):
+    # Different random streams, so the engines only agree in distribution
+    tick = ensemble.run("small", 10, 1, 3000, seed, "tick", SETTINGS)
+    vector = ensemble.run("small", 10, 1, 3000, seed, "vector", SETTINGS)
+    for metric in ("success_rate", "station_utilization"):
+        a, b = getattr(tick, metric), getattr(vector, metric)
+        assert abs(a.mean - b.mean) <= (a.high - a.low) / 2 + (b.high - b.low) / 2
+
+
+def test_removed_computers_free_their_slots():
+    # As when shards hand stations over to each other
+    sim = scenarios.create("small", "vector", {}, 3)
+    computers = len(sim.servers) + len(sim.stations)
+    for i in range(20):
+        sim.run(100)
+        for station in sim.rng.sample(list(sim.stations), 3):
+            sim.remove_station(station)
+        stations = [Station(0.01, Resolution.HD) for _ in range(3)]
+        room = sim.rng.choice(sim.computer_rooms)
+        if i % 2:
+            room.add_stations(stations)
+            sim.add_stations(stations)
+        else:
+            for station in stations:
+                room.add_station(station)
+                sim.add_station(station)
+        live = [*sim.servers, *sim.stations]
+        assert len(sim.engine.broken) == computers == len(live)
+        assert sorted(sim.engine.index(computer) for computer in live) == list(range(computers))
+        assert [bool(sim.engine.broken[sim.engine.index(computer)]) for computer in live] == \
+               [computer.is_broken for computer in live]
@@ -0,0 +1,236 @@
+import itertools
+import time
+
+from simulation import scenarios
+from simulation.worker import SimulationWorker
+from visulisation.config import room_detail_px, unselected_bg
+from visulisation import visualization_objects
+from visulisation.visualization_objects import (ChangeTracker, Connection, DetailPanel, RoomVisualization,
+                                                  SeverVisualization, StationVisualization, heat_color)
+
+
+# Records what would be drawn, so the objects run without a display
+class FakeCanvas:
+
+    def __init__(self):
+        self.__ids = itertools.count(1)
+        self.items = {}
+        self.bindings = {}
+
+    def __create(self, *coords, **options):
+        item = next(self.__ids)
+        self.items[item] = {"coords": list(coords), "state": "normal", **options}
+        return item
+
+    create_rectangle = create_line = __create
+
+    def tag_bind(self, item, sequence, callback):
+        self.bindings[item] = callback
+
+    def itemconfig(self, item, **options):
+        self.items[item].update(options)
+
+    def coords(self, item, *coords):
+        if coords:
+            self.items[item]["coords"] = list(coords)
+        return self.items[item]["coords"]
+
+    def delete(self, item):
+        del self.items[item]
+
+    def tag_raise(self, item):
+        pass
+
+    def tag_lower(self, item):
+        pass
+
+
+class FakeVisualization:
+
+    def __init__(self, simulation):
+        self.canvas = FakeCanvas()
+        self.rectangle = self.canvas.create_rectangle(0, 0, 0, 0)
+        self.worker = SimulationWorker(simulation)
+        self.station_views = {}
+        self.calls = []
+
+    def station_visualization(self, station, create=False):
+        view = self.station_views.get(station)
+        if view is None and create:
+            view = self.station_views[station] = StationVisualization(self, station)
+        return view
+
+    def set_low(self):
+        ticks = self.worker.simulation.ticks
+        time.sleep(0.005)
+        self.calls.append(("set_low", ticks, self.worker.simulation.ticks))
+
+    def on_canvas_click(self):
+        self.calls.append(("canvas",))
+
+    def show_details(self, source):
+        self.calls.append(("details", source))
+
+
+def test_clicks_hold_the_worker():
+    sim = scenarios.create("small", "tick", {}, 9)
+    visualization = FakeVisualization(sim)
+    room = RoomVisualization(visualization, sim.computer_rooms[0], 0, 0, 100, 100)
+    visualization.worker.start()
+    try:
+        for _ in range(5):
+            visualization.canvas.bindings[room._obj]()
+    finally:
+        visualization.worker.stop()
+    clicks = [call for call in visualization.calls if call[0] == "set_low"]
+    assert len(clicks) == 5 and sim.ticks > 0
+    assert all(before == after for _, before, after in clicks)
+    assert visualization.calls[-1] == ("details", room)
+
+
+def test_rooms_switch_to_tiles_when_small():
+    sim = scenarios.create("small", "tick", {"user_spawn_prob": 0.5}, 9)
+    sim.run(300)
+    visualization = FakeVisualization(sim)
+    canvas = visualization.canvas
+    room = sim.computer_rooms[0]
+    view = RoomVisualization(visualization, room, 0, 0, room_detail_px - 1, 100)
+    view.update_stations()
+    # Stations of a room never drawn in detail are not created
+    assert not view.detailed and not visualization.station_views
+    stations = len(room.stations)
+    assert canvas.items[view._obj]["fill"] == heat_color(room.users_count / stations,
+                                                        room.broken_stations_count / stations)
+
+    view.change_position(10, 10, 200, 100)
+    assert view.detailed and set(visualization.station_views) == set(room.stations)
+    assert canvas.items[view._obj]["fill"] == unselected_bg
+    for station in visualization.station_views.values():
+        x1, y1, x2, y2 = canvas.coords(station._obj)
+        assert 10 <= x1 < x2 <= 210 and 10 <= y1 < y2 <= 110
+        assert canvas.items[station._obj]["state"] == "normal"
+
+    view.change_position(10, 10, 20, 100)
+    assert not view.detailed
+    assert all(canvas.items[station._obj]["state"] == "hidden" for station in visualization.station_views.values())
+
+    # Off screen rooms are not detailed whatever their size
+    view.change_position(10, 10, 200, 100)
+    view.set_visible(False)
+    view.update_stations()
+    assert not view.detailed
+    assert all(canvas.items[station._obj]["state"] == "hidden" for station in visualization.station_views.values())
+
+
+class FakeLabel:
+
+    def __init__(self, textvariable):
+        self.text = textvariable
+        self.packed = False
+
+    def pack(self, **options):
+        self.packed = True
+
+    def pack_forget(self):
+        self.packed = False
+
+
+class FakeStringVar:
+    sets = 0
+
+    def __init__(self):
+        self.value = ""
+
+    def set(self, value):
+        FakeStringVar.sets += 1
+        self.value = value
+
+
+class Source:
+
+    def __init__(self, *lines):
+        self.lines = list(lines)
+
+    def details(self):
+        return list(self.lines)
+
+
+def test_detail_panel_only_sets_changed_lines(monkeypatch):
+    labels = []
+
+    def label(**options):
+        labels.append(FakeLabel(**options))
+        return labels[-1]
+
+    monkeypatch.setattr(visualization_objects, "Label", label)
+    monkeypatch.setattr(visualization_objects, "StringVar", FakeStringVar)
+    FakeStringVar.sets = 0
+
+    def shown():
+        return [label.text.value for label in labels if label.packed]
+
+    panel = DetailPanel()
+    panel.refresh()
+    assert not labels
+    source = Source("a", "b", "c")
+    panel.show(source)
+    assert shown() == ["a", "b", "c"] and FakeStringVar.sets == 3
+    panel.refresh()
+    assert FakeStringVar.sets == 3
+    source.lines[1] = "B"
+    panel.refresh()
+    assert shown() == ["a", "B", "c"] and FakeStringVar.sets == 4
+
+    # Labels are shared between sources and only ever added
+    panel.show(Source("a", "x"))
+    assert shown() == ["a", "x"] and FakeStringVar.sets == 5 and len(labels) == 3
+    panel.show(Source("1", "2", "3", "4"))
+    assert shown() == ["1", "2", "3", "4"] and len(labels) == 4
+    assert panel.source.lines == ["1", "2", "3", "4"]
+
+
+def test_change_tracker_marks_changed_objects():
+    sim = scenarios.create("small", "tick", {"user_spawn_prob": 0.5, "station_replace_prob": 0.05,
+                                             "server_replace_prob": 0.05}, 9)
+    visualization = FakeVisualization(sim)
+    servers = [SeverVisualization(visualization, server) for server in sim.servers]
+    # Every other room is drawn as a tile
+    rooms = [RoomVisualization(visualization, room, 0, 0, 200 if i % 2 else 20, 100)
+             for i, room in enumerate(sim.computer_rooms)]
+    connections = {room: [Connection(visualization, room, server) for server in servers] for room in rooms}
+    tracker = ChangeTracker(visualization, servers, rooms, connections)
+    for computer in [*sim.servers, *sim.stations]:
+        computer.subscribe(tracker)
+    for room in sim.computer_rooms:
+        room.subscribe(tracker)
+    assert tracker.take_layouts() == set(rooms)
+    assert len(tracker.take_dirty()) == len(servers) + len(rooms) + len(servers) * len(rooms)
+    for room in rooms:
+        room.update_stations()
+    views = {**{view.server: view for view in servers}, **visualization.station_views}
+
+    def state():
+        return ({computer: (computer.is_broken, getattr(computer, "occupied", False)) for computer in views},
+                {room: (list(room.room.stations), list(room.room.servers), room.room.users_count,
+                        room.room.broken_stations_count) for room in rooms})
+
+    marked = 0
+    for _ in range(300):
+        computers, before = state()
+        sim.tick()
+        after_computers, after = state()
+        layouts, dirty = tracker.take_layouts(), tracker.take_dirty()
+        marked += len(dirty)
+        for computer, view in views.items():
+            if computer in sim.stations or computer in sim.servers:
+                assert computers[computer] == after_computers[computer] or view in dirty
+        for room in rooms:
+            stations, room_servers, users, broken = before[room]
+            if stations != after[room][0]:
+                assert room in layouts and room in dirty
+            if room_servers != after[room][1]:
+                assert room in dirty and set(connections[room]) <= dirty
+            if users != after[room][2] or not room.detailed and broken != after[room][3]:
+                assert room in dirty
+    # Far fewer than redrawing everything every tick
+    assert marked < 300 * (len(views) + len(rooms)) / 4
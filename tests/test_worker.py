@@ -0,0 +1,113 @@
+import time
+
+from simulation import scenarios
+from simulation.worker import CONDITIONS, SimulationWorker
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_frame_holds_the_simulation_still():
+    sim = scenarios.create("small", "tick", {"user_spawn_prob": 0.5}, 8)
+    worker = SimulationWorker(sim)
+    worker.start()
+    try:
+        seen = []
+        for _ in range(20):
+            assert wait_for(lambda: sim.ticks > (seen[-1] if seen else 0))
+            with worker.frame() as simulation:
+                ticks = simulation.ticks
+                broken = simulation.broken_stations_count
+                time.sleep(0.002)
+                assert simulation.ticks == ticks
+                assert broken == sum(station.is_broken for station in simulation.stations)
+                assert simulation.working_users_count == sum(station.occupied for station in simulation.stations)
+            seen.append(ticks)
+        assert seen == sorted(set(seen))
+    finally:
+        worker.stop()
+
+
+def test_pause_resume_and_stop():
+    sim = scenarios.create("small", "tick", {}, 8)
+    worker = SimulationWorker(sim)
+    worker.start(paused=True)
+    time.sleep(0.02)
+    assert worker.paused and sim.ticks == 0
+    worker.resume()
+    assert wait_for(lambda: sim.ticks > 100)
+    worker.pause()
+    with worker.frame():
+        ticks = sim.ticks
+    time.sleep(0.02)
+    assert sim.ticks == ticks
+    worker.resume()
+    assert wait_for(lambda: sim.ticks > ticks)
+    worker.stop()
+    ticks = sim.ticks
+    time.sleep(0.02)
+    assert sim.ticks == ticks
+
+
+def test_tick_rate_is_a_ceiling():
+    sim = scenarios.create("small", "tick", {}, 8)
+    worker = SimulationWorker(sim, tick_rate=200)
+    worker.start()
+    time.sleep(0.25)
+    worker.stop()
+    assert 0 < sim.ticks <= 200 * 0.25 + 2
+
+
+def test_run_until_condition():
+    sim = scenarios.create("small", "tick", {}, 8)
+    worker = SimulationWorker(sim)
+    worker.start(paused=True)
+    try:
+        watch = CONDITIONS["User succeeds"]
+        before = watch(sim)
+        worker.run_until(watch, 10 ** 9)
+        assert wait_for(lambda: not worker.fast_forwarding)
+        result = worker.take_result()
+        assert result.reached and worker.paused
+        assert watch(sim) > before and result.ticks == sim.ticks
+        # A result is handed out once
+        assert worker.take_result() is None
+    finally:
+        worker.stop()
+
+
+def test_run_until_limit():
+    sim = scenarios.create("small", "tick", {}, 8)
+    worker = SimulationWorker(sim)
+    worker.start()
+    try:
+        worker.run_until(lambda simulation: 0, 5000)
+        assert wait_for(lambda: not worker.fast_forwarding)
+        with worker.frame():
+            assert sim.ticks == 5000
+        result = worker.take_result()
+        assert not result.reached and worker.paused
+        assert 0 < result.ticks <= 5000 and result.ticks_per_second > 0
+    finally:
+        worker.stop()
+
+
+def test_pause_cancels_run_until():
+    sim = scenarios.create("small", "tick", {}, 8)
+    worker = SimulationWorker(sim)
+    worker.start(paused=True)
+    try:
+        worker.run_until(lambda simulation: 0, 10 ** 12)
+        assert wait_for(lambda: sim.ticks > 1000)
+        worker.pause()
+        assert wait_for(lambda: not worker.fast_forwarding)
+        result = worker.take_result()
+        assert not result.reached and result.ticks == sim.ticks < 10 ** 12
+    finally:
+        worker.stop()
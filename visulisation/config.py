@@ -1,5 +1,8 @@
 canvas_size = 0.7  # Доля от всего окна по горизонтали
 canvas_color = "#a5bab5"
+frame_ms = 33  # Период перерисовки окна, мс
+room_detail_px = 60  # Минимальная ширина аудитории на экране, при которой рисуются отдельные станции
+zoom_step = 1.25
 
 selected_fg = "#000000"
 selected_bg = "#f0f0f0"
@@ -1,5 +1,7 @@
 from simulation.sim import Simulation
-from visulisation.visualization_objects import SeverVisualization, RoomVisualization, StationVisualization, Connection
+from simulation.worker import SimulationWorker, CONDITIONS
+from visulisation.visualization_objects import (SeverVisualization, RoomVisualization, StationVisualization,
+                                                  Connection, DetailPanel, ChangeTracker)
 from tkinter import *
 from tkinter import ttk
 from visulisation.config import *
@@ -12,6 +14,15 @@ class Visualization:
 
     def __init__(self, simulation: Simulation, width: int, height: int):
         self.__simulation = simulation
+        # The simulation runs on its own thread; frames are drawn at a fixed rate
+        self.__worker = SimulationWorker(simulation)
+
+        # Zoom relative to the fitted layout and the layout point shown at the canvas' top-left corner
+        self.__zoom = 1.0
+        self.__pan_x = 0.0
+        self.__pan_y = 0.0
+        self.__drag = None
+        self.__view_changed = True
 
         self.__window = Tk()
         self.__window.geometry(f"{width}x{height}")
@@ -24,6 +35,13 @@ class Visualization:
         self.__rectangle = self.__canvas.create_rectangle(0, 0, 0, 0, width=0)
 
         self.__canvas.tag_bind(self.__rectangle, "<Button-1>", self.on_canvas_click)
+        # Wheel zooms around the cursor, right button drags, middle button fits everything again
+        self.__canvas.bind("<MouseWheel>", self.__on_zoom)
+        self.__canvas.bind("<Button-4>", self.__on_zoom)
+        self.__canvas.bind("<Button-5>", self.__on_zoom)
+        self.__canvas.bind("<ButtonPress-3>", self.__on_drag_start)
+        self.__canvas.bind("<B3-Motion>", self.__on_drag)
+        self.__canvas.bind("<Button-2>", self.__on_fit)
         self.__configure_canvas()
         self.__window.bind("<Configure>", self.__on_change_size)
 
@@ -32,28 +50,40 @@ class Visualization:
         mspt_frame = Frame()
         mspt_frame.pack(side=BOTTOM, anchor=S)
 
+        # Milliseconds per tick, 0 runs the simulation as fast as possible
         self.__mspt = IntVar(value=10)
         Label(mspt_frame, text="MSTP").pack(anchor=SE, side=RIGHT, pady=3)
         ttk.Entry(mspt_frame, width=6, textvariable=self.__mspt, validate="key",
-                  validatecommand=(self.__window.register(lambda x: x.isdigit() and 10 <= int(x) <= 1000), "%P")).pack(
+                  validatecommand=(self.__window.register(lambda x: x.isdigit() and 0 <= int(x) <= 1000), "%P")).pack(
             anchor=SE, side=RIGHT, pady=3)
-        ttk.Scale(mspt_frame, from_=10, to=1000, variable=self.__mspt,
+        ttk.Scale(mspt_frame, from_=0, to=1000, variable=self.__mspt,
                   command=lambda s: self.__mspt.set(int(float(s)))).pack(anchor=SE, side=RIGHT, padx=5)
-        self.__pause = False
         self.__button = ttk.Button(mspt_frame, text="Stop", command=self.__on_button_click)
         self.__button.pack(anchor=SE, side=RIGHT, padx=5, pady=3)
 
-        self.__widgets = []
-        self.__widgets.append(Label(text="Simulation"))
-        self.__widgets.append(Label(text=f"Servers: {len(simulation.servers)}"))
-        self.__widgets.append(Label(text=f"Stations: {len(simulation.stations)}"))
+        # Ticks run per MSPT step
+        self.__ticks_per_step = IntVar(value=1)
+        Label(mspt_frame, text="x").pack(anchor=SE, side=RIGHT, pady=3)
+        ttk.Entry(mspt_frame, width=6, textvariable=self.__ticks_per_step, validate="key",
+                  validatecommand=(self.__window.register(lambda x: x.isdigit() and 1 <= int(x) <= 100000), "%P")).pack(
+            anchor=SE, side=RIGHT, pady=3)
 
-        self.__users_text = StringVar(value=f"Users: {len(simulation.users)}")
-        self.__widgets.append(Label(textvariable=self.__users_text))
+        # Fast-forward to a tick or until a condition, without redrawing on the way
+        run_frame = Frame()
+        run_frame.pack(side=BOTTOM, anchor=S)
+        self.__run_status = StringVar(value="")
+        Label(run_frame, textvariable=self.__run_status).pack(anchor=SE, side=RIGHT, padx=5, pady=3)
+        ttk.Button(run_frame, text="Run", command=self.__on_run_click).pack(anchor=SE, side=RIGHT, padx=5, pady=3)
+        self.__run_ticks = IntVar(value=50000)
+        ttk.Entry(run_frame, width=8, textvariable=self.__run_ticks, validate="key",
+                  validatecommand=(self.__window.register(lambda x: x.isdigit()), "%P")).pack(
+            anchor=SE, side=RIGHT, pady=3)
+        self.__run_target = StringVar(value="To tick")
+        ttk.Combobox(run_frame, width=16, textvariable=self.__run_target, state="readonly",
+                     values=["To tick", *CONDITIONS]).pack(anchor=SE, side=RIGHT, padx=5, pady=3)
 
-        self.__success_users_text = StringVar(
-            value=f"All/Success users: {simulation.users_count}/{simulation.success_users_count}")
-        self.__widgets.append(Label(textvariable=self.__success_users_text))
+        # One panel for whatever is selected, refreshed only while that object is on screen
+        self.__details = DetailPanel()
 
         self.__servers = []
         for i in range(len(self.__simulation.servers)):
@@ -63,23 +93,39 @@ class Visualization:
         for i in range(len(self.__simulation.computer_rooms)):
             self.__rooms.append(RoomVisualization(self, self.__simulation.computer_rooms[i], *self.__get_room_pos(i)))
 
+        # Created when their room is first drawn in detail
         self.__stations = []
-        for i in range(len(self.__simulation.stations)):
-            self.__stations.append(StationVisualization(self, self.__simulation.stations[i], 0, 0, 0, 0))
 
         self.__connections = []
+        room_connections = {}
         for room in self.__rooms:
+            room_connections[room] = []
             for server in self.__servers:
-                self.__connections.append(Connection(self, room, server))
+                connection = Connection(self, room, server)
+                self.__connections.append(connection)
+                room_connections[room].append(connection)
+
+        self.__station_views = {}
+
+        self.__changes = ChangeTracker(self, self.__servers, self.__rooms, room_connections)
+        for computer in list(simulation.servers) + list(simulation.stations):
+            computer.subscribe(self.__changes)
+        for room in simulation.computer_rooms:
+            room.subscribe(self.__changes)
 
         self.pack()
-        self.__ticks = 0
+        self.__worker.tick_rate = self.__tick_rate()
+        self.__worker.start()
         self.update()
         self.__window.mainloop()
+        self.__worker.stop()
 
     def __on_button_click(self):
-        self.__pause = not self.__pause
-        if self.__pause:
+        if self.__worker.paused:
+            self.__worker.resume()
+        else:
+            self.__worker.pause()
+        if self.__worker.paused:
             self.__button.configure(text="Start")
         else:
             self.__button.configure(text="Stop")
@@ -92,42 +138,93 @@ class Visualization:
     def rectangle(self):
         return self.__rectangle
 
-    def update_widgets(self):
-        self.__users_text.set(f"Users: {len(self.__simulation.users)}")
-        self.__success_users_text.set(
-            f"All/Success users: {self.__simulation.users_count}/{self.__simulation.success_users_count}")
+    def station_visualization(self, station, create: bool = False):
+        view = self.__station_views.get(station)
+        if view is None and create:
+            view = StationVisualization(self, station)
+            view.update()
+            self.__stations.append(view)
+            self.__station_views[station] = view
+        return view
+
+    def details(self) -> list[str]:
+        simulation = self.__simulation
+        return ["Simulation",
+                f"Servers: {len(simulation.servers)}",
+                f"Stations: {len(simulation.stations)}",
+                f"Users: {len(simulation.users)}",
+                f"All/Success users: {simulation.users_count}/{simulation.success_users_count}"]
+
+    def show_details(self, source):
+        self.__details.show(source)
 
     def pack(self):
-        self.unpack()
-        for widget in self.__widgets:
-            widget.pack(anchor=NW)
-
-    def unpack(self):
-        for obj in self.__servers + self.__stations + self.__rooms + self.__connections:
-            obj.unpack()
-        for widget in self.__widgets:
-            widget.pack_forget()
+        self.show_details(self)
 
     def on_canvas_click(self, *args):
-        for s in self.__servers:
-            s.unselect()
-        for r in self.__rooms:
-            r.set_mid_all()
-        for c in self.__connections:
-            c.unselect()
+        with self.__worker.frame():
+            for s in self.__servers:
+                s.unselect()
+            for r in self.__rooms:
+                r.set_mid_all()
+            for c in self.__connections:
+                c.unselect()
 
-        self.pack()
+            self.pack()
 
     def __on_change_size(self, *args):
         self.__configure_canvas()
-        for i in range(len(self.__servers)):
-            self.__servers[i].change_position(*self.__get_server_pos(i))
-
-        for i in range(len(self.__rooms)):
-            self.__rooms[i].change_position(*self.__get_room_pos(i))
+        self.__view_changed = True
+
+    def __on_zoom(self, event):
+        zoom_in = event.num == 4 or event.delta > 0
+        zoom = self.__zoom * zoom_step if zoom_in else self.__zoom / zoom_step
+        # Up to one room filling the canvas
+        zoom = min(max(zoom, 1.0), max(4.0, len(self.__rooms)))
+        # Keep the point under the cursor in place
+        self.__pan_x += event.x / self.__zoom - event.x / zoom
+        self.__pan_y += event.y / self.__zoom - event.y / zoom
+        self.__zoom = zoom
+        self.__clamp_pan()
+
+    def __on_drag_start(self, event):
+        self.__drag = (event.x, event.y, self.__pan_x, self.__pan_y)
+
+    def __on_drag(self, event):
+        if self.__drag is None:
+            return
+        x, y, pan_x, pan_y = self.__drag
+        self.__pan_x = pan_x - (event.x - x) / self.__zoom
+        self.__pan_y = pan_y - (event.y - y) / self.__zoom
+        self.__clamp_pan()
+
+    def __on_fit(self, *args):
+        self.__zoom = 1.0
+        self.__clamp_pan()
+
+    def __clamp_pan(self):
+        self.__pan_x = min(max(self.__pan_x, 0.0), self.__canvas_width * (1 - 1 / self.__zoom))
+        self.__pan_y = min(max(self.__pan_y, 0.0), self.__canvas_height * (1 - 1 / self.__zoom))
+        self.__view_changed = True
+
+    def __on_screen(self, x, y, width, height):
+        return x + width >= 0 and y + height >= 0 and x <= self.__canvas_width and y <= self.__canvas_height
+
+    def __relayout(self):
+        # Off-screen objects are hidden and skipped by redraw until they scroll back in
+        for i, server in enumerate(self.__servers):
+            position = self.__get_server_pos(i)
+            server.change_position(*position)
+            server.set_visible(self.__on_screen(*position))
+
+        for i, room in enumerate(self.__rooms):
+            position = self.__get_room_pos(i)
+            room.set_visible(self.__on_screen(*position))
+            room.change_position(*position)
 
         for c in self.__connections:
             c.update_position()
+            c.set_visible(self.__on_screen(*c.bounds))
 
     def __configure_canvas(self):
         self.__canvas_width = int(self.__window.winfo_width() * canvas_size)
@@ -136,19 +233,23 @@ class Visualization:
                                 height=self.__canvas_height)
         self.__canvas.coords(self.__rectangle, 0, 0, self.__canvas_width, self.__canvas_height)
 
+    def __to_screen(self, x, y, width, height):
+        zoom = self.__zoom
+        return [(x - self.__pan_x) * zoom, (y - self.__pan_y) * zoom, width * zoom, height * zoom]
+
     def __get_server_pos(self, number):
-        height = int(self.__canvas_height * 0.9 / 7)
-        width = int(self.__canvas_width * 0.9 / len(self.__simulation.servers))
-        width_margin = int((self.__canvas_width * 0.1) / (len(self.__simulation.servers) + 1))
+        height = self.__canvas_height * 0.9 / 7
+        width = self.__canvas_width * 0.9 / len(self.__simulation.servers)
+        width_margin = (self.__canvas_width * 0.1) / (len(self.__simulation.servers) + 1)
 
-        return [width_margin * (number + 1) + width * number, height, width, height]
+        return self.__to_screen(width_margin * (number + 1) + width * number, height, width, height)
 
     def __get_room_pos(self, number):
-        height = int(self.__canvas_height * 0.9 / 7)
-        width = int(self.__canvas_width * 0.9 / len(self.__simulation.computer_rooms))
-        width_margin = int((self.__canvas_width * 0.1) / (len(self.__simulation.computer_rooms) + 1))
+        height = self.__canvas_height * 0.9 / 7
+        width = self.__canvas_width * 0.9 / len(self.__simulation.computer_rooms)
+        width_margin = (self.__canvas_width * 0.1) / (len(self.__simulation.computer_rooms) + 1)
 
-        return [width_margin * (number + 1) + width * number, height * 3, width, height * 4]
+        return self.__to_screen(width_margin * (number + 1) + width * number, height * 3, width, height * 4)
 
     def set_low(self):
         for s in self.__servers:
@@ -158,24 +259,71 @@ class Visualization:
         for c in self.__connections:
             c.shade()
 
-    def update(self):
-        self.__window.after(self.__mspt.get(), self.update)
-        if self.__pause: return
-
-        self.__simulation.tick()
-        self.__ticks += 1
-        self.__window.title(str(self.__ticks))
-
-        for s in self.__servers:
-            s.update()
-
-        for r in self.__rooms:
-            r.update()
-
-        for c in self.__connections:
-            c.update()
+    @property
+    def worker(self):
+        return self.__worker
+
+    def __tick_rate(self):
+        try:
+            mspt = self.__mspt.get()
+            ticks_per_step = self.__ticks_per_step.get()
+        except TclError:
+            return self.__worker.tick_rate
+        return 1000 * ticks_per_step / mspt if mspt > 0 else 0
+
+    def __on_run_click(self):
+        try:
+            ticks = self.__run_ticks.get()
+        except TclError:
+            return
+        target = self.__run_target.get()
+        # "To tick" runs to an absolute tick, a condition is given that many ticks to happen
+        if target == "To tick":
+            if ticks <= self.__simulation.ticks:
+                return
+            self.__worker.run_until(lambda simulation: simulation.ticks >= ticks, ticks)
+        else:
+            self.__worker.run_until(CONDITIONS[target], self.__simulation.ticks + ticks)
+        self.__run_status.set(f"{target}...")
+        self.__button.configure(text="Stop")
+
+    def __show_run_result(self, result):
+        target = self.__run_target.get()
+        outcome = "Reached" if result.reached else "Stopped at"
+        if target != "To tick" and result.reached:
+            outcome = f"{target} at"
+        self.__run_status.set(f"{outcome} tick {self.__simulation.ticks}: {result.ticks} ticks in "
+                              f"{result.seconds:.2f} s ({result.ticks_per_second:.0f} ticks/s)")
+        self.__button.configure(text="Start")
 
-        self.update_widgets()
+    def update(self):
+        self.__window.after(frame_ms, self.update)
+        self.__worker.tick_rate = self.__tick_rate()
+        if self.__worker.fast_forwarding:
+            self.__window.title(f"{self.__simulation.ticks} (running)")
+            return
+
+        with self.__worker.frame():
+            self.__window.title(str(self.__simulation.ticks))
+            if self.__view_changed:
+                self.__view_changed = False
+                self.__relayout()
+            self.redraw()
+            result = self.__worker.take_result()
+        if result is not None:
+            self.__show_run_result(result)
+
+    def redraw(self):
+        for r in self.__changes.take_layouts():
+            r.update_stations()
+
+        for obj in self.__changes.take_dirty():
+            if obj.visible:
+                obj.update()
+
+        source = self.__details.source
+        if source is self or source is not None and source.visible:
+            self.__details.refresh()
 
     @property
     def stations(self):
@@ -1,5 +1,7 @@
 from tkinter import *
 from abc import ABC, abstractmethod
+from simulation.computer_room import RoomListener
+from simulation.computers import ComputerListener, Station
 from math import sqrt, ceil
 from visulisation.config import *
 from enum import Enum
@@ -11,6 +13,57 @@ class Color(Enum):
     Selected = 2
 
 
+OUTLINES = {Color.Shaded: shaded_fg, Color.Unselected: unselected_fg, Color.Selected: selected_fg}
+
+
+def mix(a: str, b: str, t: float) -> str:
+    a, b = int(a[1:], 16), int(b[1:], 16)
+    channels = [round(((a >> shift) & 0xFF) * (1 - t) + ((b >> shift) & 0xFF) * t) for shift in (16, 8, 0)]
+    return "#{:02x}{:02x}{:02x}".format(*channels)
+
+
+def heat_color(occupied: float, broken: float) -> str:
+    # From an idle room towards a full one, then towards a broken one
+    return mix(mix(unselected_bg, occupied_unselected_bg, occupied), broken_unselected_bg, broken)
+
+
+# Side panel shared by all objects: a growing pool of labels showing the details of one
+# object, created on first use and only set when a line changes
+class DetailPanel:
+
+    def __init__(self):
+        self.__labels = []
+        self.__texts = []
+        self.__source = None
+
+    @property
+    def source(self):
+        return self.__source
+
+    def show(self, source):
+        self.__source = source
+        self.refresh()
+
+    def refresh(self):
+        if self.__source is None:
+            return
+        texts = self.__source.details()
+        if texts == self.__texts:
+            return
+        while len(self.__labels) < len(texts):
+            text = StringVar()
+            self.__labels.append((Label(textvariable=text), text))
+
+        for i, ((label, text), value) in enumerate(zip(self.__labels, texts)):
+            if i >= len(self.__texts) or self.__texts[i] != value:
+                text.set(value)
+            if i >= len(self.__texts):
+                label.pack(anchor=NW)
+        for label, _ in self.__labels[len(texts):len(self.__texts)]:
+            label.pack_forget()
+        self.__texts = texts
+
+
 class VisualizationObject(ABC):
     _canvas: Canvas
 
@@ -19,8 +72,21 @@ class VisualizationObject(ABC):
         self._canvas = visualization.canvas
         self._obj = obj
         self._canvas.tag_bind(self._obj, "<Button-1>", self._onclick)
-        self._widgets = []
         self._current_color = Color.Unselected
+        self._visible = True
+
+    @property
+    def visible(self):
+        return self._visible
+
+    def set_visible(self, visible):
+        if visible == self._visible:
+            return
+        self._visible = visible
+        self._canvas.itemconfig(self._obj, state=NORMAL if visible else HIDDEN)
+        # Hidden objects are not updated, so catch up when shown
+        if visible:
+            self.update()
 
     def remove(self):
         self._canvas.delete(self._obj)
@@ -38,10 +104,12 @@ class VisualizationObject(ABC):
             case Color.Selected:
                 self._canvas.itemconfig(self._obj, fill=selected_bg, outline=selected_fg)
 
+    # Tk callbacks run beside the simulation's worker thread, so they take a frame
     def _onclick(self, *args):
-        self._visualisation.set_low()
-        self.select()
-        self.pack()
+        with self._visualisation.worker.frame():
+            self._visualisation.set_low()
+            self.select()
+            self.pack()
 
     def select(self):
         self._current_color = Color.Selected
@@ -63,14 +131,11 @@ class VisualizationObject(ABC):
         cords = self._canvas.coords(self._obj)
         return (cords[0] + cords[2]) / 2, (cords[1] + cords[3]) / 2
 
-    def pack(self):
-        self._visualisation.unpack()
-        for w in self._widgets:
-            w.pack(anchor=NW)
+    def details(self) -> list[str]:
+        return []
 
-    def unpack(self):
-        for w in self._widgets:
-            w.pack_forget()
+    def pack(self):
+        self._visualisation.show_details(self)
 
 
 class SeverVisualization(VisualizationObject):
@@ -79,26 +144,6 @@ class SeverVisualization(VisualizationObject):
                          visualization.canvas.create_rectangle(x, y, x + width, y + height, width=2))
         self.__server = server
 
-        # Widgets setup
-        self._widgets.append(Label(text=f"Server: {id(server)}"))
-        self._widgets.append(Label(text=f"Have GIS: {server.have_gis}"))
-        self._widgets.append(Label(text=f"Have DBMS: {server.have_dbms}"))
-        self._widgets.append(Label(text=f"Crush probability: {server.chash_probability}"))
-        self._widgets.append(Label(text=""))
-
-        text_crush_protect = f"Have crush protect: {server.have_crush_protect}"
-        if server.have_crush_protect:
-            if server.crush_protect_used:
-                text_crush_protect += " | Used"
-            else:
-                text_crush_protect += " | Not used"
-
-        self._text_crush_protect = StringVar(value=text_crush_protect)
-        self._widgets.append(Label(textvariable=self._text_crush_protect))
-
-        self._text_broken = StringVar(value=f"Broken: {server.is_broken}")
-        self._widgets.append(Label(textvariable=self._text_broken))
-
     def update_color(self):
         if self.__server.is_broken:
             match self._current_color:
@@ -120,25 +165,22 @@ class SeverVisualization(VisualizationObject):
         cords = self._canvas.coords(self._obj)
         return (cords[0] + cords[2]) / 2, cords[3]
 
-    def update(self):
-        super().update()
-        self.widgets_update()
-
-    def widgets_update(self):
-        self._text_broken.set(f"Broken: {self.__server.is_broken}")
-
-        text_crush_protect = f"Have crush protect: {self.__server.have_crush_protect}"
-        if self.__server.have_crush_protect:
-            if self.__server.crush_protect_used:
+    def details(self) -> list[str]:
+        server = self.__server
+        text_crush_protect = f"Have crush protect: {server.have_crush_protect}"
+        if server.have_crush_protect:
+            if server.crush_protect_used:
                 text_crush_protect += " | Used"
             else:
                 text_crush_protect += " | Not used"
-        self._text_crush_protect.set(text_crush_protect)
 
-    def _onclick(self, *args):
-        self._visualisation.unpack()
-        self.pack()
-        super()._onclick(*args)
+        return [f"Server: {id(server)}",
+                f"Have GIS: {server.have_gis}",
+                f"Have DBMS: {server.have_dbms}",
+                f"Crush probability: {server.chash_probability}",
+                "",
+                text_crush_protect,
+                f"Broken: {server.is_broken}"]
 
 
 class StationVisualization(VisualizationObject):
@@ -147,20 +189,6 @@ class StationVisualization(VisualizationObject):
                          visualization.canvas.create_rectangle(x, y, x + width, y + height, width=2))
         self.__station = station
 
-        # Widgets setup
-        self._widgets.append(Label(text=f"Station: {id(station)}"))
-        self._widgets.append(Label(text=f"Have GIS: {station.have_gis}"))
-        self._widgets.append(Label(text=f"Have DBMS: {station.have_dbms}"))
-        self._widgets.append(Label(text=f"Crush probability: {station.chash_probability}"))
-        self._widgets.append(Label(text=f"Resolution: {station.display_resolution}"))
-        self._widgets.append(Label(text=""))
-
-        self._text_broken = StringVar(value=f"Broken: {station.is_broken}")
-        self._widgets.append(Label(textvariable=self._text_broken))
-
-        self._text_occupied = StringVar(value=f"Occupied: {station.occupied}")
-        self._widgets.append(Label(textvariable=self._text_occupied))
-
     def update_color(self):
         if self.__station.is_broken:
             match self._current_color:
@@ -188,13 +216,16 @@ class StationVisualization(VisualizationObject):
     def set_station(self, station):
         self.__station = station
 
-    def update(self):
-        super().update()
-        self.widgets_update()
-
-    def widgets_update(self):
-        self._text_broken.set(f"Broken: {self.__station.is_broken}")
-        self._text_occupied.set(f"Occupied: {self.__station.occupied}")
+    def details(self) -> list[str]:
+        station = self.__station
+        return [f"Station: {id(station)}",
+                f"Have GIS: {station.have_gis}",
+                f"Have DBMS: {station.have_dbms}",
+                f"Crush probability: {station.chash_probability}",
+                f"Resolution: {station.display_resolution}",
+                "",
+                f"Broken: {station.is_broken}",
+                f"Occupied: {station.occupied}"]
 
 
 class RoomVisualization(VisualizationObject):
@@ -206,21 +237,13 @@ class RoomVisualization(VisualizationObject):
         self.__y = y
         self.__width = width
         self.__height = height
+        self.__detailed = True
 
-        self._widgets.append(Label(text=f"Room: {id(self.__room)}"))
-        self.__servers_text = StringVar(value=f"Servers: {len(room.servers)}")
-        self._widgets.append(Label(textvariable=self.__servers_text))
-        self.__stations_text = StringVar(value=f"Stations: {len(room.stations)}")
-        self._widgets.append(Label(textvariable=self.__stations_text))
-        self.__users_text = StringVar(value=f"Users: {len(room.users)}")
-        self._widgets.append(Label(textvariable=self.__users_text))
-
-
-    def update_widgets(self):
-        self.__servers_text.set(f"Servers: {len(self.__room.servers)}")
-        self.__stations_text.set(f"Stations: {len(self.__room.stations)}")
-        self.__users_text.set(f"Users: {len(self.__room.users)}")
-
+    def details(self) -> list[str]:
+        return [f"Room: {id(self.__room)}",
+                f"Servers: {len(self.__room.servers)}",
+                f"Stations: {len(self.__room.stations)}",
+                f"Users: {self.__room.users_count}"]
 
     def change_position(self, x, y, width, height):
         super().change_position(x, y, width, height)
@@ -230,31 +253,58 @@ class RoomVisualization(VisualizationObject):
         self.__height = height
         self.update_stations()
 
+    @property
+    def room(self):
+        return self.__room
+
+    # Zoomed out rooms are drawn as one tile coloured by occupancy and broken stations
+    @property
+    def detailed(self):
+        return self._visible and self.__width >= room_detail_px
+
+    def update_color(self):
+        if self.__detailed:
+            super().update_color()
+            return
+        stations = len(self.__room.stations) or 1
+        self._canvas.itemconfig(self._obj, outline=OUTLINES[self._current_color],
+                                fill=heat_color(self.__room.users_count / stations,
+                                                self.__room.broken_stations_count / stations))
+
+    def __station_views(self):
+        for station in self.__room.stations:
+            view = self._visualisation.station_visualization(station)
+            if view is not None:
+                yield view
+
     def set_low_all(self):
         super().shade()
-        for station in self._visualisation.stations:
-            if station.station in self.__room.stations:
-                station.shade()
+        for station in self.__station_views():
+            station.shade()
 
     def set_mid_all(self):
         super().unselect()
-        for station in self._visualisation.stations:
-            if station.station in self.__room.stations:
-                station.unselect()
+        for station in self.__station_views():
+            station.unselect()
 
     def set_high_all(self):
         super().select()
-        for station in self._visualisation.stations:
-            if station.station in self.__room.stations:
-                station.select()
+        for station in self.__station_views():
+            station.select()
 
+    # Only needed when the room's stations change or the room moves
     def update_stations(self):
-        n = 0
-        for station in self._visualisation.stations:
-            if station.station in self.__room.stations:
-                station.update()
-                station.change_position(*self.__get_station_pos(n))
-                n += 1
+        detailed = self.detailed
+        if detailed != self.__detailed:
+            self.__detailed = detailed
+            self.update_color()
+        for n, station in enumerate(self.__room.stations):
+            view = self._visualisation.station_visualization(station, create=detailed)
+            if view is None:
+                continue
+            if detailed:
+                view.change_position(*self.__get_station_pos(n))
+            view.set_visible(detailed)
 
     def __get_station_pos(self, number):
         size = ceil(sqrt(len(self.__room.stations)))
@@ -269,11 +319,6 @@ class RoomVisualization(VisualizationObject):
                 width,
                 height]
 
-    def update(self):
-        super().update()
-        self.update_stations()
-        self.update_widgets()
-
     def _onclick(self, *args):
         super()._onclick(*args)
 
@@ -293,7 +338,8 @@ class Connection(VisualizationObject):
         self.__room = room
         self.__server = server
 
-        self._widgets.append(Label(text=f"Connection: {id(self)}"))
+    def details(self) -> list[str]:
+        return [f"Connection: {id(self)}"]
 
     def select(self):
         super().select()
@@ -319,5 +365,63 @@ class Connection(VisualizationObject):
     def update_position(self):
         self.change_position(*self.__server.center, *self.__room.center)
 
+    @property
+    def bounds(self):
+        x1, y1, x2, y2 = self._canvas.coords(self._obj)
+        return [min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1)]
+
     def _onclick(self, *args):
         self._visualisation.on_canvas_click()
+
+
+# Objects to redraw and rooms to lay out again on the next frame. Filled by the
+# simulation's listeners on the worker thread and taken by the Tk thread in a frame
+class ChangeTracker(ComputerListener, RoomListener):
+
+    def __init__(self, visualization, servers, rooms, room_connections):
+        self.__visualisation = visualization
+        self.__server_views = {view.server: view for view in servers}
+        self.__room_views = {view.room: view for view in rooms}
+        self.__room_connections = room_connections
+        self.__dirty = set(servers + rooms + [c for connections in room_connections.values() for c in connections])
+        self.__layouts = set(rooms)
+
+    def take_layouts(self) -> set:
+        layouts, self.__layouts = self.__layouts, set()
+        return layouts
+
+    def take_dirty(self) -> set:
+        dirty, self.__dirty = self.__dirty, set()
+        return dirty
+
+    # Computer -> Visualization
+    def computer_state_changed(self, computer):
+        view = self.__server_views.get(computer) or self.__visualisation.station_visualization(computer)
+        if view is not None:
+            self.__dirty.add(view)
+        if isinstance(computer, Station):
+            # Rooms drawn as a tile show their broken fraction
+            room = self.__room_views.get(computer.computer_room)
+            if room is not None and not room.detailed:
+                self.__dirty.add(room)
+
+    def station_occupancy_changed(self, station):
+        view = self.__visualisation.station_visualization(station)
+        if view is not None:
+            self.__dirty.add(view)
+        room = self.__room_views.get(station.computer_room)
+        if room is not None:
+            self.__dirty.add(room)
+
+    # Room -> Visualization
+    def room_stations_changed(self, room):
+        view = self.__room_views.get(room)
+        if view is not None:
+            self.__dirty.add(view)
+            self.__layouts.add(view)
+
+    def room_servers_changed(self, room):
+        view = self.__room_views.get(room)
+        if view is not None:
+            self.__dirty.add(view)
+            self.__dirty.update(self.__room_connections[view])